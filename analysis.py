@@ -0,0 +1,360 @@
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Feature kinds, as stored in Features.kinds
+ROOT, MAXIMUM, MINIMUM, INTERSECTION = 0, 1, 2, 3
+KIND_NAMES = ('root', 'maximum', 'minimum', 'intersection')
+
+
+class Feature(NamedTuple):
+    kind: str                   # 'root', 'maximum', 'minimum' or 'intersection'
+    x: float
+    y: float
+    equations: Tuple[int, ...]  # The equation, or both equations of an intersection
+
+
+class Features(NamedTuple):
+    """Points found on one tile: roots and extrema of a curve, or intersections of several"""
+    xs: np.ndarray
+    ys: np.ndarray
+    kinds: np.ndarray
+    first: np.ndarray   # For intersections, positions of the two curves in the list they were found for
+    second: np.ndarray
+
+
+def _features(xs, ys, kinds, first=None, second=None) -> Features:
+    empty = np.zeros(len(xs), dtype=np.int64)
+    return Features(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64),
+                    np.asarray(kinds, dtype=np.int8), empty if first is None else first,
+                    empty if second is None else second)
+
+
+NO_FEATURES = _features([], [], [])
+
+
+def _direct(func: Callable) -> Callable:
+    # Refinement evaluates fresh arrays every round, which a SharedExpression only hands on to its compiled function
+    return getattr(func, 'compiled', func)
+
+
+def brent(func: Callable[[np.ndarray, np.ndarray], np.ndarray], a: np.ndarray, b: np.ndarray,
+          fa: np.ndarray, fb: np.ndarray, xtol=1e-12, rtol: float = 4 * np.finfo(float).eps,
+          max_iter: int = 100) -> Tuple[np.ndarray, np.ndarray]:
+    """Roots in many brackets [a, b] at once, by Brent's method run in lockstep.
+
+    ``func(x, which)`` evaluates the function of brackets ``which`` at x,
+    so brackets may belong to different functions; every round makes one
+    call for all brackets still open. Each bracket takes an inverse
+    quadratic or secant step where that is safe and bisects otherwise, as
+    in Brent's method, and is done once it is narrower than
+    ``xtol + rtol * |x|``. Returns the roots and the function there; brackets
+    whose ends do not differ in sign come back NaN.
+    """
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    fa, fb = np.asarray(fa, dtype=np.float64), np.asarray(fb, dtype=np.float64)
+    roots = np.full(len(a), np.nan)
+    values = np.full(len(a), np.nan)
+    roots[fb == 0], values[fb == 0] = b[fb == 0], 0.0
+    roots[fa == 0], values[fa == 0] = a[fa == 0], 0.0
+    which = np.flatnonzero(fa * fb < 0)
+    xtol = np.broadcast_to(np.asarray(xtol, dtype=np.float64), a.shape)[which]
+    xpre, xcur, fpre, fcur = a[which], b[which], fa[which], fb[which]
+    xblk, fblk = np.zeros(len(which)), np.zeros(len(which))
+    spre, scur = np.zeros(len(which)), np.zeros(len(which))
+
+    with np.errstate(all='ignore'):
+        for _ in range(max_iter):
+            # Keep the root between the current point and the contrapoint
+            flip = fpre * fcur < 0
+            xblk, fblk = np.where(flip, xpre, xblk), np.where(flip, fpre, fblk)
+            spre = scur = np.where(flip, xcur - xpre, scur)
+            # The contrapoint becomes the current point when it is closer to zero
+            swap = np.abs(fblk) < np.abs(fcur)
+            xpre, xcur, xblk = np.where(swap, xcur, xpre), np.where(swap, xblk, xcur), np.where(swap, xcur, xblk)
+            fpre, fcur, fblk = np.where(swap, fcur, fpre), np.where(swap, fblk, fcur), np.where(swap, fcur, fblk)
+
+            delta = (xtol + rtol * np.abs(xcur)) / 2
+            sbis = (xblk - xcur) / 2
+            done = (fcur == 0) | (np.abs(sbis) < delta)
+            roots[which[done]], values[which[done]] = xcur[done], fcur[done]
+            if done.all():
+                return roots, values
+            if done.any():
+                keep = ~done
+                which, xtol, delta, sbis = which[keep], xtol[keep], delta[keep], sbis[keep]
+                xpre, xcur, xblk, fpre, fcur, fblk = (v[keep] for v in (xpre, xcur, xblk, fpre, fcur, fblk))
+                spre, scur = spre[keep], scur[keep]
+
+            # Secant with two distinct points, inverse quadratic interpolation with three
+            dpre = (fpre - fcur) / (xpre - xcur)
+            dblk = (fblk - fcur) / (xblk - xcur)
+            stry = np.where(xpre == xblk, -fcur * (xcur - xpre) / (fcur - fpre),
+                            -fcur * (fblk * dblk - fpre * dpre) / (dblk * dpre * (fblk - fpre)))
+            # Interpolation is only trusted while steps shrink fast enough; NaN steps bisect too
+            accept = ((np.abs(spre) > delta) & (np.abs(fcur) < np.abs(fpre))
+                      & (2 * np.abs(stry) < np.minimum(np.abs(spre), 3 * np.abs(sbis) - delta)))
+            spre, scur = np.where(accept, scur, sbis), np.where(accept, stry, sbis)
+
+            xpre, fpre = xcur, fcur
+            xcur = xcur + np.where(np.abs(scur) > delta, scur, np.copysign(delta, sbis))
+            fcur = func(xcur, which)
+
+    # Out of iterations: the best point so far
+    roots[which], values[which] = xcur, fcur
+    return roots, values
+
+
+def _zero_starts(values: np.ndarray) -> np.ndarray:
+    """Mask of exact zeros that begin a run of zeros, so a flat stretch on zero counts once.
+
+    Rows that are zero throughout (a curve on the axis, two equal curves) have none.
+    """
+    zero = values == 0
+    zero[..., 1:] &= values[..., :-1] != 0
+    zero &= ~np.all(values == 0, axis=-1, keepdims=True)
+    return zero
+
+
+def find_roots(func: Callable, strips: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Where a sampled curve crosses zero, refined on ``func``; returns x and f(x)"""
+    if not strips:
+        return np.zeros(0), np.zeros(0)
+    func = _direct(func)
+    xs = np.concatenate([strip[:, 0] for strip in strips])
+    ys = np.concatenate([strip[:, 1] for strip in strips])
+    # Intervals joining one strip to the next are not part of the curve
+    ends = np.cumsum([len(strip) for strip in strips])[:-1] - 1
+    inside = np.ones(len(xs) - 1, dtype=bool)
+    inside[ends] = False
+    with np.errstate(invalid='ignore'):
+        crossing = np.flatnonzero(inside & (ys[:-1] * ys[1:] < 0))
+    roots, values = brent(lambda x, which: func(x), xs[crossing], xs[crossing + 1], ys[crossing], ys[crossing + 1],
+                          xtol=(xs[crossing + 1] - xs[crossing]) * 1e-10)
+    # A sign change across a pole converges on the pole, where |f| grows instead of vanishing
+    with np.errstate(invalid='ignore'):
+        real = np.abs(values) <= np.minimum(np.abs(ys[crossing]), np.abs(ys[crossing + 1]))
+    exact = np.flatnonzero(_zero_starts(ys))
+    return np.concatenate((roots[real], xs[exact])), np.concatenate((values[real], ys[exact]))
+
+
+def find_extrema(func: Callable, strips: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Local maxima and minima of a sampled curve, refined on ``func``; returns x, f(x) and which are maxima.
+
+    Samples where the slope changes sign bracket an extremum between their
+    neighbours; it is refined to where the central difference of ``func``
+    is zero. Candidates that do not refine to a point at least as extreme
+    as their sample (poles, curves clipped at the edge of their band) are
+    dropped.
+    """
+    candidates, lows, highs, maxima = [], [], [], []
+    for strip in strips:
+        if len(strip) < 3:
+            continue
+        xs, ys = strip[:, 0], strip[:, 1]
+        slope = np.diff(ys) / np.diff(xs)
+        rising, falling = slope[:-1], slope[1:]
+        peak = (rising > 0) & (falling <= 0)
+        valley = (rising < 0) & (falling >= 0)
+        turn = np.flatnonzero(peak | valley)
+        candidates.append(np.column_stack((xs[turn + 1], ys[turn + 1])))
+        lows.append(xs[turn])
+        highs.append(xs[turn + 2])
+        maxima.append(peak[turn])
+    if not candidates:
+        return np.zeros(0), np.zeros(0), np.zeros(0, dtype=bool)
+    candidates, lows, highs, maxima = (np.concatenate(v) for v in (candidates, lows, highs, maxima))
+    if not len(maxima):
+        return np.zeros(0), np.zeros(0), maxima
+
+    steps = (highs - lows) * 1e-3
+    func = _direct(func)
+
+    def slope_at(x, which):
+        step = steps[which]
+        ahead, behind = np.split(func(np.concatenate((x + step, x - step))), 2)
+        return (ahead - behind) / (2 * step)
+
+    everything = np.arange(len(lows))
+    x, _ = brent(slope_at, lows, highs, slope_at(lows, everything), slope_at(highs, everything),
+                 xtol=(highs - lows) * 1e-10)
+    y = func(x)
+    # Within rounding of the sample it started from, or more extreme
+    sample = candidates[:, 1]
+    slack = 1e-9 * np.maximum(np.abs(sample), 1.0)
+    with np.errstate(invalid='ignore'):
+        kept = np.where(maxima, y >= sample - slack, y <= sample + slack)
+    return x[kept], y[kept], maxima[kept]
+
+
+def analyze_strips(func: Callable, strips: Sequence[np.ndarray], roots: bool = True) -> Features:
+    """Roots and extrema of one tile's strips"""
+    xs, ys, kinds = [], [], []
+    if roots:
+        root_x, _ = find_roots(func, strips)
+        xs.append(root_x)
+        ys.append(np.zeros(len(root_x)))
+        kinds.append(np.full(len(root_x), ROOT))
+    extreme_x, extreme_y, maxima = find_extrema(func, strips)
+    xs.append(extreme_x)
+    ys.append(extreme_y)
+    kinds.append(np.where(maxima, MAXIMUM, MINIMUM))
+    return _features(np.concatenate(xs), np.concatenate(ys), np.concatenate(kinds))
+
+
+def _interleave(points: np.ndarray, midpoints: np.ndarray) -> np.ndarray:
+    merged = np.empty(len(points) + len(midpoints))
+    merged[0::2], merged[1::2] = points, midpoints
+    return merged
+
+
+def find_intersections(funcs: Sequence[Callable], xs: np.ndarray, midpoints: np.ndarray) -> Features:
+    """Crossings of every pair of curves, found on a shared grid of x and refined together.
+
+    Each curve is evaluated once over ``xs`` and the ``midpoints`` between
+    them (the arrays tiles start sampling from, so shared subexpressions
+    are already computed), and the differences of all pairs come out of
+    one array operation. Brackets where a difference changes sign are
+    refined in one batch; each round evaluates every curve once, at the
+    points of the brackets it is part of.
+    """
+    count = len(funcs)
+    if count < 2:
+        return NO_FEATURES
+    values = np.array([_interleave(func(xs), func(midpoints)) for func in funcs])
+    xs = _interleave(xs, midpoints)
+    funcs = [_direct(func) for func in funcs]
+
+    first, second = np.triu_indices(count, 1)
+    with np.errstate(invalid='ignore'):
+        difference = values[first] - values[second]
+        pair, column = np.nonzero(difference[:, :-1] * difference[:, 1:] < 0)
+    exact_pair, exact_column = np.nonzero(_zero_starts(difference))
+
+    def difference_at(x, which):
+        # One call per curve for all its brackets, never a loop over x
+        result = np.zeros(len(x))
+        left, right = first[pair[which]], second[pair[which]]
+        for curve in np.unique(np.concatenate((left, right))):
+            chosen = (left == curve) | (right == curve)
+            value = funcs[curve](x[chosen])
+            result[chosen] += np.where(left[chosen] == curve, value, -value)
+        return result
+
+    low, high = difference[pair, column], difference[pair, column + 1]
+    roots, residual = brent(difference_at, xs[column], xs[column + 1], low, high,
+                            xtol=(xs[column + 1] - xs[column]) * 1e-10)
+    with np.errstate(invalid='ignore'):
+        real = np.abs(residual) <= np.minimum(np.abs(low), np.abs(high))
+    roots, pair = roots[real], pair[real]
+    heights = np.empty(len(roots))
+    for curve in np.unique(first[pair]):
+        chosen = first[pair] == curve
+        heights[chosen] = funcs[curve](roots[chosen])
+    xs_found = np.concatenate((roots, xs[exact_column]))
+    ys_found = np.concatenate((heights, values[first[exact_pair], exact_column]))
+    pairs = np.concatenate((pair, exact_pair))
+    return _features(xs_found, ys_found, np.full(len(xs_found), INTERSECTION), first[pairs], second[pairs])
+
+
+class CurveAnalysis:
+    """Roots, extrema and intersections of sampled curves, kept per cached tile.
+
+    Results are keyed by the tiles they were found on, so when the view
+    pans only the tiles coming into view are analyzed, and refining a
+    tile (a finer level arriving) analyzes just that tile again. Extrema
+    on the seam between two tiles are found from the points either side.
+    The newest ``max_entries`` results are kept.
+
+    After ``start(budget)``, tiles are only analyzed until ``budget``
+    seconds have passed; the rest count as empty and set ``incomplete``,
+    so a zoom over many curves spreads the work over a few frames.
+    """
+
+    def __init__(self, max_entries: int = 8192):
+        self.max_entries = max_entries
+        self.results: "OrderedDict[Hashable, Features]" = OrderedDict()
+        self.deadline: Optional[float] = None
+        self.incomplete = False
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, budget: Optional[float] = None):
+        """Begin a pass over the view, analyzing new tiles for at most ``budget`` seconds (None for no limit)"""
+        self.deadline = None if budget is None else time.perf_counter() + budget
+        self.incomplete = False
+
+    def _lookup(self, key: Hashable, compute: Callable[[], Features]) -> Features:
+        features = self.results.get(key)
+        if features is not None:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return features
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            self.incomplete = True
+            return NO_FEATURES
+        self.misses += 1
+        features = self.results[key] = compute()
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+        return features
+
+    def curve(self, func: Callable, keys: Sequence[Hashable], parts: Sequence[List[np.ndarray]]) -> Features:
+        """Roots and extrema of a curve drawn from cached tiles (``CachedCurve.keys`` and ``.parts``)"""
+        found = [self._lookup(('tile', key), lambda strips=strips: analyze_strips(func, strips))
+                 for key, strips in zip(keys, parts)]
+        for left, right, left_strips, right_strips in zip(keys, keys[1:], parts, parts[1:]):
+            if not left_strips or not right_strips:
+                continue
+            end, start = left_strips[-1], right_strips[0]
+            if len(end) >= 2 and len(start) >= 2 and np.array_equal(end[-1], start[0]):
+                seam = [np.concatenate((end[-2:], start[1:2]))]
+                found.append(self._lookup(('seam', left, right),
+                                          lambda seam=seam: analyze_strips(func, seam, roots=False)))
+        return _concatenate(found)
+
+    def intersections(self, funcs: Tuple[Callable, ...], tile: Hashable,
+                      grid: Callable[[], Tuple[np.ndarray, np.ndarray]]) -> Features:
+        """Pairwise crossings of ``funcs`` over one tile, on the x values and midpoints ``grid()`` returns"""
+        return self._lookup(('cross', tile, funcs), lambda: find_intersections(funcs, *grid()))
+
+    def clear(self):
+        self.results.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.results)}
+
+
+def _concatenate(found: Sequence[Features]) -> Features:
+    if not found:
+        return NO_FEATURES
+    return Features(*(np.concatenate(column) for column in zip(*found)))
+
+
+def merge_features(found: Sequence[Features], bounds: Tuple[float, float, float, float]) -> Features:
+    """Features from several tiles inside ``bounds`` (x_min, x_max, y_min, y_max), each once.
+
+    A sample on the edge two tiles share is found on both.
+    """
+    merged = _concatenate(found)
+    x_min, x_max, y_min, y_max = bounds
+    inside = (merged.xs >= x_min) & (merged.xs <= x_max) & (merged.ys >= y_min) & (merged.ys <= y_max)
+    merged = Features(*(column[inside] for column in merged))
+    order = np.lexsort((merged.xs, merged.second, merged.first, merged.kinds))
+    merged = Features(*(column[order] for column in merged))
+    repeated = np.zeros(len(merged.xs), dtype=bool)
+    repeated[1:] = ((merged.xs[1:] == merged.xs[:-1]) & (merged.kinds[1:] == merged.kinds[:-1])
+                    & (merged.first[1:] == merged.first[:-1]) & (merged.second[1:] == merged.second[:-1]))
+    return Features(*(column[~repeated] for column in merged))
+
+
+def feature_list(features: Features) -> List[Feature]:
+    return [Feature(KIND_NAMES[kind], x, y, (first,) if second < 0 else (first, second))
+            for x, y, kind, first, second in zip(features.xs.tolist(), features.ys.tolist(), features.kinds.tolist(),
+                                                 features.first.tolist(), features.second.tolist())]
+
+
+def label_order(features: Features, x_center: float, y_center: float) -> np.ndarray:
+    """Positions of the features nearest the center of the view first, for labelling as many as there is room for"""
+    return np.argsort(np.hypot(features.xs - x_center, features.ys - y_center), kind='stable')
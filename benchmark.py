@@ -0,0 +1,671 @@
+"""Benchmarks for the grapher's hot paths.
+
+Run with ``python benchmark.py [name ...]``, e.g. ``python benchmark.py session``
+to replay the scripted sessions only. Nothing here needs a display: the
+session replays run the real EquationGrapher against SDL's dummy video
+driver and a stub OpenGL module that just counts calls.
+"""
+import contextlib
+import io
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from collections import Counter
+import numpy as np
+from typing import Callable, Dict, List, Sequence, Tuple
+from expression import compile_expression, parse_equation_source
+from sampling import max_deviation, sample_curve, sample_parametric
+from implicit import contour
+from cache import SampleCache
+from workers import SamplingScheduler
+from export import PlotJob, export_jobs
+from shapes import ShapeStore
+from dataset import open_series
+from geometry import parse_shapes
+from scene import read_scene, save_scene
+from subexpressions import ExpressionGraph
+from analysis import find_intersections
+from core import Grapher
+
+
+BENCH_EXPRESSIONS = [
+    "x**2",
+    "sin(x)",
+    "x**3 - 2*x",
+    "exp(-x**2/10) * cos(3*x)",
+    "sqrt(abs(x)) + pow(x, 2) / (1 + tan(x)**2)",
+]
+
+
+def legacy_safe_function(expression: str) -> Callable[[float], float]:
+    """The per-point eval() closure the grapher used before expressions were compiled"""
+    safe_dict = {
+        'sin': math.sin,
+        'cos': math.cos,
+        'tan': math.tan,
+        'exp': math.exp,
+        'sqrt': math.sqrt,
+        'pi': math.pi,
+        'e': math.e,
+        'abs': abs,
+        'pow': pow
+    }
+
+    def safe_eval(x):
+        try:
+            local_dict = safe_dict.copy()
+            local_dict['x'] = x
+            return eval(expression, {"__builtins__": {}}, local_dict)
+        except Exception:
+            return None
+
+    return safe_eval
+
+
+def best_of(function: Callable[[], object], repeat: int = 3) -> float:
+    """Best wall-clock time in seconds over a few runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_expressions(sizes: List[int] = (10_000, 100_000, 1_000_000)):
+    print("Expression evaluation: legacy eval() per point vs compiled NumPy")
+    print(f"{'expression':<44}{'samples':>10}{'eval (s)':>12}{'numpy (s)':>12}{'speedup':>10}")
+    for source in BENCH_EXPRESSIONS:
+        legacy = legacy_safe_function(source)
+        compiled = compile_expression(source)
+        for size in sizes:
+            xs = np.linspace(-50, 50, size)
+            points = xs.tolist()
+            legacy_time = best_of(lambda: [legacy(x) for x in points], repeat=1 if size >= 1_000_000 else 3)
+            compiled_time = best_of(lambda: compiled(xs))
+            print(f"{source:<44}{size:>10}{legacy_time:>12.4f}{compiled_time:>12.5f}{legacy_time / compiled_time:>9.0f}x")
+
+
+def bench_sampling(width: int = 800, height: int = 600, zooms: List[float] = (0.1, 10.0, 1000.0)):
+    print("Adaptive curve sampling: evaluations, vertices and max deviation per frame")
+    print(f"{'expression':<28}{'zoom':>8}{'old evals':>12}{'evals':>8}{'vertices':>10}{'strips':>8}{'dev (px)':>10}{'time (ms)':>11}")
+    aspect_ratio = width / height
+    for source in ["x**2", "sin(x)", "tan(x)", "1/x", "sqrt(x)", "x//1", "exp(-x**2/10) * cos(3*x)"]:
+        func = compile_expression(source)
+        for zoom in zooms:
+            x_min, x_max, y_min, y_max = -zoom * aspect_ratio, zoom * aspect_ratio, -zoom, zoom
+            elapsed = best_of(lambda: sample_curve(func, x_min, x_max, width, y_min, y_max, height))
+            samples = sample_curve(func, x_min, x_max, width, y_min, y_max, height)
+            deviation = max_deviation(func, samples, y_min, y_max, height)
+            print(f"{source:<28}{zoom:>8}{int(1000 * zoom) + 1:>12}{samples.evaluations:>8}{samples.vertex_count:>10}"
+                  f"{len(samples.strips):>8}{deviation:>10.3f}{elapsed * 1000:>11.2f}")
+
+
+def bench_pan_cache(width: int = 800, height: int = 600, frames: int = 300):
+    print("Drag-panning session: resampling every frame vs the tile cache")
+    aspect_ratio = width / height
+    zoom = 10.0
+    funcs = [compile_expression(source) for source in BENCH_EXPRESSIONS]
+    views = [(-zoom * aspect_ratio + frame * 0.05, zoom * aspect_ratio + frame * 0.05, -zoom, zoom)
+             for frame in range(frames)]
+
+    def uncached():
+        for x_min, x_max, y_min, y_max in views:
+            for func in funcs:
+                sample_curve(func, x_min, x_max, width, y_min, y_max, height)
+
+    cache = SampleCache()
+
+    def cached():
+        for x_min, x_max, y_min, y_max in views:
+            for func in funcs:
+                cache.curve(func, x_min, x_max, y_min, y_max, width)
+
+    uncached_time = best_of(uncached, repeat=1)
+    cached_time = best_of(cached, repeat=1)
+    print(f"{frames} frames x {len(funcs)} curves: uncached {uncached_time * 1000:.1f} ms, "
+          f"cached {cached_time * 1000:.1f} ms, {cache.stats()}")
+
+
+class SlowFunction:
+    """An equation that takes ``delay`` seconds per vectorized call, standing in for an expensive curve"""
+
+    def __init__(self, source: str, delay: float):
+        self.func = compile_expression(source)
+        self.delay = delay
+
+    def __call__(self, x):
+        time.sleep(self.delay)
+        return self.func(x)
+
+
+def bench_scheduler(width: int = 800, height: int = 600, curves: int = 6, delay: float = 0.002):
+    print("Background sampling: UI-thread time per frame with slow curves")
+    aspect_ratio = width / height
+
+    def view(zoom):
+        return -zoom * aspect_ratio, zoom * aspect_ratio, -zoom, zoom
+
+    for mode in ("sync", "thread", "process"):
+        funcs = [SlowFunction(f"sin({k + 1}*x)", delay) for k in range(curves)]
+        cache = SampleCache()
+        scheduler = None if mode == "sync" else SamplingScheduler(mode=mode)
+        # Warm a coarse level first, then zoom in several steps without waiting for the workers
+        frame_times = []
+        for zoom in (10.0, 9.0, 8.1, 7.29, 6.56, 5.9):
+            start = time.perf_counter()
+            if scheduler is not None:
+                cache.absorb(scheduler.collect())
+            wanted = []
+            for func in funcs:
+                curve = cache.curve(func, *view(zoom), width, scheduler=scheduler)
+                wanted.extend(curve.wanted)
+            if scheduler is not None:
+                scheduler.retain(wanted)
+            frame_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        if scheduler is not None:
+            while scheduler.stats()['queued']:
+                time.sleep(0.001)
+            cache.absorb(scheduler.collect())
+            settled = time.perf_counter() - start
+            stats = scheduler.stats()
+            scheduler.shutdown()
+        else:
+            settled, stats = 0.0, {}
+        print(f"{mode:>8}: worst frame {max(frame_times) * 1000:7.1f} ms, median {sorted(frame_times)[len(frame_times) // 2] * 1000:7.1f} ms, "
+              f"full detail {settled * 1000:7.1f} ms later {stats}")
+
+
+BENCH_IMPLICIT = ["x^2 + y^2 = 25", "sin(x)*cos(y) = 0.5", "tan(x) = y^3/20", "sin(x^2 + y^2) = 0.5"]
+
+
+def bench_implicit(width: int = 800, height: int = 600, zoom: float = 10.0):
+    print("Implicit curves: starting grid cell size against time, evaluations and peak memory")
+    print(f"{'equation':<22}{'grid':>10}{'time':>12}{'evaluations':>14}{'peak memory':>14}{'segments':>10}")
+    aspect_ratio = width / height
+    bounds = (-zoom * aspect_ratio, zoom * aspect_ratio, -zoom, zoom)
+    for source in BENCH_IMPLICIT:
+        func = parse_equation_source(source)
+        # Refining from a 1 px grid is a uniform full-resolution field: the baseline
+        for cell_pixels in (1, 2, 4, 8, 16, 32):
+            tracemalloc.start()
+            start = time.perf_counter()
+            samples = contour(func, *bounds, width, height, cell_pixels=cell_pixels)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            segments = sum(len(strip) for strip in samples.strips) // 2
+            print(f"{source:<22}{cell_pixels:>7} px{elapsed * 1000:>9.1f} ms{samples.evaluations:>14}"
+                  f"{peak / 2 ** 20:>11.1f} MB{segments:>10}")
+
+    print("Panning a tiled implicit curve: time per frame")
+    func = parse_equation_source(BENCH_IMPLICIT[1])
+    cache = SampleCache()
+    frame_times = []
+    for frame in range(60):
+        x_min, x_max, y_min, y_max = (value + frame * 0.1 for value in bounds)
+        start = time.perf_counter()
+        cache.contour(func, x_min, x_max, y_min, y_max, width)
+        frame_times.append(time.perf_counter() - start)
+    frame_times.sort()
+    print(f"  first frame {max(frame_times) * 1000:.1f} ms, median {frame_times[len(frame_times) // 2] * 1000:.2f} ms, "
+          f"{cache.stats()}")
+
+
+BENCH_PARAMETRIC = ["param: x=cos(3t), y=sin(2t), t=0..2pi", "polar: r=1+cos(theta)",
+                    "polar: r=theta, theta=0..200", "param: x=t, y=tan(t), t=-10..10", "polar: r=cos(1000theta)"]
+
+
+def longest_segment(strips: List[np.ndarray], bounds: Tuple[float, float, float, float], width: int, height: int) -> float:
+    """Longest on-screen segment, in pixels, with at least one end in view"""
+    x_min, x_max, y_min, y_max = bounds
+    longest = 0.0
+    for strip in strips:
+        px = (strip[:, 0] - x_min) * width / (x_max - x_min)
+        py = (strip[:, 1] - y_min) * height / (y_max - y_min)
+        inside = (px >= 0) & (px <= width) & (py >= 0) & (py <= height)
+        lengths = np.hypot(np.diff(px), np.diff(py))[inside[1:] | inside[:-1]]
+        longest = max(longest, lengths.max(initial=0.0))
+    return longest
+
+
+def bench_parametric(width: int = 800, height: int = 600, zoom: float = 1.5):
+    print("Parametric curves: adaptive sampling against as many evenly spaced t")
+    print(f"{'curve':<38}{'time':>10}{'evaluations':>14}{'longest segment':>18}{'evenly spaced':>16}")
+    aspect_ratio = width / height
+    for source in BENCH_PARAMETRIC:
+        func = parse_equation_source(source)
+        view = 10 * zoom if 'tan' in source or '200' in source else zoom
+        bounds = (-view * aspect_ratio, view * aspect_ratio, -view, view)
+        elapsed = best_of(lambda: sample_parametric(func, func.t_min, func.t_max, *bounds, width, height), repeat=3)
+        samples = sample_parametric(func, func.t_min, func.t_max, *bounds, width, height)
+        ts = np.linspace(func.t_min, func.t_max, samples.evaluations)
+        uniform = [np.column_stack(func(ts))]
+        print(f"{source:<38}{elapsed * 1000:>7.1f} ms{samples.evaluations:>14}"
+              f"{longest_segment(samples.strips, bounds, width, height):>15.1f} px"
+              f"{longest_segment(uniform, bounds, width, height):>13.1f} px")
+
+    print("Panning and zooming a 2000-petal rose: time per frame")
+    func = parse_equation_source(BENCH_PARAMETRIC[-1])
+    cache = SampleCache()
+    frame_times = []
+    for frame in range(60):
+        view = zoom * 0.99 ** frame
+        center = frame * 0.002
+        start = time.perf_counter()
+        cache.parametric(func, center - view * aspect_ratio, center + view * aspect_ratio, -view, view, width, height)
+        frame_times.append(time.perf_counter() - start)
+    frame_times.sort()
+    print(f"  first frame {max(frame_times) * 1000:.1f} ms, median {frame_times[len(frame_times) // 2] * 1000:.2f} ms, "
+          f"{cache.stats()}")
+
+
+def related_equations(count: int) -> List[str]:
+    """A dashboard's worth of curves built from the same few terms"""
+    terms = ["sin(x)", "cos(x)", "exp(-x^2/50)", "sqrt(abs(x))"]
+    equations = []
+    for k in range(count):
+        a, b = terms[k % len(terms)], terms[(k // len(terms)) % len(terms)]
+        equations.append([f"{a}*{b} + {k % 5}", f"{k + 1}*{a}^2 - {b}", f"x*{a} + {b}*{k / 10}",
+                          f"y = {b}*x*{a}" if k % 2 else f"{a}*x*{b}"][k % 4])
+    return equations
+
+
+def bench_shared(counts: Sequence[int] = (4, 12, 48), width: int = 800, height: int = 600, zoom: float = 10.0):
+    print("Shared subexpressions: related curves evaluated separately and through one ExpressionGraph")
+    print(f"{'curves':>8}{'nodes':>8}{'separate':>12}{'shared':>12}{'requested':>13}{'evaluated':>13}{'saved':>8}")
+    aspect_ratio = width / height
+    xs = np.linspace(-100, 100, 1_000_000)
+    xs.flags.writeable = False
+    for count in counts:
+        compiled = [parse_equation_source(source) for source in related_equations(count)]
+        graph = ExpressionGraph()
+        shared = [graph.add(func) for func in compiled]
+        # One large batch: every equation over the same array
+        separate = best_of(lambda: [func(xs) for func in compiled])
+        # Batches are dropped before each run, or repeats would reuse the last run's values
+        together = best_of(lambda: (graph.batches.clear(), [func(xs) for func in shared]))
+        print(f"{count:>8}{len(graph):>8}{separate * 1000:>9.1f} ms{together * 1000:>9.1f} ms"
+              f"{graph.requested:>13}{graph.evaluated:>13}{graph.saved:>8.0%}")
+
+    print("Sampling a view of related curves from empty tile caches: separate against shared")
+    bounds = (-zoom * aspect_ratio, zoom * aspect_ratio, -zoom, zoom)
+    for count in counts:
+        compiled = [parse_equation_source(source) for source in related_equations(count)]
+        graph = ExpressionGraph()
+        times = []
+        for functions in (compiled, [graph.add(func) for func in compiled]):
+            def sample():
+                graph.batches.clear()
+                cache = SampleCache()
+                for func in functions:
+                    cache.curve(func, *bounds, width)
+            times.append(best_of(sample, repeat=7))
+        print(f"  {count} curves: {times[0] * 1000:.1f} ms separate, {times[1] * 1000:.1f} ms shared, "
+              f"{graph.saved:.0%} of element evaluations saved")
+
+
+def bench_analysis(counts: Sequence[int] = (4, 12, 24), frames: int = 60, pan_pixels: int = 8):
+    print("Analysis: roots, extrema and pairwise intersections of the curves in view")
+    print(f"{'curves':>8}{'points':>8}{'first view':>12}{'per pan':>11}{'no reuse':>11}{'pairs loop':>12}{'bulk':>10}")
+    for count in counts:
+        grapher = Grapher()
+        for k in range(count):
+            grapher.add_equation([f"sin({k % 5 + 1}*x/3) + {k / 10}", f"x^2/{k + 4} - {k % 3}",
+                                  f"cos(x + {k})*{k % 4 + 1}", f"x^3/{100 + k} - x/{k + 2}"][k % 4])
+        indices = range(count)
+        # Tiles are sampled first, so the figures are the analysis alone
+        curves = {index: grapher.sample_equation(grapher.equations[index][0]) for index in indices}
+        start = time.perf_counter()
+        points = len(grapher.analyze(curves).xs)
+        first = time.perf_counter() - start
+
+        def pan(reuse: bool) -> float:
+            spent = 0.0
+            for _ in range(frames):
+                grapher.view.x_offset += pan_pixels * grapher.view.units_per_pixel
+                curves = {index: grapher.sample_equation(grapher.equations[index][0]) for index in indices}
+                if not reuse:
+                    grapher.analysis.clear()
+                start = time.perf_counter()
+                grapher.analyze(curves)
+                spent += time.perf_counter() - start
+            return spent / frames
+
+        incremental, scratch = pan(True), pan(False)
+        # Pairwise intersections over one view-wide grid: every pair on its own, then all pairs at once
+        funcs = [grapher.equations[index][0] for index in indices]
+        xs = np.linspace(-13.3, 13.3, 401)
+        midpoints = (xs[:-1] + xs[1:]) / 2
+        looped = best_of(lambda: [find_intersections((funcs[i], funcs[j]), xs, midpoints)
+                                  for i in range(count) for j in range(i + 1, count)], repeat=3)
+        bulk = best_of(lambda: find_intersections(funcs, xs, midpoints), repeat=3)
+        print(f"{count:>8}{points:>8}{first * 1000:>9.1f} ms{incremental * 1000:>8.2f} ms{scratch * 1000:>8.2f} ms"
+              f"{looped * 1000:>9.1f} ms{bulk * 1000:>7.1f} ms")
+
+
+def random_shapes(count: int, extent: float = 1000.0, seed: int = 0) -> ShapeStore:
+    """A store with ``count`` circles, rectangles and lines scattered over a square, added in bulk"""
+    rng = np.random.default_rng(seed)
+    store = ShapeStore()
+    third = count // 3
+    x, y = rng.uniform(-extent, extent, (2, count))
+    size = rng.uniform(0.1, 5.0, count)
+    store.add_many('circle', np.column_stack((x[:third], y[:third], size[:third])), (1.0, 0.0, 0.0))
+    store.add_many('rectangle', np.column_stack((x[third:2 * third], y[third:2 * third], x[third:2 * third] + size[third:2 * third],
+                                                 y[third:2 * third] + size[third:2 * third])), (0.0, 0.5, 0.0))
+    store.add_many('line', np.column_stack((x[2 * third:], y[2 * third:], x[2 * third:] + size[2 * third:],
+                                            y[2 * third:] - size[2 * third:])), (0.0, 0.0, 1.0))
+    return store
+
+
+def bench_shape_index(counts: Sequence[int] = (1_000, 100_000, 1_000_000)):
+    print("Shape index: build, view queries and hit tests against a scan of every bounding box")
+    print(f"{'shapes':>10}{'build':>11}{'memory':>11}{'view query':>13}{'full scan':>12}{'hit test':>11}{'hover scan':>12}")
+    for count in counts:
+        store = random_shapes(count)
+        start = time.perf_counter()
+        store.index.build()
+        build = time.perf_counter() - start
+        index = store.index
+        boxes = index.boxes[:len(index)]
+        view = (-20.0, -15.0, 20.0, 15.0)
+
+        def scan(x_min, y_min, x_max, y_max):
+            return index.tags[np.flatnonzero((boxes[:, 2] >= x_min) & (boxes[:, 0] <= x_max) &
+                                             (boxes[:, 3] >= y_min) & (boxes[:, 1] <= y_max))]
+
+        rng = np.random.default_rng(1)
+        points = rng.uniform(-1000, 1000, (200, 2))
+        query = best_of(lambda: index.query(*view), repeat=20)
+        full = best_of(lambda: scan(*view), repeat=5)
+        start = time.perf_counter()
+        for x, y in points:
+            store.hit_test(x, y, 0.5)
+        hit = (time.perf_counter() - start) / len(points)
+        start = time.perf_counter()
+        for x, y in points[:20]:
+            scan(x - 0.5, y - 0.5, x + 0.5, y + 0.5)
+        hover_scan = (time.perf_counter() - start) / 20
+        print(f"{count:>10}{build * 1000:>8.1f} ms{index.nbytes / 2 ** 20:>8.1f} MB{query * 1000:>10.3f} ms"
+              f"{full * 1000:>9.3f} ms{hit * 1000:>8.3f} ms{hover_scan * 1000:>9.3f} ms")
+
+
+def write_series(path: str, count: int, chunk: int = 1 << 22):
+    """A noisy two-tone signal of ``count`` (x, y) samples, written a chunk at a time"""
+    data = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(count, 2))
+    for start in range(0, count, chunk):
+        stop = min(start + chunk, count)
+        x = np.arange(start, stop) * 1e-3
+        data[start:stop, 0] = x
+        data[start:stop, 1] = np.sin(x / 100) + 0.2 * np.sin(x) + np.random.default_rng(start).normal(0, 0.05, stop - start)
+    data.flush()
+
+
+def bench_data(counts: Sequence[int] = (1_000_000, 100_000_000), width: int = 800, frames: int = 60):
+    print("Memory-mapped data series: pyramid build, then per-frame reads at several zoom levels")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in counts:
+            path = os.path.join(directory, f"series-{count}.npy")
+            write_series(path, count)
+            series = open_series(path)
+            start = time.perf_counter()
+            series.open_pyramid()
+            build = time.perf_counter() - start
+            print(f"  {count:,} samples ({os.path.getsize(path) / 2 ** 20:.0f} MB): pyramid built in {build:.2f} s, "
+                  f"{os.path.getsize(series.pyramid_path) / 2 ** 20:.0f} MB on disk")
+            extent = count * 1e-3
+            for span in (extent, extent / 100, extent / 10_000, 0.5):
+                frame_times = []
+                tracemalloc.start()
+                for frame in range(frames):
+                    # Pan across a tenth of the data over the frames
+                    x_min = (extent - span) * frame / frames / 10
+                    begin = time.perf_counter()
+                    view = series.view(x_min, x_min + span, width)
+                    frame_times.append(time.perf_counter() - begin)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                frame_times.sort()
+                print(f"    {span:>14,.1f} wide: level {view.level}, {view.rows_read:>6} rows read, "
+                      f"median {frame_times[len(frame_times) // 2] * 1000:6.2f} ms, worst {frame_times[-1] * 1000:6.2f} ms, "
+                      f"peak {peak / 2 ** 20:5.1f} MB allocated")
+
+
+def bench_scene(counts: Sequence[int] = (10_000, 1_000_000)):
+    print("Scene files: save, time to the first block of shapes and full streaming load")
+    equations = [("x^2", (0.0, 0.0, 0.0), True), ("sin(x)*cos(y) = 0.5", (1.0, 0.0, 0.0), False)]
+    with tempfile.TemporaryDirectory() as directory:
+        for count in counts:
+            shapes = random_shapes(count)
+            for extension in ("bin", "txt"):
+                path = os.path.join(directory, f"scene-{count}.{extension}")
+                start = time.perf_counter()
+                save_scene(path, (10.0, 0.0, 0.0), equations, shapes)
+                saved = time.perf_counter() - start
+
+                loaded = ShapeStore()
+                first = None
+                start = time.perf_counter()
+                for kind, item in read_scene(path):
+                    if kind == "shapes":
+                        loaded.add_many(*item)
+                    elif kind == "shape_inputs":
+                        inputs, colors = item
+                        values, positions, _ = parse_shapes(inputs)
+                        for shape_type, rows in values.items():
+                            loaded.add_many(shape_type, rows, colors[positions[shape_type]])
+                    if first is None and len(loaded):
+                        first = time.perf_counter() - start
+                total = time.perf_counter() - start
+                print(f"  {count:>9,} shapes, {extension}: {os.path.getsize(path) / 2 ** 20:6.1f} MB, save {saved * 1000:7.0f} ms, "
+                      f"first shapes after {(first or 0) * 1000:6.1f} ms, all loaded in {total * 1000:7.0f} ms")
+
+
+# Every OpenGL name the grapher's modules refer to
+GL_NAME = re.compile(r"\b(?:glu?[A-Z]\w*|GLU?_[A-Z0-9_]+)\b")
+
+
+def install_stub_gl(sources: Sequence[str] = ("main.py", "renderer.py")) -> Counter:
+    """Replace OpenGL.GL/GLU/GLUT with modules that accept any call and count it.
+
+    Must run before ``main`` is imported. Returns the call counter.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    names = set()
+    for source in sources:
+        with open(os.path.join(here, source)) as f:
+            names.update(GL_NAME.findall(f.read()))
+
+    calls = Counter()
+
+    def stub(name):
+        def call(*args, **kwargs):
+            calls[name] += 1
+            return 1  # glGenBuffers / glGenTextures hand out id 1
+        return call
+
+    package = types.ModuleType("OpenGL")
+    sys.modules["OpenGL"] = package
+    for module_name in ("GL", "GLU", "GLUT"):
+        module = types.ModuleType(f"OpenGL.{module_name}")
+        for i, name in enumerate(sorted(names)):
+            setattr(module, name, stub(name) if name.startswith("gl") else 0x1000 + i)
+        module.__all__ = sorted(names)
+        setattr(package, module_name, module)
+        sys.modules[f"OpenGL.{module_name}"] = module
+    return calls
+
+
+def scripted_session(equations: int, shapes: int, frames: int) -> List[Tuple]:
+    """Add equations and shapes, then zoom in and out while dragging, rendering every step.
+
+    Each frame's drag arrives as several motion events, as a high-rate mouse sends them.
+    """
+    script: List[Tuple] = []
+    for k in range(equations):
+        script.append(("type", [f"sin({k + 1}*x)", f"x^{k % 4 + 1}/{k + 1}", f"tan(x/{k + 1})",
+                                f"exp(-x^2/{k + 1})*cos({k + 1}*x)"][k % 4]))
+    for k in range(shapes):
+        script.append(("type", [f"shape:circle:{k % 17 - 8}:{k % 13 - 6}:{1 + k % 5}",
+                                f"shape:rectangle:{k % 11 - 5}:{k % 7 - 3}:{k % 11 - 3}:{k % 7 - 1}",
+                                f"shape:line:{k % 19 - 9}:0:{k % 19 - 7}:{k % 5}"][k % 3]))
+    script.append(("frame",))
+    for frame in range(frames):
+        phase = frame * 4 // frames
+        script.append(("zoom", 1 if phase in (0, 3) else -1))
+        script.append(("pan", [(2, 1), (2, 1), (1, 0)] if phase < 2 else [(-2, -1), (-2, -1), (-1, 0)]))
+        script.append(("frame",))
+    return script
+
+
+def replay(grapher, script: List[Tuple]):
+    """Feed a scripted session through the grapher's own input handling and render loop"""
+    import pygame
+    for step in script:
+        kind = step[0]
+        if kind == "type":
+            grapher.input_text = step[1]
+            grapher.handle_input([pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, unicode="\r", mod=0)])
+        elif kind == "zoom":
+            button = 4 if step[1] > 0 else 5
+            grapher.handle_input([pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=button, pos=(400, 300))])
+        elif kind == "pan":
+            grapher.handle_input([pygame.event.Event(pygame.MOUSEMOTION, rel=rel, buttons=(1, 0, 0), pos=(400, 300))
+                                  for rel in step[1]])
+        elif kind == "frame":
+            grapher.update_view(1 / 60)
+            grapher.render()
+
+
+SESSIONS: Dict[str, Tuple[int, int, int]] = {
+    'few equations': (3, 0, 120),
+    'many equations': (24, 0, 120),
+    'equations and shapes': (6, 2000, 60),
+    'many shapes': (3, 100000, 60),
+}
+
+
+def bench_session(sessions: Dict[str, Tuple[int, int, int]] = SESSIONS):
+    print("Scripted sessions against a stub GL backend: per-frame percentiles (p50 / p90 / p99)")
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    calls = install_stub_gl()
+    import main
+
+    for name, (equations, shapes, frames) in sessions.items():
+        script = scripted_session(equations, shapes, frames)
+        with contextlib.redirect_stdout(io.StringIO()):
+            grapher = main.EquationGrapher(sampling_workers=0, profile=True, opengl=False)
+            calls.clear()
+            replay(grapher, script)
+        rendered = len(grapher.profiler.frames)
+        draws = sum(count for call, count in calls.items() if call.startswith("glDraw") or call.startswith("glMultiDraw"))
+        print(f"{name} ({equations} equations, {shapes} shapes, {rendered} frames, "
+              f"{draws / rendered:.1f} draw calls and {sum(calls.values()) / rendered:.0f} GL calls per frame)")
+        for column, (p50, p90, p99) in grapher.profiler.summary().items():
+            unit = "" if column in ("samples", "shared", "coalesced", "live_curves", "features", "vertices", "text_surfaces", "shapes_culled") else " ms"
+            print(f"  {column:<14}{p50:>12.2f}{p90:>12.2f}{p99:>12.2f}{unit}")
+
+
+def bench_parameters(curves: int = 50, frames: int = 180):
+    print(f"Animated parameter: {curves} curves reading it, {frames} frames at 60 fps against a stub GL backend")
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    install_stub_gl()
+    import main
+
+    script = [("type", "a = 1, 0.5..3"), ("type", "b = 1")]
+    script += [("type", f"y = a*sin(b*x + {k / 8:g}) + {k % 10 - 5}") for k in range(curves)]
+    script.append(("frame",))
+    # Live: sampled over the view within the frame budget; settled: every value is bound and sampled into tiles
+    for mode in ("live", "settled"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            grapher = main.EquationGrapher(sampling_workers=0, profile=True, opengl=False)
+            replay(grapher, script)
+            grapher.profiler.frames.clear()
+            if mode == "live":
+                grapher.animate_parameter("a")
+            for frame in range(frames):
+                if mode == "live":
+                    grapher.update_parameters(1 / 60)
+                else:
+                    grapher.set_parameter("a", 1 + 0.5 * math.sin(frame / 20))
+                grapher.render()
+        summary = grapher.profiler.summary()
+        p50, p90, p99 = summary["frame"]
+        live = summary.get("live_curves", (0, 0, 0))[0]
+        print(f"  {mode:<8} frame p50 {p50:6.2f} ms, p90 {p90:6.2f} ms, p99 {p99:6.2f} ms; "
+              f"{live:.0f} curves resampled per frame at p50")
+
+
+def bench_export(images: int = 200, size: Tuple[int, int] = (800, 600)):
+    print(f"Headless export: {images} images of {size[0]}x{size[1]} with 3 equations and a shape each")
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in ("png", "svg"):
+            jobs = [PlotJob([f"sin({k % 7 + 1}*x)", "x^2/10", "tan(x)"], ["shape:circle:0:0:5"], size=size,
+                            outputs=[os.path.join(directory, f"{k}.{extension}")]) for k in range(images)]
+            for processes in (1, None):
+                start = time.perf_counter()
+                results = export_jobs(jobs, processes)
+                elapsed = time.perf_counter() - start
+                failed = sum(1 for _, error in results if error)
+                print(f"  {extension} with {processes or os.cpu_count()} process(es): {elapsed * 1000 / images:6.2f} ms per image, "
+                      f"{images / elapsed:7.1f} images/s ({failed} failed)")
+
+
+# Startup paths timed in fresh interpreters: (label, code). The window opens on SDL's dummy video driver
+STARTUP_PATHS = [
+    ("interpreter and numpy", "import numpy"),
+    ("core", "import core"),
+    ("core, plotting sin(x)", "import core; g = core.Grapher(); g.add_equation('sin(x)'); "
+                              "g.sample_equation(g.equations[0][0])"),
+    ("main module", "import main"),
+    ("pygame and OpenGL.GL/GLU/GLUT", "import pygame, OpenGL.GL, OpenGL.GLU, OpenGL.GLUT"),
+    ("main module and a window", "import main; main.EquationGrapher(sampling_workers=0, opengl=False)"),
+]
+
+
+def bench_startup(paths: Sequence[Tuple[str, str]] = STARTUP_PATHS, repeat: int = 5):
+    print("Startup: best wall time of fresh interpreters for each import path, and whether it loaded pygame or OpenGL")
+    here = os.path.dirname(os.path.abspath(__file__))
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    check = "; import sys; print(sorted({'pygame', 'OpenGL'} & set(sys.modules)))"
+    for label, code in paths:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "-c", code + check], cwd=here, env=environment,
+                                    capture_output=True, text=True)
+            times.append(time.perf_counter() - start)
+        loaded = result.stdout.strip().splitlines()[-1] if result.returncode == 0 else "failed"
+        print(f"  {label:<34}{min(times) * 1000:>8.0f} ms   GUI libraries loaded: {loaded}")
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'expressions': bench_expressions,
+    'sampling': bench_sampling,
+    'implicit': bench_implicit,
+    'parametric': bench_parametric,
+    'shared': bench_shared,
+    'analysis': bench_analysis,
+    'shapes': bench_shape_index,
+    'data': bench_data,
+    'scene': bench_scene,
+    'cache': bench_pan_cache,
+    'scheduler': bench_scheduler,
+    'session': bench_session,
+    'parameters': bench_parameters,
+    'export': bench_export,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
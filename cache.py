@@ -0,0 +1,364 @@
+import math
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from sampling import CurveSamples, sample_curve, sample_parametric
+from implicit import contour
+
+
+class TileKey(NamedTuple):
+    equation: Hashable  # The compiled equation the samples belong to
+    level: int          # Detail level: sampled at 2**level world units per pixel
+    band: int           # Vertical band the refinement was done for
+    index: int          # Position of the tile along x
+    preview: bool = False  # Coarse stand-in sampled without refinement, never used as a real tile
+
+
+class ContourKey(NamedTuple):
+    equation: Hashable  # The compiled implicit equation F(x, y) the contour belongs to
+    level: int          # Detail level: contoured at 2**level world units per pixel
+    column: int         # Position of the square tile along x
+    row: int            # Position of the square tile along y
+
+
+class ParametricKey(NamedTuple):
+    equation: Hashable  # The compiled parametric or polar curve the samples belong to
+    level: int          # Detail level: sampled at 2**level world units per pixel
+    column: int         # Position of the region's center cell along x
+    row: int            # Position of the region's center cell along y
+    reach: int          # Size of a center cell in pixels; the region sampled is twice as large
+
+
+class CachedCurve:
+    """Strips for a visible x-range, assembled from cached tiles"""
+
+    def __init__(self, parts: List[List[np.ndarray]], keys: Tuple[TileKey, ...], wanted: Tuple[TileKey, ...],
+                 pending: int, level: int, segments: bool = False):
+        self.parts = parts
+        self.keys = keys        # Tiles the strips came from; unchanged keys mean unchanged geometry
+        self.wanted = wanted    # Tiles at the requested level that cover the view
+        self.pending = pending  # Tiles not sampled yet at the requested level (drawn from another level)
+        self.level = level
+        self.segments = segments  # Strips hold pairs of segment endpoints (GL_LINES) rather than polylines
+        self._strips = None
+
+    @property
+    def strips(self) -> List[np.ndarray]:
+        if self._strips is None:
+            if self.segments:
+                pieces = [strip for part in self.parts for strip in part]
+                self._strips = [np.concatenate(pieces)] if pieces else []
+            else:
+                self._strips = stitch(self.parts)
+        return self._strips
+
+
+class SampleCache:
+    """Cache of sampled curve tiles for every equation, with an LRU memory cap.
+
+    The x-axis is cut into tiles ``tile_pixels`` wide at each detail level,
+    where level ``L`` samples at ``2**L`` world units per pixel. Panning only
+    samples tiles that were not on screen before; after a zoom, tiles at the
+    nearest cached level stand in for missing ones while the finer level is
+    filled in a few tiles per frame.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, tile_pixels: int = 256, band_pixels: int = 2048):
+        self.max_bytes = max_bytes
+        self.tile_pixels = tile_pixels
+        self.band_pixels = band_pixels
+        self.preview_levels = 3  # A preview tile is 2**3 times coarser than the tiles it stands in for
+        self.tiles: "OrderedDict[TileKey, List[np.ndarray]]" = OrderedDict()
+        self.tile_bytes: Dict[TileKey, int] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.evictions = 0
+        self.evaluations = 0  # Function evaluations spent on every tile sampled so far
+
+    @staticmethod
+    def level_for(units_per_pixel: float) -> int:
+        """Finest detail level that is at least as fine as the screen"""
+        return math.floor(math.log2(units_per_pixel))
+
+    def tile_width(self, level: int) -> float:
+        return self.tile_pixels * 2.0 ** level
+
+    def band_for(self, level: int, y_min: float, y_max: float) -> int:
+        return math.floor((y_min + y_max) / 2 / (self.band_pixels * 2.0 ** level))
+
+    def tile_range(self, level: int, x_min: float, x_max: float) -> range:
+        width = self.tile_width(level)
+        return range(math.floor(x_min / width), math.floor(x_max / width) + 1)
+
+    def sample_tile(self, func: Callable, key: TileKey) -> List[np.ndarray]:
+        samples = sample_tile(func, key, self.tile_pixels, self.band_pixels)
+        self.evaluations += samples.evaluations
+        return samples.strips
+
+    def store(self, key: TileKey, strips: List[np.ndarray]):
+        size = sum(strip.nbytes for strip in strips) + 64
+        if key in self.tiles:
+            self.total_bytes -= self.tile_bytes[key]
+        self.tiles[key] = strips
+        self.tiles.move_to_end(key)
+        self.tile_bytes[key] = size
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes and len(self.tiles) > 1:
+            old_key, _ = self.tiles.popitem(last=False)
+            self.total_bytes -= self.tile_bytes.pop(old_key)
+            self.evictions += 1
+
+    def lookup(self, key: TileKey) -> Optional[List[np.ndarray]]:
+        strips = self.tiles.get(key)
+        if strips is not None:
+            self.tiles.move_to_end(key)
+        return strips
+
+    def fallback(self, key: TileKey, y_min: float, y_max: float) -> Optional[List[TileKey]]:
+        """Cached tiles from the nearest other detail level that together cover a missing tile"""
+        x_min = key.index * self.tile_width(key.level)
+        x_max = x_min + self.tile_width(key.level)
+        for distance in range(1, 5):
+            for level in (key.level + distance, key.level - distance):
+                band = self.band_for(level, y_min, y_max)
+                keys = [TileKey(key.equation, level, band, index) for index in self.tile_range(level, x_min, x_max)]
+                if all(other in self.tiles for other in keys):
+                    return keys
+        return None
+
+    def preview(self, func: Callable, key: TileKey, y_min: float, y_max: float) -> TileKey:
+        """A cheap, unrefined tile several levels coarser covering ``key``, sampled right away if not cached"""
+        level = key.level + self.preview_levels
+        x_center = (key.index + 0.5) * self.tile_width(key.level)
+        preview_key = TileKey(key.equation, level, self.band_for(level, y_min, y_max),
+                              math.floor(x_center / self.tile_width(level)), preview=True)
+        if preview_key not in self.tiles:
+            self.misses += 1
+            self.store(preview_key, self.sample_tile(func, preview_key))
+        return preview_key
+
+    def curve(self, func: Callable, x_min: float, x_max: float, y_min: float, y_max: float,
+              width: int, max_new_tiles: Optional[int] = None, scheduler=None) -> CachedCurve:
+        """Strips covering the visible range from cached tiles, sampling what is missing.
+
+        Without a scheduler, at most ``max_new_tiles`` missing tiles are
+        sampled here; the rest are drawn from another cached level when one
+        exists. With a SamplingScheduler, every missing tile is queued on the
+        workers instead and drawn from another level, or from a coarse
+        preview sampled on the spot, until its result is collected.
+        """
+        level = self.level_for((x_max - x_min) / width)
+        band = self.band_for(level, y_min, y_max)
+        parts = []
+        keys = []
+        wanted = []
+        used = set()
+        pending = 0
+        budget = max_new_tiles
+        for index in self.tile_range(level, x_min, x_max):
+            key = TileKey(func, level, band, index)
+            wanted.append(key)
+            strips = self.lookup(key)
+            if strips is not None:
+                self.hits += 1
+                parts.append(strips)
+                keys.append(key)
+                continue
+            if scheduler is not None or (budget is not None and budget <= 0):
+                others = self.fallback(key, y_min, y_max)
+                if others is None and scheduler is not None:
+                    others = [self.preview(func, key, y_min, y_max)]
+                if others is not None:
+                    if scheduler is not None:
+                        scheduler.submit(key, sample_tile, func, key, self.tile_pixels, self.band_pixels)
+                    self.fallbacks += 1
+                    pending += 1
+                    others = [other for other in others if other not in used]
+                    parts.extend(self.lookup(other) for other in others)
+                    keys.extend(others)
+                    used.update(others)
+                    continue
+            self.misses += 1
+            strips = self.sample_tile(func, key)
+            self.store(key, strips)
+            parts.append(strips)
+            keys.append(key)
+            if budget is not None:
+                budget -= 1
+        return CachedCurve(parts, tuple(keys), tuple(wanted), pending, level)
+
+    def contour_fallback(self, key: ContourKey) -> Optional[List[ContourKey]]:
+        """Cached contour tiles from the nearest other detail level that together cover a missing tile"""
+        size = self.tile_width(key.level)
+        x_min, y_min = key.column * size, key.row * size
+        # Shrink the square slightly so ranges do not spill into the neighbouring tiles
+        x_max, y_max = x_min + size * 0.999, y_min + size * 0.999
+        for distance in range(1, 4):
+            for level in (key.level + distance, key.level - distance):
+                keys = [ContourKey(key.equation, level, column, row)
+                        for row in self.tile_range(level, y_min, y_max)
+                        for column in self.tile_range(level, x_min, x_max)]
+                if all(other in self.tiles for other in keys):
+                    return keys
+        return None
+
+    def contour(self, func: Callable, x_min: float, x_max: float, y_min: float, y_max: float,
+                width: int, max_new_tiles: Optional[int] = None, scheduler=None) -> CachedCurve:
+        """Segments of an implicit curve F(x, y) = 0 over the view, from square cached tiles.
+
+        The plane is cut into tiles ``tile_pixels`` square at each detail
+        level, each contoured on its own, so panning only contours the tiles
+        that come into view. Missing tiles are handled as in ``curve``, with
+        other cached levels standing in; there are no previews.
+        """
+        level = self.level_for((x_max - x_min) / width)
+        parts = []
+        keys = []
+        wanted = []
+        used = set()
+        pending = 0
+        budget = max_new_tiles
+        for row in self.tile_range(level, y_min, y_max):
+            for column in self.tile_range(level, x_min, x_max):
+                key = ContourKey(func, level, column, row)
+                wanted.append(key)
+                segments = self.lookup(key)
+                if segments is not None:
+                    self.hits += 1
+                    parts.append(segments)
+                    keys.append(key)
+                    continue
+                if scheduler is not None or (budget is not None and budget <= 0):
+                    if scheduler is not None:
+                        scheduler.submit(key, contour_tile, func, key, self.tile_pixels)
+                    others = self.contour_fallback(key)
+                    if others is not None:
+                        self.fallbacks += 1
+                        others = [other for other in others if other not in used]
+                        parts.extend(self.lookup(other) for other in others)
+                        keys.extend(others)
+                        used.update(others)
+                    pending += 1
+                    continue
+                self.misses += 1
+                samples = contour_tile(func, key, self.tile_pixels)
+                self.evaluations += samples.evaluations
+                self.store(key, samples.strips)
+                parts.append(samples.strips)
+                keys.append(key)
+                if budget is not None:
+                    budget -= 1
+        return CachedCurve(parts, tuple(keys), tuple(wanted), pending, level, segments=True)
+
+    def parametric(self, func: Callable, x_min: float, x_max: float, y_min: float, y_max: float,
+                   width: int, height: int, scheduler=None) -> CachedCurve:
+        """Strips of a parametric or polar curve sampled over a region around the view.
+
+        A parametric curve cannot be cut into tiles along x, so it is sampled
+        as a whole, refined for a region twice the size of the view snapped
+        to a grid of view-sized cells. Small pans stay within the region and
+        reuse it. With a scheduler, a missing region is sampled on the
+        workers while the most recent cached region of the curve is drawn.
+        """
+        level = self.level_for((x_max - x_min) / width)
+        reach = 2 ** math.ceil(math.log2(max(width, height)))
+        size = reach * 2.0 ** level
+        key = ParametricKey(func, level, math.floor((x_min + x_max) / 2 / size),
+                            math.floor((y_min + y_max) / 2 / size), reach)
+        strips = self.lookup(key)
+        if strips is not None:
+            self.hits += 1
+            return CachedCurve([strips], (key,), (key,), 0, level)
+        if scheduler is not None:
+            scheduler.submit(key, parametric_tile, func, key)
+            other = self.parametric_fallback(key)
+            if other is not None:
+                self.fallbacks += 1
+                return CachedCurve([self.lookup(other)], (other,), (key,), 1, level)
+            return CachedCurve([], (), (key,), 1, level)
+        self.misses += 1
+        samples = parametric_tile(func, key)
+        self.evaluations += samples.evaluations
+        self.store(key, samples.strips)
+        return CachedCurve([samples.strips], (key,), (key,), 0, level)
+
+    def parametric_fallback(self, key: ParametricKey) -> Optional[ParametricKey]:
+        """The most recently used cached region of the same curve, preferring the same level"""
+        others = [other for other in reversed(self.tiles)
+                  if isinstance(other, ParametricKey) and other.equation is key.equation]
+        if not others:
+            return None
+        return min(others, key=lambda other: abs(other.level - key.level))
+
+    def absorb(self, results: List[Tuple[TileKey, CurveSamples]]) -> int:
+        """Store tiles finished by the workers; returns how many arrived"""
+        for key, samples in results:
+            self.misses += 1
+            self.evaluations += samples.evaluations
+            self.store(key, samples.strips)
+        return len(results)
+
+    def invalidate(self, equation: Hashable):
+        """Drop every tile that belongs to an equation"""
+        for key in [key for key in self.tiles if key.equation is equation]:
+            del self.tiles[key]
+            self.total_bytes -= self.tile_bytes.pop(key)
+
+    def clear(self):
+        self.tiles.clear()
+        self.tile_bytes.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'fallbacks': self.fallbacks,
+            'evictions': self.evictions,
+            'evaluations': self.evaluations,
+            'tiles': len(self.tiles),
+            'bytes': self.total_bytes,
+        }
+
+
+def sample_tile(func: Callable, key: TileKey, tile_pixels: int, band_pixels: int) -> CurveSamples:
+    """Sample one tile, refined for its band and the bands either side of it.
+
+    A plain function so worker processes can run it without the cache.
+    """
+    width = tile_pixels * 2.0 ** key.level
+    band_height = band_pixels * 2.0 ** key.level
+    # A preview stops after the first round of midpoints
+    min_step = 4.0 if key.preview else 1.0 / 64
+    samples = sample_curve(func, key.index * width, (key.index + 1) * width, tile_pixels,
+                           (key.band - 1) * band_height, (key.band + 2) * band_height, 3 * band_pixels,
+                           min_step=min_step)
+    return samples
+
+
+def contour_tile(func: Callable, key: ContourKey, tile_pixels: int) -> CurveSamples:
+    """Contour one square tile of an implicit equation; a plain function for worker processes"""
+    size = tile_pixels * 2.0 ** key.level
+    return contour(func, key.column * size, (key.column + 1) * size, key.row * size, (key.row + 1) * size,
+                   tile_pixels, tile_pixels)
+
+
+def parametric_tile(func: Callable, key: ParametricKey) -> CurveSamples:
+    """Sample a parametric curve for the region a key covers; a plain function for worker processes"""
+    size = key.reach * 2.0 ** key.level
+    return sample_parametric(func, func.t_min, func.t_max, (key.column - 0.5) * size, (key.column + 1.5) * size,
+                             (key.row - 0.5) * size, (key.row + 1.5) * size, 2 * key.reach, 2 * key.reach)
+
+
+def stitch(parts: List[List[np.ndarray]]) -> List[np.ndarray]:
+    """Join strips from neighbouring tiles that meet at the shared tile edge"""
+    strips: List[np.ndarray] = []
+    for part in parts:
+        for strip in part:
+            if strips and strips[-1][-1, 0] == strip[0, 0] and strips[-1][-1, 1] == strip[0, 1]:
+                strips[-1] = np.concatenate((strips[-1], strip[1:]))
+            else:
+                strips.append(strip)
+    return strips
@@ -0,0 +1,414 @@
+import os
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from analysis import CurveAnalysis, Features, merge_features
+from expression import CompiledExpression, ExpressionError, ParametricCurve, compile_expression, parse_equation_source
+from cache import CachedCurve, SampleCache
+from dataset import parse_data_source
+from geometry import PALETTE, parse_shapes
+from implicit import contour
+from parameters import ParameterSet, parse_parameter
+from sampling import CurveSamples, initial_grid, sample_curve, sample_parametric
+from scene import read_scene, save_scene
+from shapes import ShapeStore
+from subexpressions import ExpressionGraph, SharedExpression
+from view import ViewTransform
+from workers import SamplingScheduler
+
+
+class Grapher:
+    """Equations, shapes and the view, with parsing, sampling and scenes, but no window.
+
+    Imports neither pygame nor OpenGL, so scripts, batch jobs and sampling
+    worker processes can load it in a fraction of the GUI's startup time.
+    EquationGrapher in main.py draws it in a window and feeds it input.
+    Parts that change are recorded in ``dirty`` for whoever draws them.
+    """
+
+    def __init__(self, width: int = 800, height: int = 600, sampling_workers: Optional[int] = 0,
+                 sampling_mode: str = "thread"):
+        self.width = int(width)
+        self.height = int(height)
+
+        # View settings: zoom and center, eased and coasting as the user moves them
+        self.view = ViewTransform(self.width, self.height)
+
+        # Equation storage with colors and visibility
+        self.equations = []  # List of tuples (function, color, equation_string, visible)
+        self.expressions = ExpressionGraph()  # Subexpressions shared by the visible equations
+
+        # Named parameters equations can read ("a = 2"), changed by sliders or animated.
+        # While one moves, the equations reading it are sampled over the view alone, a few per
+        # frame within live_budget seconds, and drawn from ``live`` until its value settles
+        self.parameters = ParameterSet()
+        self.live: Dict[int, Tuple[CurveSamples, Tuple[float, float, float, float]]] = {}
+        self.live_queue: 'OrderedDict[int, None]' = OrderedDict()  # Equations waiting to be sampled live
+        self.live_budget = 0.008
+
+        # Sampled curve tiles, reused across frames while panning and zooming
+        self.sample_cache = SampleCache()
+        self.tiles_per_frame = 2  # New tiles sampled per equation per frame after a zoom
+        self.analysis = CurveAnalysis()  # Roots, extrema and intersections found per cached tile
+
+        # Curve tiles are sampled on a worker pool ("thread" or "process"); 0 workers samples on this thread.
+        # The pool starts its workers on the first tile submitted
+        self.scheduler = None
+        if sampling_workers != 0:
+            self.scheduler = SamplingScheduler(sampling_workers, sampling_mode, on_done=self.notify_samples_ready)
+
+        # Shape storage
+        self.shapes = ShapeStore()  # Parameters and colors per shape type, drawn in batches
+        self.scene_loader = None    # Items of a scene still being loaded, see load_scene
+        self.scene_path = None
+        self.scene_failures = 0
+
+        # Available colors for equations and shapes
+        self.colors = list(PALETTE)
+
+        self.message = ""
+        self.dirty = {"view", "equations", "shapes", "message"}
+
+    def visible_bounds(self) -> Tuple[float, float, float, float]:
+        """World-space (x_min, x_max, y_min, y_max) currently on screen"""
+        return self.view.bounds()
+
+    def mark_dirty(self, *parts):
+        self.dirty.update(parts)
+
+    def show_message(self, text, is_success, duration=5000, color=None):
+        self.message = text
+        self.mark_dirty("message")
+
+    def notify_samples_ready(self):
+        """Called on a worker thread when tiles finish; they are picked up by collect_samples"""
+
+    def create_safe_function(self, expression: str) -> CompiledExpression:
+        """Creates a safe function from a string expression"""
+        # Parsed and checked against the whitelist once; evaluates whole arrays of x
+        return compile_expression(expression)
+
+    def parse_equation(self, equation_str: str, report: bool = True) -> Callable[[float], float]:
+        """Parse equation string into a safe function; report=False skips the error messages, for bulk imports"""
+        try:
+            if equation_str.strip().lower().startswith("data:"):
+                return parse_data_source(equation_str)
+            return parse_equation_source(equation_str, self.parameters.values)
+        except Exception as e:
+            if report:
+                print(f"Error parsing equation: {e}")
+                self.show_message("Failed to process equation, press help for instructions", False)
+            return None
+
+    def add_equation(self, equation_str: str, color=None, visible=True, report=True) -> bool:
+        """Parse and add an equation; report=False leaves error messages to the caller"""
+        func = self.parse_equation(equation_str, report)
+        if func is None:
+            return False
+        if color is None:
+            color = self.colors[len(self.equations) % len(self.colors)]
+        if isinstance(func, CompiledExpression) and not func.parameters:
+            # Explicit and implicit equations evaluate through the shared graph; hidden ones are not in it.
+            # Those reading parameters are left out, their values change too often to be worth keeping
+            func = self.expressions.add(func)
+            self.share_expression(func, visible)
+        self.parameters.depend(len(self.equations), getattr(func, "parameters", ()))
+        self.equations.append((func, tuple(color), equation_str, visible))
+        self.mark_dirty("equations")
+        return True
+
+    def set_visible(self, index: int, visible: bool):
+        func, color, eq_str, _ = self.equations[index]
+        self.equations[index] = (func, color, eq_str, visible)
+        self.share_expression(func, visible)
+        if visible and index in self.live:
+            self.live_queue[index] = None  # Its live strips may be for an earlier value or view
+        self.mark_dirty("equations")
+
+    def share_expression(self, func, visible: bool):
+        """Keep a shared equation's nodes in the graph only while it is visible"""
+        if isinstance(func, SharedExpression):
+            if visible:
+                self.expressions.retain(func)
+            else:
+                self.expressions.release(func)
+
+    def sample_equation(self, equation_func: Callable) -> CachedCurve:
+        """Strips of a parsed equation (not a data series) over the view, from cached tiles"""
+        # Sample density follows the window's pixel width, not the zoom level; tiles
+        # already sampled for this detail level are reused from the cache
+        x_min, x_max, y_min, y_max = self.visible_bounds()
+        if isinstance(equation_func, ParametricCurve):
+            # Parametric and polar curves are sampled along t for a region around the view
+            return self.sample_cache.parametric(equation_func, x_min, x_max, y_min, y_max, self.width, self.height,
+                                                scheduler=self.scheduler)
+        if equation_func.implicit:
+            # F(x, y) = 0 is contoured in square tiles rather than sampled along x
+            return self.sample_cache.contour(equation_func, x_min, x_max, y_min, y_max, self.width,
+                                             max_new_tiles=self.tiles_per_frame, scheduler=self.scheduler)
+        return self.sample_cache.curve(equation_func, x_min, x_max, y_min, y_max, self.width,
+                                       max_new_tiles=self.tiles_per_frame, scheduler=self.scheduler)
+
+    def define_parameter(self, text: str, report: bool = True) -> Optional[bool]:
+        """Define or change a parameter from "a = 2" or "a = 2, 0..5".
+
+        Returns None if the text is not a parameter definition, else whether it was valid.
+        """
+        try:
+            definition = parse_parameter(text)
+        except ExpressionError as e:
+            if report:
+                print(f"Error defining parameter: {e}")
+                self.show_message("Failed to define parameter, use a = 2 or a = 2, 0..5", False)
+            return False
+        if definition is None:
+            return None
+        name, value, low, high = definition
+        self.add_parameter(name, value, low, high)
+        if report:
+            self.show_message(f"{name} = {self.parameters[name].value:g}", True)
+        return True
+
+    def add_parameter(self, name: str, value: float, low: Optional[float] = None, high: Optional[float] = None):
+        """Add a parameter, or change one and bind the equations reading it to the new value"""
+        if self.parameters.define(name, value, low, high):
+            self.settle_parameters([name])
+        self.mark_dirty("parameters")
+
+    def set_parameter(self, name: str, value: float, settle: bool = True):
+        """Change a parameter's value; unless ``settle``, the dependent equations are only sampled live"""
+        if not self.parameters.set(name, value):
+            return
+        if settle:
+            self.settle_parameters([name])
+        else:
+            for index in self.parameters.affected([name]):
+                self.live_queue[index] = None
+        self.mark_dirty("parameters")
+
+    def animate_parameter(self, name: str) -> bool:
+        """Start or stop sweeping a parameter over its slider's range; returns False for an unknown name"""
+        if name not in self.parameters:
+            self.show_message(f"No parameter named {name!r}, define it with {name} = 1", False)
+            return False
+        if not self.parameters.animate(name):
+            self.settle_parameters([name])
+        self.mark_dirty("parameters")
+        return True
+
+    def update_parameters(self, dt: float):
+        """Step animated parameters by ``dt`` seconds, queueing the equations that read them"""
+        changed = self.parameters.advance(dt)
+        for index in self.parameters.affected(changed):
+            self.live_queue[index] = None
+        if changed:
+            self.mark_dirty("parameters")
+
+    def settle_parameters(self, names: Iterable[str]):
+        """Bind the equations reading these parameters to their values, for sampling into cached tiles.
+
+        Equations that also read a parameter that is still animating stay live.
+        """
+        values = self.parameters.values
+        for index in self.parameters.affected(names):
+            func, color, eq_str, visible = self.equations[index]
+            if any(self.parameters[name].animating for name in func.parameters):
+                self.live_queue[index] = None
+                continue
+            bound = func.bind(values)
+            if bound is not func:
+                self.equations[index] = (bound, color, eq_str, visible)
+                self.discard_samples(func)
+            self.live.pop(index, None)
+            self.live_queue.pop(index, None)
+        self.mark_dirty("equations")
+
+    def discard_samples(self, func: Callable):
+        """Forget the tiles of an equation that was replaced"""
+        self.sample_cache.invalidate(func)
+        if self.scheduler is not None:
+            self.scheduler.discard(lambda key: key.equation is func)
+
+    def sample_live(self, budget: Optional[float] = None) -> int:
+        """Sample queued equations over the view for their current parameter values; returns how many.
+
+        Works through the queue in order for up to ``budget`` seconds (at
+        least one equation per call), so a slider drag or an animation over
+        many curves keeps the frame rate and the rest wait for the next frame.
+        """
+        bounds = self.visible_bounds()
+        for index, (_, sampled_for) in self.live.items():
+            if sampled_for != bounds:
+                self.live_queue[index] = None
+        deadline = time.perf_counter() + (self.live_budget if budget is None else budget)
+        values = self.parameters.values
+        sampled = 0
+        while self.live_queue and (not sampled or time.perf_counter() < deadline):
+            index, _ = self.live_queue.popitem(last=False)
+            func, _, _, visible = self.equations[index]
+            if not visible:
+                continue
+            self.live[index] = (self.sample_view(func.bind(values)), bounds)
+            sampled += 1
+        if self.live_queue:
+            self.mark_dirty("samples")
+        return sampled
+
+    def sample_view(self, func: Callable) -> CurveSamples:
+        """Samples of an equation over just the view, at screen resolution and without tiles"""
+        x_min, x_max, y_min, y_max = self.visible_bounds()
+        if isinstance(func, ParametricCurve):
+            return sample_parametric(func, func.t_min, func.t_max, x_min, x_max, y_min, y_max, self.width, self.height)
+        if func.implicit:
+            return contour(func, x_min, x_max, y_min, y_max, self.width, self.height, min_cell_pixels=2.0)
+        return sample_curve(func, x_min, x_max, self.width, y_min, y_max, self.height, min_step=1.0)
+
+    def analyzable(self, index: int) -> bool:
+        """Whether an equation is a visible y = f(x) drawn from cached tiles, which analyze works on"""
+        func, _, _, visible = self.equations[index]
+        return (visible and index not in self.live and not isinstance(func, ParametricCurve)
+                and isinstance(func, (CompiledExpression, SharedExpression)) and not func.implicit)
+
+    def analyze(self, curves: Optional[Dict[int, CachedCurve]] = None, budget: Optional[float] = None) -> Features:
+        """Roots, local extrema and pairwise intersections of the visible y = f(x) equations in view.
+
+        ``curves`` are the equations' CachedCurves for this view, sampled
+        here if not given. Roots and extrema come from sign and slope
+        changes in each tile's cached samples; intersections of all pairs
+        from the curves evaluated together on every tile's sampling grid.
+        Both are refined with a vectorized Brent solver and kept per tile,
+        so a pan only analyzes the tiles that come into view. With a
+        ``budget`` in seconds, tiles left over are analyzed on later calls.
+
+        Returns the points in view, with ``first`` the equation's index and
+        ``second`` the other equation's for intersections, -1 otherwise;
+        ``analysis.feature_list`` turns them into Feature tuples.
+        """
+        indices = [index for index in range(len(self.equations)) if self.analyzable(index)]
+        if curves is None:
+            curves = {index: self.sample_equation(self.equations[index][0]) for index in indices}
+        indices = [index for index in indices if index in curves]
+        x_min, x_max, y_min, y_max = self.visible_bounds()
+        self.analysis.start(budget)
+        found = []
+        for index in indices:
+            curve = curves[index]
+            features = self.analysis.curve(self.equations[index][0], curve.keys, curve.parts)
+            found.append(features._replace(first=np.full(len(features.xs), index),
+                                           second=np.full(len(features.xs), -1)))
+
+        # Intersections tile by tile over the tiles of the view, on the grid each tile starts sampling from
+        funcs = tuple(self.equations[index][0] for index in indices)
+        if len(funcs) > 1:
+            level = self.sample_cache.level_for((x_max - x_min) / self.width)
+            width = self.sample_cache.tile_width(level)
+            count = int(np.ceil(self.sample_cache.tile_pixels / 4)) + 1
+            positions = np.array(indices)
+            for tile in self.sample_cache.tile_range(level, x_min, x_max):
+                features = self.analysis.intersections(
+                    funcs, (level, tile), lambda tile=tile: initial_grid(tile * width, (tile + 1) * width, count))
+                found.append(features._replace(first=positions[features.first], second=positions[features.second]))
+        if self.analysis.incomplete:
+            self.mark_dirty("samples")
+        return merge_features(found, (x_min, x_max, y_min, y_max))
+
+    def collect_samples(self) -> int:
+        """Move tiles the workers finished into the cache; returns how many"""
+        if self.scheduler is None:
+            return 0
+        return self.sample_cache.absorb(self.scheduler.collect())
+
+    def handle_shape_input(self, shape_input: str):
+        if self.handle_shape_inputs([shape_input]):
+            print(f"Added shape: {shape_input}")
+
+    def handle_shape_inputs(self, shape_inputs: List[str], colors: Optional[np.ndarray] = None) -> int:
+        """Add many "shape:..." strings at once; returns how many were added.
+
+        Shapes without ``colors`` take the next palette colors in turn.
+        Errors are printed once for the whole batch.
+        """
+        values, positions, errors = parse_shapes(shape_inputs)
+        if colors is None:
+            palette = np.array(self.colors, dtype=np.float32)
+            colors = palette[(len(self.shapes) + np.arange(len(shape_inputs))) % len(palette)]
+        added = 0
+        for shape_type, rows in values.items():
+            if len(rows):
+                self.shapes.add_many(shape_type, rows, colors[positions[shape_type]])
+                added += len(rows)
+        if errors:
+            more = f" (and {len(errors) - 1} more)" if len(errors) > 1 else ""
+            print(f"Error adding shape: {errors[0]}{more}")
+        if added:
+            self.mark_dirty("shapes")
+        return added
+
+    def save_scene(self, path: str):
+        equations = [(eq_str, color, visible) for _, color, eq_str, visible in self.equations]
+        try:
+            parameters = [(p.name, p.value, p.low, p.high) for p in self.parameters]
+            save_scene(path, (self.view.zoom, self.view.x_offset, self.view.y_offset), equations, self.shapes,
+                       parameters=parameters)
+            self.show_message(f"Saved {len(equations)} equations and {len(self.shapes)} shapes to {path}", True)
+        except OSError as e:
+            print(f"Error saving scene: {e}")
+            self.show_message(f"Could not save {path}", False)
+
+    def load_scene(self, path: str):
+        """Replace the scene with a saved one, read a block at a time between frames"""
+        if not os.path.isfile(path):
+            self.show_message(f"No such scene file: {path}", False)
+            return
+        self.clear_scene()
+        self.scene_loader = read_scene(path)
+        self.scene_path = path
+        self.scene_failures = 0
+        self.continue_loading()
+
+    def continue_loading(self, budget: float = 0.03):
+        """Add scene items for up to ``budget`` seconds, so the window keeps drawing while a big scene loads"""
+        deadline = time.perf_counter() + budget
+        try:
+            for kind, item in self.scene_loader:
+                if kind == "view":
+                    self.view.jump(*item)
+                    self.mark_dirty("view")
+                elif kind == "parameter":
+                    self.add_parameter(*item)
+                elif kind == "equation":
+                    source, color, visible = item
+                    if not self.add_equation(source, color, visible, report=False):
+                        self.scene_failures += 1
+                elif kind == "shapes":
+                    shape_type, rows, colors = item
+                    self.shapes.add_many(shape_type, rows, colors)
+                    self.mark_dirty("shapes")
+                elif kind == "shape_inputs":
+                    inputs, colors = item
+                    self.scene_failures += len(inputs) - self.handle_shape_inputs(inputs, colors)
+                if time.perf_counter() > deadline:
+                    return
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            print(f"Error loading scene: {e}")
+            self.show_message(f"Could not load {self.scene_path}", False)
+            self.scene_loader = None
+            return
+        self.scene_loader = None
+        failed = f", {self.scene_failures} items skipped" if self.scene_failures else ""
+        self.show_message(f"Loaded {len(self.equations)} equations and {len(self.shapes)} shapes{failed}",
+                          not self.scene_failures)
+
+    def clear_scene(self):
+        self.equations = []
+        self.expressions = ExpressionGraph()
+        self.parameters.clear()
+        self.analysis.clear()
+        self.live.clear()
+        self.live_queue.clear()
+        self.shapes.clear()
+        self.sample_cache.clear()
+        if self.scheduler is not None:
+            self.scheduler.discard(lambda key: True)
+        self.mark_dirty("equations", "shapes")
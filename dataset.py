@@ -0,0 +1,272 @@
+import itertools
+import os
+import numpy as np
+from typing import List, Optional, Tuple
+from sampling import split_strips
+
+# Columns of a pyramid row: the first, lowest, highest and last point of a run of samples (M4)
+PYRAMID_FIELDS = ('x_first', 'y_first', 'x_min', 'y_min', 'x_max', 'y_max', 'x_last', 'y_last')
+
+# Raw binary files: extension to element type
+RAW_TYPES = {'.f32': np.float32, '.f64': np.float64, '.bin': np.float64}
+
+
+class SeriesView:
+    """Strips of a data series for one view, and what was read from disk to draw them"""
+
+    def __init__(self, strips: List[np.ndarray], level: int, start: int, stop: int, rows_read: int):
+        self.strips = strips
+        self.level = level          # 0 for raw samples, else the pyramid level the rows came from
+        self.start = start          # Sample range covered
+        self.stop = stop
+        self.rows_read = rows_read  # Samples or pyramid rows read from disk
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        return self.level, self.start, self.stop
+
+
+class DataSeries:
+    """Measured points plotted next to the equations, read from disk through memory maps.
+
+    Samples must be sorted by x. One-column data is plotted against the
+    sample index. Nothing is read in full: a view binary-searches the x
+    column for its range and reads either the raw samples in it or, when
+    there are several samples per pixel, the rows of a precomputed
+    min/max pyramid. Every pyramid row holds the first, lowest, highest
+    and last point of ``fanout ** level`` samples; merging the rows that
+    fall in each pixel column gives the same four points the raw data
+    would (M4 decimation), so the line looks the same as drawing it all.
+    """
+
+    implicit = False
+
+    def __init__(self, source: str, path: str, data: np.ndarray, fanout: int = 8, min_rows: int = 1024):
+        self.source = source
+        self.path = path
+        self.data = data
+        self.fanout = fanout
+        if data.ndim == 1:
+            self.x, self.y = None, data
+        else:
+            self.x, self.y = data[:, 0], data[:, 1]
+        # Level sizes follow from the length alone, so the rows of all levels share one file
+        self.level_sizes = [len(self)]
+        while self.level_sizes[-1] > min_rows:
+            self.level_sizes.append(-(-self.level_sizes[-1] // fanout))
+        self.level_starts = np.concatenate(([0], np.cumsum(self.level_sizes[1:]))).astype(np.int64)
+        self.pyramid: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+    def __repr__(self):
+        return f"DataSeries({self.source!r})"
+
+    @property
+    def pyramid_path(self) -> str:
+        return self.path + '.m4.npy'
+
+    def xs(self, start: int, stop: int) -> np.ndarray:
+        if self.x is None:
+            return np.arange(start, stop, dtype=np.float64)
+        return np.asarray(self.x[start:stop], dtype=np.float64)
+
+    def index_range(self, x_min: float, x_max: float) -> Tuple[int, int]:
+        """Samples covering [x_min, x_max], plus one on either side so the line runs off screen"""
+        if self.x is None:
+            start, stop = int(np.floor(x_min)), int(np.ceil(x_max)) + 1
+        else:
+            # Binary search on the mapped column touches a few pages, not the whole file
+            start = int(np.searchsorted(self.x, x_min, side='left'))
+            stop = int(np.searchsorted(self.x, x_max, side='right'))
+        return max(start - 1, 0), min(stop + 1, len(self))
+
+    def level_rows(self, level: int, start: int, stop: int) -> np.ndarray:
+        """Pyramid rows of a level covering samples [start, stop)"""
+        bucket = self.fanout ** level
+        first = self.level_starts[level - 1]
+        return np.asarray(self.pyramid[first + start // bucket:first + -(-stop // bucket)])
+
+    def open_pyramid(self):
+        """Map the pyramid stored next to the data, building it first if it is missing or stale"""
+        rows = int(self.level_starts[-1])
+        path = self.pyramid_path
+        try:
+            fresh = os.path.getmtime(path) >= os.path.getmtime(self.path)
+            pyramid = np.load(path, mmap_mode='r') if fresh else None
+        except (OSError, ValueError):
+            pyramid = None
+        if pyramid is None or pyramid.shape != (rows, len(PYRAMID_FIELDS)):
+            build_pyramid(self, path)
+            pyramid = np.load(path, mmap_mode='r')
+        self.pyramid = pyramid
+
+    def view(self, x_min: float, x_max: float, width: int) -> SeriesView:
+        """Strips for the visible x-range, at most four points per pixel column"""
+        start, stop = self.index_range(x_min, x_max)
+        if stop - start < 2:
+            return SeriesView([], 0, start, stop, 0)
+        per_pixel = (stop - start) / width
+        level = 0
+        # Coarsest level that still has a couple of rows per pixel column
+        while level + 1 < len(self.level_sizes) and self.fanout ** (level + 1) * 2 <= per_pixel:
+            level += 1
+        if level == 0:
+            ys = np.asarray(self.y[start:stop], dtype=np.float64)
+            return SeriesView(split_strips(self.xs(start, stop), ys), 0, start, stop, stop - start)
+
+        if self.pyramid is None:
+            self.open_pyramid()
+        rows = self.level_rows(level, start, stop).astype(np.float64)
+        # Rows that start in the same pixel column merge into one set of four points
+        column = np.floor((rows[:, 0] - x_min) * width / (x_max - x_min))
+        starts = np.flatnonzero(np.concatenate(([True], column[1:] != column[:-1])))
+        merged = merge_rows(rows, starts)
+        # First, then the lowest and highest in x order, then last
+        swap = merged[:, 2] > merged[:, 4]
+        points = merged.reshape(-1, 4, 2).copy()
+        points[swap, 1], points[swap, 2] = merged[swap, 4:6], merged[swap, 2:4]
+        points = points.reshape(-1, 2)
+        return SeriesView(split_strips(points[:, 0], points[:, 1]), level, start, stop, len(rows))
+
+
+def merge_rows(rows: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Merge groups of pyramid rows beginning at ``starts`` into one row each"""
+    ends = np.concatenate((starts[1:], [len(rows)])) - 1
+    merged = np.empty((len(starts), len(PYRAMID_FIELDS)))
+    merged[:, 0:2] = rows[starts, 0:2]
+    merged[:, 6:8] = rows[ends, 6:8]
+    # Lowest and highest of every group, taken with the x they occur at; NaN rows never win
+    group = np.repeat(np.arange(len(starts)), ends + 1 - starts)
+    for value, pick in ((3, np.fmin), (5, np.fmax)):
+        extreme = pick.reduceat(rows[:, value], starts)
+        # First row of each group where the extreme occurs; groups that are all NaN keep their first row
+        hits = np.flatnonzero(rows[:, value] == extreme[group])
+        chosen = starts.copy()
+        if len(hits):
+            first = np.concatenate(([True], group[hits][1:] != group[hits][:-1]))
+            chosen[group[hits][first]] = hits[first]
+        merged[:, value - 1:value + 1] = rows[chosen, value - 1:value + 1]
+    return merged
+
+
+def sample_rows(xs: np.ndarray, ys: np.ndarray, fanout: int) -> np.ndarray:
+    """Pyramid rows for every ``fanout`` raw samples, the last run possibly shorter"""
+    count = len(xs)
+    padded = -(-count // fanout) * fanout
+    x = np.concatenate((xs, np.full(padded - count, np.nan))).reshape(-1, fanout)
+    y = np.concatenate((ys, np.full(padded - count, np.nan))).reshape(-1, fanout)
+    rows = np.arange(len(y))
+    last = np.minimum(fanout, count - rows * fanout) - 1
+    # NaN samples never win; a run of only NaN keeps its first sample
+    lowest = np.where(np.isnan(y), np.inf, y).argmin(axis=1)
+    highest = np.where(np.isnan(y), -np.inf, y).argmax(axis=1)
+    return np.column_stack((x[:, 0], y[:, 0], x[rows, lowest], y[rows, lowest],
+                            x[rows, highest], y[rows, highest], x[rows, last], y[rows, last]))
+
+
+def build_pyramid(series: DataSeries, path: str, chunk_rows: int = 1 << 16):
+    """Write every pyramid level of a series to ``path``, reading the data a chunk at a time"""
+    rows = int(series.level_starts[-1])
+    temporary = f"{path}.{os.getpid()}.tmp"  # Export workers may build the same pyramid at once
+    pyramid = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.float64, shape=(rows, len(PYRAMID_FIELDS)))
+    fanout = series.fanout
+    chunk = chunk_rows * fanout
+    for level in range(1, len(series.level_sizes)):
+        source_size = series.level_sizes[level - 1]
+        target = series.level_starts[level - 1]
+        for begin in range(0, source_size, chunk):
+            end = min(begin + chunk, source_size)
+            if level == 1:
+                merged = sample_rows(series.xs(begin, end), np.asarray(series.y[begin:end], dtype=np.float64), fanout)
+            else:
+                first = series.level_starts[level - 2]
+                merged = merge_rows(np.asarray(pyramid[first + begin:first + end]), np.arange(0, end - begin, fanout))
+            offset = target + begin // fanout
+            pyramid[offset:offset + len(merged)] = merged
+    pyramid.flush()
+    del pyramid
+    os.replace(temporary, path)
+
+
+def csv_to_npy(path: str, chunk_lines: int = 1 << 20) -> str:
+    """Convert a CSV of y or x,y columns to a .npy next to it, streaming it in chunks of lines.
+
+    A first non-numeric line is taken as a header. The result is reused
+    while it is newer than the CSV.
+    """
+    target = path + '.npy'
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+
+    def is_number(text: str) -> bool:
+        try:
+            float(text)
+            return True
+        except ValueError:
+            return False
+
+    # First pass: count data lines and columns without keeping them
+    rows, columns, header = 0, 0, False
+    with open(path) as f:
+        for number, line in enumerate(f):
+            fields = line.strip().split(',')
+            if not line.strip():
+                continue
+            if number == 0 and not is_number(fields[0]):
+                header = True
+                continue
+            columns = columns or len(fields)
+            rows += 1
+    if columns not in (1, 2):
+        raise ValueError(f"Expected one or two columns in {path}")
+
+    shape = (rows,) if columns == 1 else (rows, 2)
+    temporary = f"{target}.{os.getpid()}.tmp"
+    output = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.float64, shape=shape)
+    position = 0
+    with open(path) as f:
+        lines = (line for line in itertools.islice(f, 1 if header else 0, None) if line.strip())
+        while True:
+            block = list(itertools.islice(lines, chunk_lines))
+            if not block:
+                break
+            values = np.loadtxt(block, delimiter=',', ndmin=2 if columns == 2 else 1)
+            output[position:position + len(values)] = values
+            position += len(values)
+    output.flush()
+    del output
+    os.replace(temporary, target)
+    return target
+
+
+def open_series(path: str, source: Optional[str] = None) -> DataSeries:
+    """Map a .npy, raw binary (.f32, .f64, .bin; append .xy for interleaved x,y pairs) or CSV file"""
+    source = source or f"data:{path}"
+    name = path.lower()
+    if name.endswith('.csv'):
+        return DataSeries(source, path, np.load(csv_to_npy(path), mmap_mode='r'))
+    if name.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+    else:
+        stem, extension = os.path.splitext(name[:-3] if name.endswith('.xy') else name)
+        if extension not in RAW_TYPES:
+            raise ValueError(f"Unsupported data file: {path}. Use .npy, .csv, .f32, .f64 or .bin")
+        data = np.memmap(path, dtype=RAW_TYPES[extension], mode='r')
+        if name.endswith('.xy'):
+            data = data[:len(data) // 2 * 2].reshape(-1, 2)
+    if data.ndim not in (1, 2) or (data.ndim == 2 and data.shape[1] != 2):
+        raise ValueError(f"Expected one column of y or two of x, y in {path}, got shape {data.shape}")
+    return DataSeries(source, path, data)
+
+
+def parse_data_source(text: str) -> DataSeries:
+    """Open the series named by "data: path/to/file.npy", as typed into the grapher"""
+    path = text.strip()[len('data:'):].strip()
+    if not os.path.isfile(path):
+        raise ValueError(f"No such data file: {path}")
+    series = open_series(path, text.strip())
+    if len(series.level_sizes) > 1:
+        series.open_pyramid()
+    return series
@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+import numpy as np
+from xml.sax.saxutils import escape
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from dataset import parse_data_source
+from expression import ParametricCurve, parse_equation_source
+from geometry import PALETTE, grid_ticks, parse_shape, shape_outline, view_bounds, world_to_screen
+from implicit import contour
+from sampling import sample_curve, sample_parametric
+from text import Rasterizer, TextCache
+
+# Same colors and line widths the window uses in draw_grid, plot_equation and ShapeBuffer.draw
+GRID_COLOR = (0.8, 0.8, 0.8)
+AXIS_COLOR = (0.0, 0.0, 0.5)
+LABEL_COLOR = (0.0, 0.0, 0.0)
+BACKGROUND = (1.0, 1.0, 1.0)
+CURVE_WIDTH = 2.0
+AXIS_WIDTH = 2.0
+
+# 5x7 bitmap glyphs for the characters grid labels are made of
+_GLYPHS: Dict[str, Tuple[str, ...]] = {
+    '0': ("01110", "10001", "10011", "10101", "11001", "10001", "01110"),
+    '1': ("00100", "01100", "00100", "00100", "00100", "00100", "01110"),
+    '2': ("01110", "10001", "00001", "00010", "00100", "01000", "11111"),
+    '3': ("11111", "00010", "00100", "00010", "00001", "10001", "01110"),
+    '4': ("00010", "00110", "01010", "10010", "11111", "00010", "00010"),
+    '5': ("11111", "10000", "11110", "00001", "00001", "10001", "01110"),
+    '6': ("00110", "01000", "10000", "11110", "10001", "10001", "01110"),
+    '7': ("11111", "00001", "00010", "00100", "01000", "01000", "01000"),
+    '8': ("01110", "10001", "10001", "01110", "10001", "10001", "01110"),
+    '9': ("01110", "10001", "10001", "01111", "00001", "00010", "01100"),
+    '.': ("00000", "00000", "00000", "00000", "00000", "01100", "01100"),
+    '-': ("00000", "00000", "00000", "11111", "00000", "00000", "00000"),
+    ' ': ("00000",) * 7,
+}
+
+
+def bitmap_rasterizer(scale: int = 1) -> Rasterizer:
+    """Rasterize digits from the built-in 5x7 font, so exports need no font files or pygame"""
+
+    def rasterize(char: str) -> Tuple[np.ndarray, int]:
+        rows = _GLYPHS.get(char, _GLYPHS[' '])
+        mask = np.array([[255 if bit == '1' else 0 for bit in row] for row in rows], dtype=np.uint8)
+        mask = np.kron(mask, np.ones((scale, scale), dtype=np.uint8))
+        return mask, 6 * scale
+
+    return rasterize
+
+
+_text_cache: Optional[TextCache] = None
+
+
+def _shared_text_cache() -> TextCache:
+    # Labels repeat across images, so each process lays them out once
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache(bitmap_rasterizer())
+    return _text_cache
+
+
+def _rgb(color: Sequence[float]) -> np.ndarray:
+    return np.array([round(c * 255) for c in color[:3]], dtype=np.uint8)
+
+
+def _hex(color: Sequence[float]) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*_rgb(color))
+
+
+def clip_segments(starts: np.ndarray, ends: np.ndarray, x_min: float, y_min: float,
+                  x_max: float, y_max: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Clip (n, 2) segments to a rectangle (Liang-Barsky), dropping those entirely outside"""
+    delta = ends - starts
+    t0 = np.zeros(len(starts))
+    t1 = np.ones(len(starts))
+    keep = np.isfinite(starts).all(axis=1) & np.isfinite(ends).all(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-delta[:, 0], starts[:, 0] - x_min), (delta[:, 0], x_max - starts[:, 0]),
+                     (-delta[:, 1], starts[:, 1] - y_min), (delta[:, 1], y_max - starts[:, 1])):
+            keep &= (p != 0) | (q >= 0)
+            ratio = q / p
+            t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+            t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+    keep &= t0 <= t1
+    starts, delta = starts[keep], delta[keep]
+    return starts + delta * t0[keep, None], starts + delta * t1[keep, None]
+
+
+class Canvas:
+    """An RGB image drawn in software with NumPy: lines stamped along their length and bitmap text.
+
+    Coordinates are screen pixels with the origin at the top-left corner,
+    the same space the window's text uses.
+    """
+
+    def __init__(self, width: int, height: int, background: Tuple[float, float, float] = BACKGROUND):
+        self.width = width
+        self.height = height
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+        self.pixels[:] = _rgb(background)
+        self.text_cache = _shared_text_cache()
+
+    def segments(self, starts: np.ndarray, ends: np.ndarray, color: Tuple[float, float, float], width: float = 1.0):
+        """Draw a line from each row of ``starts`` to the matching row of ``ends``"""
+        starts, ends = clip_segments(np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64),
+                                     -2.0, -2.0, self.width + 2.0, self.height + 2.0)
+        if not len(starts):
+            return
+        # One point per pixel of length, generated for every segment at once
+        steps = np.ceil(np.hypot(*(ends - starts).T)).astype(np.int64) + 1
+        owner = np.repeat(np.arange(len(steps)), steps)
+        first = np.cumsum(steps) - steps
+        t = (np.arange(len(owner)) - first[owner]) / np.maximum(steps[owner] - 1, 1)
+        points = starts[owner] + (ends - starts)[owner] * t[:, None]
+        self._stamp(points, color, width)
+
+    def polyline(self, points: np.ndarray, color: Tuple[float, float, float], width: float = 1.0,
+                 closed: bool = False):
+        points = np.asarray(points, dtype=np.float64)
+        if closed:
+            points = np.vstack((points, points[:1]))
+        self.segments(points[:-1], points[1:], color, width)
+
+    def _stamp(self, points: np.ndarray, color: Tuple[float, float, float], width: float):
+        pen = max(1, int(round(width)))
+        base = np.floor(points - (pen - 1) / 2).astype(np.int64)
+        rgb = _rgb(color)
+        for dx in range(pen):
+            for dy in range(pen):
+                xs = base[:, 0] + dx
+                ys = base[:, 1] + dy
+                inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+                self.pixels[ys[inside], xs[inside]] = rgb
+
+    def text(self, text: str, x: float, y: float, color: Tuple[float, float, float]):
+        """Blend a string in with its bottom-left corner at (x, y), like draw_text_on_screen"""
+        layout = self.text_cache.layout(text)
+        atlas = self.text_cache.atlas.pixels
+        rgb = _rgb(color).astype(np.float32)
+        for quad, rect in zip(layout.positions.reshape(-1, 4, 2), layout.glyph_rects.reshape(-1, 4, 2)):
+            left, top = int(x + quad[0, 0]), int(y + quad[0, 1])
+            src_x, src_y = int(rect[0, 0]), int(rect[0, 1])
+            w, h = int(rect[2, 0]) - src_x, int(rect[2, 1]) - src_y
+            x0, y0 = max(left, 0), max(top, 0)
+            x1, y1 = min(left + w, self.width), min(top + h, self.height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            alpha = atlas[src_y + y0 - top:src_y + y1 - top, src_x + x0 - left:src_x + x1 - left, None] / 255.0
+            region = self.pixels[y0:y1, x0:x1]
+            region[:] = np.round(region * (1 - alpha) + rgb * alpha)
+
+    def png(self) -> bytes:
+        """The image encoded as an 8-bit RGB PNG"""
+        rows = np.hstack((np.zeros((self.height, 1), dtype=np.uint8), self.pixels.reshape(self.height, -1)))
+
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+        # Plots are mostly flat background, so the fastest zlib level already compresses them well
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+                + chunk(b"IDAT", zlib.compress(rows.tobytes(), 1)) + chunk(b"IEND", b""))
+
+
+class SvgDocument:
+    """Collects the same drawing calls as Canvas and writes them out as SVG elements"""
+
+    def __init__(self, width: int, height: int, background: Tuple[float, float, float] = BACKGROUND):
+        self.width = width
+        self.height = height
+        self.elements = [f'<rect width="{width}" height="{height}" fill="{_hex(background)}"/>']
+
+    def _path(self, data: str, color: Tuple[float, float, float], width: float):
+        if data:
+            self.elements.append(f'<path d="{data}" fill="none" stroke="{_hex(color)}" stroke-width="{width:g}" '
+                                 f'stroke-linejoin="round"/>')
+
+    def segments(self, starts: np.ndarray, ends: np.ndarray, color: Tuple[float, float, float], width: float = 1.0):
+        self._path(" ".join(f"M{x0:.2f} {y0:.2f}L{x1:.2f} {y1:.2f}" for (x0, y0), (x1, y1) in zip(starts, ends)),
+                   color, width)
+
+    def polylines(self, strips: Sequence[np.ndarray], color: Tuple[float, float, float], width: float = 1.0,
+                  closed: bool = False):
+        """All strips of one color as a single path element"""
+        data = []
+        for points in strips:
+            data.append("M" + "L".join(f"{x:.2f} {y:.2f}" for x, y in points) + ("Z" if closed else ""))
+        self._path(" ".join(data), color, width)
+
+    def polyline(self, points: np.ndarray, color: Tuple[float, float, float], width: float = 1.0,
+                 closed: bool = False):
+        self.polylines([points], color, width, closed)
+
+    def text(self, text: str, x: float, y: float, color: Tuple[float, float, float]):
+        self.elements.append(f'<text x="{x}" y="{y}" fill="{_hex(color)}">{escape(text)}</text>')
+
+    def svg(self) -> bytes:
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" '
+                f'viewBox="0 0 {self.width} {self.height}" font-family="Arial, sans-serif" font-size="14">\n'
+                + "\n".join(self.elements) + "\n</svg>\n").encode()
+
+
+class PlotJob:
+    """One image to render: equations and shapes in the window's input syntax, a view and output files"""
+
+    def __init__(self, equations: Sequence[str] = (), shapes: Sequence[str] = (),
+                 bounds: Optional[Tuple[float, float, float, float]] = None, size: Tuple[int, int] = (800, 600),
+                 outputs: Sequence[str] = ()):
+        self.equations = list(equations)
+        self.shapes = list(shapes)
+        self.width, self.height = int(size[0]), int(size[1])
+        # Without bounds, the view the window opens with
+        self.bounds = tuple(bounds) if bounds is not None else view_bounds(10, 0, 0, self.width, self.height)
+        self.outputs = list(outputs)
+        for path in self.outputs:
+            if not path.lower().endswith((".png", ".svg")):
+                raise ValueError(f"Unsupported output format: {path}. Use .png or .svg")
+
+    @classmethod
+    def from_dict(cls, spec: Dict) -> "PlotJob":
+        outputs = spec.get("outputs", spec.get("output", []))
+        return cls(spec.get("equations", ()), spec.get("shapes", ()), spec.get("bounds"),
+                   spec.get("size", (800, 600)), [outputs] if isinstance(outputs, str) else outputs)
+
+    @property
+    def zoom(self) -> float:
+        """The window's zoom for these bounds: half the extent of the shorter side"""
+        x_min, x_max, y_min, y_max = self.bounds
+        return (y_max - y_min) / 2 if self.width > self.height else (x_max - x_min) / 2
+
+
+def draw_plot(job: PlotJob, target):
+    """Draw the grid, curves, shapes and labels of a job onto a Canvas or SvgDocument"""
+    bounds, width, height = job.bounds, job.width, job.height
+    x_min, x_max, y_min, y_max = bounds
+
+    def to_screen(points: np.ndarray) -> np.ndarray:
+        return np.column_stack(world_to_screen(points[:, 0].astype(np.float64), points[:, 1].astype(np.float64),
+                                               bounds, width, height))
+
+    # Grid lines and axes, laid out exactly as draw_grid does
+    ticks = grid_ticks(job.zoom, bounds)
+    for lines, color, line_width in (((ticks.xs[np.abs(ticks.xs) >= 1e-10], ticks.ys[np.abs(ticks.ys) >= 1e-10]),
+                                      GRID_COLOR, 1.0),
+                                     ((ticks.xs[np.abs(ticks.xs) < 1e-10], ticks.ys[np.abs(ticks.ys) < 1e-10]),
+                                      AXIS_COLOR, AXIS_WIDTH)):
+        xs, ys = lines
+        starts = np.concatenate((np.column_stack((xs, np.full(len(xs), ticks.y_min))),
+                                 np.column_stack((np.full(len(ys), ticks.x_min), ys))))
+        ends = np.concatenate((np.column_stack((xs, np.full(len(xs), ticks.y_max))),
+                               np.column_stack((np.full(len(ys), ticks.x_max), ys))))
+        target.segments(to_screen(starts), to_screen(ends), color, line_width)
+
+    for index, equation in enumerate(job.equations):
+        color = PALETTE[index % len(PALETTE)]
+        if equation.strip().lower().startswith('data:'):
+            strips = parse_data_source(equation).view(x_min, x_max, width).strips
+            if isinstance(target, SvgDocument):
+                target.polylines([to_screen(strip) for strip in strips], color, 1.0)
+            else:
+                for strip in strips:
+                    target.polyline(to_screen(strip), color, 1.0)
+            continue
+        func = parse_equation_source(equation)
+        if func.implicit:
+            for points in contour(func, x_min, x_max, y_min, y_max, width, height).strips:
+                target.segments(to_screen(points[0::2]), to_screen(points[1::2]), color, CURVE_WIDTH)
+            continue
+        if isinstance(func, ParametricCurve):
+            samples = sample_parametric(func, func.t_min, func.t_max, x_min, x_max, y_min, y_max, width, height)
+        else:
+            samples = sample_curve(func, x_min, x_max, width, y_min, y_max, height)
+        if isinstance(target, SvgDocument):
+            target.polylines([to_screen(strip) for strip in samples.strips], color, CURVE_WIDTH)
+        else:
+            for strip in samples.strips:
+                target.polyline(to_screen(strip), color, CURVE_WIDTH)
+
+    for index, shape in enumerate(job.shapes):
+        vertices, closed = shape_outline(*parse_shape(shape))
+        color = PALETTE[index % len(PALETTE)]
+        points = to_screen(vertices)
+        if closed:
+            target.polyline(points, color, closed=True)
+        else:
+            target.segments(points[0::2], points[1::2], color)
+
+    # Labels along the axes, placed like draw_number_on_graph; text goes on top as in the window
+    for value, x, y in [(x, x, 0.3) for x in ticks.xs if x != 0] + [(y, 0.3, y) for y in ticks.ys if y != 0]:
+        screen_x, screen_y = world_to_screen(x, y, bounds, width, height)
+        target.text(f"{value:.1f}", int(screen_x), int(screen_y), LABEL_COLOR)
+
+
+def export_job(job: PlotJob) -> List[str]:
+    """Render a job to each of its output files; returns the paths written"""
+    for path in job.outputs:
+        if path.lower().endswith(".svg"):
+            document = SvgDocument(job.width, job.height)
+            draw_plot(job, document)
+            data = document.svg()
+        else:
+            canvas = Canvas(job.width, job.height)
+            draw_plot(job, canvas)
+            data = canvas.png()
+        with open(path, "wb") as f:
+            f.write(data)
+    return job.outputs
+
+
+def _run_job(job: PlotJob) -> Tuple[List[str], Optional[str]]:
+    # One bad equation should not take the rest of the batch down with it
+    try:
+        return export_job(job), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+def export_jobs(jobs: Sequence[PlotJob], processes: Optional[int] = None) -> List[Tuple[List[str], Optional[str]]]:
+    """Render many jobs across worker processes; returns (paths written, error or None) per job, in order"""
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(jobs) == 1:
+        return [_run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_run_job, jobs, chunksize=max(1, len(jobs) // (processes * 4))))
+
+
+def load_jobs(path: str) -> List[PlotJob]:
+    """Jobs from a JSON file holding a list of job objects (or {"jobs": [...]})"""
+    with open(path) as f:
+        specs = json.load(f)
+    if isinstance(specs, dict):
+        specs = specs["jobs"]
+    return [PlotJob.from_dict(spec) for spec in specs]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render equations and shapes to PNG/SVG without opening a window")
+    parser.add_argument("inputs", nargs="*", help="equations or shape:... strings, as typed into the grapher")
+    parser.add_argument("-o", "--output", action="append", default=[], help="output .png or .svg (repeatable)")
+    parser.add_argument("--bounds", nargs=4, type=float, metavar=("X_MIN", "X_MAX", "Y_MIN", "Y_MAX"))
+    parser.add_argument("--size", nargs=2, type=int, default=(800, 600), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--jobs", metavar="PATH", help="JSON file with a list of jobs to render instead")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    if args.jobs:
+        jobs = load_jobs(args.jobs)
+    else:
+        if not args.output:
+            parser.error("give at least one --output, or --jobs")
+        shapes = [text for text in args.inputs if text.startswith("shape:")]
+        equations = [text for text in args.inputs if not text.startswith("shape:")]
+        jobs = [PlotJob(equations, shapes, args.bounds, args.size, args.output)]
+
+    start = time.perf_counter()
+    results = export_jobs(jobs, args.processes)
+    elapsed = time.perf_counter() - start
+    failed = [(index, error) for index, (_, error) in enumerate(results) if error]
+    for index, error in failed:
+        print(f"Job {index} failed: {error}", file=sys.stderr)
+    written = sum(len(paths) for paths, _ in results)
+    print(f"Wrote {written} files from {len(jobs)} jobs in {elapsed:.2f} s ({len(failed)} failed)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
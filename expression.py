@@ -0,0 +1,355 @@
+import ast
+import io
+import tokenize
+import types
+import numpy as np
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+
+# Functions and constants an equation may use, mapped to their NumPy equivalents
+FUNCTIONS: Dict[str, Tuple[Callable, int]] = {
+    'sin': (np.sin, 1),
+    'cos': (np.cos, 1),
+    'tan': (np.tan, 1),
+    'exp': (np.exp, 1),
+    'sqrt': (np.sqrt, 1),
+    'abs': (np.abs, 1),
+    'pow': (np.power, 2),
+}
+
+CONSTANTS: Dict[str, float] = {
+    'pi': np.pi,
+    'e': np.e,
+}
+
+_BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+_COMPARE_OPS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression cannot be parsed or uses something not whitelisted"""
+
+
+class CompiledExpression:
+    """An expression compiled once into a function over NumPy arrays.
+
+    Calling it with an array of x values returns a float64 array of the same
+    shape; points where the expression is undefined (domain errors, division
+    by zero, overflow) come back as NaN instead of raising. Expressions in
+    several variables (implicit equations F(x, y)) take one array per
+    variable, broadcast against each other.
+
+    Named parameters (``a`` in ``a*sin(x)``) are looked up as globals of
+    the compiled function, so ``bind`` makes a copy for new parameter
+    values without compiling again. ``parameters`` holds the values of the
+    ones the expression uses.
+    """
+
+    def __init__(self, source: str, function: Callable, variable: Union[str, Tuple[str, ...]],
+                 parameters: Optional[Dict[str, float]] = None):
+        self.source = source
+        self.variable = variable
+        self.variables = (variable,) if isinstance(variable, str) else tuple(variable)
+        self.parameters = parameters or {}
+        self._function = function
+
+    @property
+    def implicit(self) -> bool:
+        """True for F(x, y), whose curve is the set of points where it is zero"""
+        return len(self.variables) > 1
+
+    def __call__(self, *args):
+        values = np.broadcast_arrays(*(np.asarray(arg, dtype=np.float64) for arg in args))
+        with np.errstate(all='ignore'):
+            result = self._function(*values)
+            result = np.array(np.broadcast_to(result, values[0].shape if values else ()), dtype=np.float64)
+        result[~np.isfinite(result)] = np.nan
+        if result.ndim == 0:
+            return float(result)
+        return result
+
+    def bind(self, values: Mapping[str, float]) -> 'CompiledExpression':
+        """The same expression with its parameters taken from ``values``"""
+        parameters = {name: float(values[name]) for name in self.parameters}
+        if parameters == self.parameters:
+            return self
+        namespace = dict(self._function.__globals__)
+        namespace.update(parameters)
+        function = types.FunctionType(self._function.__code__, namespace)
+        return CompiledExpression(self.source, function, self.variable, parameters)
+
+    def __reduce__(self):
+        # The compiled lambda cannot be pickled; worker processes recompile from source
+        return compile_expression, (self.source, self.variable, self.parameters)
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+
+class _Compiler(ast.NodeTransformer):
+    """Checks an expression tree against the whitelist and rewrites it for NumPy"""
+
+    def __init__(self, variables: Tuple[str, ...], parameters: Mapping[str, float]):
+        self.variables = variables
+        self.parameters = parameters
+        self.used: Dict[str, float] = {}  # Parameters the expression reads, with their values
+        self.namespace = {'_where': np.where, '_and': np.logical_and}
+
+    def _constant(self, value: float) -> ast.Name:
+        name = f"_k{len(self.namespace)}"
+        self.namespace[name] = np.float64(value)
+        return ast.Name(id=name, ctx=ast.Load())
+
+    def generic_visit(self, node):
+        raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"Unsupported constant: {node.value!r}")
+        return self._constant(node.value)
+
+    def visit_Name(self, node):
+        if node.id.startswith('_'):
+            # Reserved for the compiled function's own globals and builtins
+            raise ExpressionError(f"Unknown name: {node.id}")
+        if node.id in self.variables:
+            return node
+        if node.id in CONSTANTS:
+            return self._constant(CONSTANTS[node.id])
+        if node.id in self.parameters:
+            # Left as a global lookup, so bind() can swap the value in
+            self.used[node.id] = float(self.parameters[node.id])
+            return node
+        raise ExpressionError(f"Unknown name: {node.id}")
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BINARY_OPS):
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARY_OPS):
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        if not all(isinstance(op, _COMPARE_OPS) for op in node.ops):
+            raise ExpressionError("Unsupported comparison")
+        operands = [self.visit(operand) for operand in [node.left] + node.comparators]
+        # Chained comparisons (a < x < b) become an element-wise AND of each pair
+        pairs = [ast.Compare(left=left, ops=[op], comparators=[right])
+                 for left, op, right in zip(operands, node.ops, operands[1:])]
+        result = pairs[0]
+        for pair in pairs[1:]:
+            result = ast.Call(func=ast.Name(id='_and', ctx=ast.Load()), args=[result, pair], keywords=[])
+        return result
+
+    def visit_IfExp(self, node):
+        args = [self.visit(node.test), self.visit(node.body), self.visit(node.orelse)]
+        return ast.Call(func=ast.Name(id='_where', ctx=ast.Load()), args=args, keywords=[])
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ExpressionError(f"Unknown function: {ast.unparse(node.func)}")
+        if node.keywords:
+            raise ExpressionError(f"{node.func.id}() does not take keyword arguments")
+        ufunc, arity = FUNCTIONS[node.func.id]
+        if len(node.args) != arity:
+            raise ExpressionError(f"{node.func.id}() takes {arity} argument(s), got {len(node.args)}")
+        name = f"_f_{node.func.id}"
+        self.namespace[name] = ufunc
+        node.func = ast.Name(id=name, ctx=ast.Load())
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+class ParametricCurve:
+    """A curve traced by a parameter: (x(t), y(t)) over [t_min, t_max], or r(theta) in polar form.
+
+    Calling it with an array of parameter values returns the x and y arrays,
+    NaN where the curve is undefined.
+    """
+
+    implicit = False
+
+    def __init__(self, source: str, x: CompiledExpression, y: CompiledExpression, t_min: float, t_max: float,
+                 r: CompiledExpression = None):
+        self.source = source
+        self.x = x
+        self.y = y
+        self.r = r  # Set for polar curves, where x and y are unused
+        self.t_min = t_min
+        self.t_max = t_max
+
+    @property
+    def polar(self) -> bool:
+        return self.r is not None
+
+    @property
+    def parameters(self) -> Dict[str, float]:
+        parameters = {}
+        for part in (self.x, self.y, self.r):
+            if part is not None:
+                parameters.update(part.parameters)
+        return parameters
+
+    def bind(self, values: Mapping[str, float]) -> 'ParametricCurve':
+        """The same curve with its parameters taken from ``values``"""
+        if not self.parameters:
+            return self
+        x, y, r = (None if part is None else part.bind(values) for part in (self.x, self.y, self.r))
+        return ParametricCurve(self.source, x, y, self.t_min, self.t_max, r=r)
+
+    def __call__(self, t) -> Tuple[np.ndarray, np.ndarray]:
+        t = np.asarray(t, dtype=np.float64)
+        if self.r is not None:
+            r = self.r(t)
+            return r * np.cos(t), r * np.sin(t)
+        return self.x(t), self.y(t)
+
+    def __repr__(self):
+        return f"ParametricCurve({self.source!r})"
+
+
+def _implicit_products(source: str) -> str:
+    """Insert the * left out between a number and a following name or bracket, as in 3t or 2(x + 1)"""
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return source  # Left for ast.parse to report
+    insert = [token.end[1] for token, following in zip(tokens, tokens[1:])
+              if token.type == tokenize.NUMBER and following.start == token.end
+              and (following.type == tokenize.NAME or following.string == '(')]
+    for column in reversed(insert):
+        source = source[:column] + '*' + source[column:]
+    return source
+
+
+def compile_expression(source: str, variable: Union[str, Sequence[str]] = 'x',
+                       parameters: Optional[Mapping[str, float]] = None) -> CompiledExpression:
+    """Parse an expression once and compile it into a vectorized evaluator of one or more variables.
+
+    Names in ``parameters`` may be used alongside the constants; they read
+    the given values until the expression is bound to others.
+    """
+    try:
+        tree = ast.parse(_implicit_products(source.strip()), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}") from None
+
+    variables = (variable,) if isinstance(variable, str) else tuple(variable)
+    compiler = _Compiler(variables, parameters or {})
+    tree = ast.fix_missing_locations(compiler.visit(tree))
+    body = ast.Expression(body=ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=name) for name in variables], kwonlyargs=[],
+                           kw_defaults=[], defaults=[]),
+        body=tree.body,
+    ))
+    code = compile(ast.fix_missing_locations(body), '<equation>', 'eval')
+    function = eval(code, {'__builtins__': {}, **compiler.namespace, **compiler.used})
+    return CompiledExpression(source, function, variables[0] if len(variables) == 1 else variables, compiler.used)
+
+
+def _uses_name(source: str, name: str) -> bool:
+    """True if the expression reads the variable ``name``, not just a longer name containing it like y0"""
+    try:
+        tree = ast.parse(_implicit_products(source), mode='eval')
+    except SyntaxError:
+        return name in source  # Left for compile_expression to report
+    return any(isinstance(node, ast.Name) and node.id == name for node in ast.walk(tree))
+
+
+def parse_equation_source(equation_str: str, parameters: Optional[Mapping[str, float]] = None) -> CompiledExpression:
+    """Compile "x^2", "y = sin(x)" or "2*x + 1 = y" into a function of x.
+
+    Anything else with both sides in x and y, like "x^2 + y^2 = 25", becomes
+    the implicit function F(x, y) = lhs - rhs, plotted where it is zero.
+
+    "param: x=..., y=..., t=a..b" and "polar: r=..." are parametric curves,
+    see ``parse_curve_source``. Names in ``parameters`` may be used as
+    constants that can change later, see ``CompiledExpression.bind``.
+    """
+    equation_str = equation_str.strip().replace('^', '**')
+    mode, _, rest = equation_str.partition(':')
+    if rest and mode.strip().lower() in ('param', 'polar'):
+        return parse_curve_source(mode.strip().lower(), rest, parameters)
+    if '=' in equation_str:
+        if equation_str.count('=') > 1:
+            raise ExpressionError("Equation must have exactly one '='")
+        lhs, rhs = (side.strip() for side in equation_str.split('='))
+        # y = f(x) form
+        if lhs == 'y' and not _uses_name(rhs, 'y'):
+            return compile_expression(rhs, parameters=parameters)
+        elif rhs == 'y' and not _uses_name(lhs, 'y'):
+            return compile_expression(lhs, parameters=parameters)
+        return compile_expression(f"({lhs}) - ({rhs})", ('x', 'y'), parameters)
+    elif _uses_name(equation_str, 'y'):
+        return compile_expression(equation_str, ('x', 'y'), parameters)
+    elif _uses_name(equation_str, 'x'):
+        return compile_expression(equation_str, parameters=parameters)
+    raise ExpressionError("Equation must be in terms of x")
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split at commas that are not inside brackets, so pow(t, 2) stays whole"""
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _constant_value(source: str) -> float:
+    value = compile_expression(source, ())()
+    if not np.isfinite(value):
+        raise ExpressionError(f"Range bound is not a number: {source}")
+    return value
+
+
+def parse_curve_source(mode: str, text: str, parameters: Optional[Mapping[str, float]] = None) -> ParametricCurve:
+    """Compile the body of "param: x=cos(3t), y=sin(2t), t=0..2pi" or "polar: r=1+cos(theta)".
+
+    The parameter is t for parametric curves and theta for polar ones; its
+    range defaults to 0..2pi.
+    """
+    parameter = 't' if mode == 'param' else 'theta'
+    definitions = {}
+    bounds = (0.0, 2 * np.pi)
+    for part in _split_top_level(text.replace('^', '**')):
+        name, equals, value = part.partition('=')
+        name, value = name.strip(), value.strip()
+        if not equals or not value:
+            raise ExpressionError(f"Expected name=value, got {part!r}")
+        if '..' in value:
+            if name != parameter:
+                raise ExpressionError(f"Range given for {name}, expected {parameter}")
+            low, _, high = value.partition('..')
+            bounds = (_constant_value(low), _constant_value(high))
+            if not bounds[0] < bounds[1]:
+                raise ExpressionError("Parameter range must go from low to high")
+        else:
+            definitions[name] = value
+
+    if mode == 'polar':
+        if set(definitions) != {'r'}:
+            raise ExpressionError("Polar curves are given as r=f(theta)")
+        r = compile_expression(definitions['r'], 'theta', parameters)
+        return ParametricCurve(f"{mode}: {text.strip()}", None, None, *bounds, r=r)
+    if set(definitions) != {'x', 'y'}:
+        raise ExpressionError("Parametric curves are given as x=f(t), y=g(t)")
+    x, y = (compile_expression(definitions[name], 't', parameters) for name in ('x', 'y'))
+    return ParametricCurve(f"{mode}: {text.strip()}", x, y, *bounds)
@@ -0,0 +1,230 @@
+import math
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+# Colors handed out in turn to new equations and shapes
+PALETTE = [
+    (0, 0, 0),      # Black
+    (1, 0, 0),      # Red
+    (0, 0, 1),      # Blue
+    (0, 0.5, 0),    # Green
+    (0.5, 0, 0.5),  # Purple
+    (1, 0.5, 0),    # Orange
+]
+
+# Parameters of each shape type, in the order they follow "shape:<type>:"
+SHAPE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'circle': ('center_x', 'center_y', 'radius'),
+    'ellipse': ('center_x', 'center_y', 'radius_x', 'radius_y'),
+    'rectangle': ('x1', 'y1', 'x2', 'y2'),
+    'line': ('x1', 'y1', 'x2', 'y2'),
+}
+
+
+def parse_shape(shape_input: str) -> Tuple[str, Dict[str, float]]:
+    """Split "shape:circle:0:0:5" into its type and named parameters"""
+    parts = shape_input.split(":")
+    if len(parts) < 2 or parts[1] not in SHAPE_FIELDS:
+        kind = parts[1] if len(parts) > 1 else ""
+        raise ValueError(f"Unknown shape type: {kind}. Currently supported: {', '.join(SHAPE_FIELDS)}")
+    fields = SHAPE_FIELDS[parts[1]]
+    if len(parts) - 2 != len(fields):
+        raise ValueError(f"{parts[1]} takes {len(fields)} parameters: {':'.join(fields)}")
+    return parts[1], {field: float(value) for field, value in zip(fields, parts[2:])}
+
+
+def parse_shapes(shape_inputs: Sequence[str]) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray], List[str]]:
+    """Parse many "shape:type:..." strings at once.
+
+    Returns parameter rows per shape type (columns in SHAPE_FIELDS order),
+    the position in ``shape_inputs`` each row came from, and an error
+    message for every string that could not be parsed.
+    """
+    groups: Dict[str, List[int]] = {kind: [] for kind in SHAPE_FIELDS}
+    errors = []
+    for position, text in enumerate(shape_inputs):
+        parts = text.split(":", 2)
+        kind = parts[1] if len(parts) > 1 else ""
+        if kind in SHAPE_FIELDS and text.count(":") == len(SHAPE_FIELDS[kind]) + 1:
+            groups[kind].append(position)
+        else:
+            try:
+                parse_shape(text)
+            except ValueError as e:
+                errors.append(str(e))
+
+    values: Dict[str, np.ndarray] = {}
+    positions: Dict[str, np.ndarray] = {}
+    for kind, members in groups.items():
+        fields = len(SHAPE_FIELDS[kind])
+        try:
+            # One conversion for the whole group; the prefix of each string is skipped by its length
+            skip = len(kind) + 7
+            rows = np.array(":".join(shape_inputs[i][skip:] for i in members).split(":") if members else [],
+                            dtype=np.float64).reshape(-1, fields)
+        except ValueError:
+            # Some number is malformed: sort the good strings from the bad one by one
+            good = []
+            for i in members:
+                try:
+                    parse_shape(shape_inputs[i])
+                    good.append(i)
+                except ValueError as e:
+                    errors.append(f"{shape_inputs[i]}: {e}")
+            members = good
+            rows = np.array([[float(value) for value in shape_inputs[i].split(":")[2:]] for i in members],
+                            dtype=np.float64).reshape(-1, fields)
+        values[kind] = rows
+        positions[kind] = np.array(members, dtype=np.int64)
+    return values, positions, errors
+
+
+def view_bounds(zoom: float, x_offset: float, y_offset: float, width: int, height: int) -> Tuple[float, float, float, float]:
+    """World-space (x_min, x_max, y_min, y_max) shown by a window of the given size.
+
+    ``zoom`` is half the extent of the window's shorter side.
+    """
+    aspect_ratio = width / height
+    if aspect_ratio > 1:
+        return (-zoom * aspect_ratio + x_offset,
+                zoom * aspect_ratio + x_offset,
+                -zoom + y_offset,
+                zoom + y_offset)
+    return (-zoom + x_offset,
+            zoom + x_offset,
+            -zoom / aspect_ratio + y_offset,
+            zoom / aspect_ratio + y_offset)
+
+
+def world_to_screen(x, y, bounds: Tuple[float, float, float, float], width: int, height: int):
+    """Pixel coordinates (origin top-left) of world points for a view"""
+    x_min, x_max, y_min, y_max = bounds
+    return width * (x - x_min) / (x_max - x_min), height * (1 - (y - y_min) / (y_max - y_min))
+
+
+def screen_to_world(x, y, bounds: Tuple[float, float, float, float], width: int, height: int):
+    """World coordinates of pixel positions (origin top-left) for a view; the inverse of world_to_screen"""
+    x_min, x_max, y_min, y_max = bounds
+    return x_min + (x_max - x_min) * x / width, y_min + (y_max - y_min) * (1 - y / height)
+
+
+class GridTicks(NamedTuple):
+    spacing: float
+    xs: np.ndarray  # x of every vertical grid line
+    ys: np.ndarray  # y of every horizontal grid line
+    x_min: float    # Extent of the grid lines, snapped outwards to the spacing
+    x_max: float
+    y_min: float
+    y_max: float
+
+
+def grid_ticks(zoom: float, bounds: Tuple[float, float, float, float]) -> GridTicks:
+    """Grid lines for a view: a power of ten apart, depending on the zoom level"""
+    spacing = 10 ** math.floor(math.log10(zoom / 5))
+    x_min, x_max, y_min, y_max = bounds
+    x_min = int(x_min / spacing) * spacing
+    x_max = int(x_max / spacing + 1) * spacing
+    y_min = int(y_min / spacing) * spacing
+    y_max = int(y_max / spacing + 1) * spacing
+    return GridTicks(spacing, np.arange(x_min, x_max + spacing, spacing), np.arange(y_min, y_max + spacing, spacing),
+                     x_min, x_max, y_min, y_max)
+
+
+class StripBatch:
+    """Line strips packed into one contiguous float32 vertex array.
+
+    ``firsts`` and ``counts`` index each strip within ``vertices`` so the
+    whole batch can be drawn with a single glMultiDrawArrays call. Vertices
+    are stored relative to ``origin`` to keep float32 precision when the view
+    is far from (0, 0); the renderer translates them back.
+    """
+
+    def __init__(self, vertices: np.ndarray, firsts: np.ndarray, counts: np.ndarray,
+                 origin: Tuple[float, float] = (0.0, 0.0)):
+        self.vertices = vertices
+        self.firsts = firsts
+        self.counts = counts
+        self.origin = origin
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.vertices)
+
+
+def pack_strips(strips: Sequence[np.ndarray], origin: Optional[Tuple[float, float]] = None) -> StripBatch:
+    """Pack (n, 2) point strips into a StripBatch"""
+    strips = [strip for strip in strips if len(strip) > 1]
+    if not strips:
+        return StripBatch(np.zeros((0, 2), dtype=np.float32), np.zeros(0, dtype=np.int32),
+                          np.zeros(0, dtype=np.int32), origin or (0.0, 0.0))
+    if origin is None:
+        origin = (float(strips[0][0, 0]), float(strips[0][0, 1]))
+    counts = np.array([len(strip) for strip in strips], dtype=np.int32)
+    firsts = np.zeros(len(counts), dtype=np.int32)
+    np.cumsum(counts[:-1], out=firsts[1:])
+    vertices = np.concatenate(strips) - np.array(origin)
+    return StripBatch(vertices.astype(np.float32), firsts, counts, origin)
+
+
+def line_segments(x0, y0, x1, y1) -> np.ndarray:
+    """Vertices for GL_LINES: one (start, end) pair per segment, scalars broadcast"""
+    x0, y0, x1, y1 = np.broadcast_arrays(*(np.atleast_1d(value) for value in (x0, y0, x1, y1)))
+    vertices = np.empty((len(x0) * 2, 2), dtype=np.float32)
+    vertices[0::2, 0] = x0
+    vertices[0::2, 1] = y0
+    vertices[1::2, 0] = x1
+    vertices[1::2, 1] = y1
+    return vertices
+
+
+def grid_lines(xs: np.ndarray, ys: np.ndarray, x_min: float, x_max: float, y_min: float, y_max: float) -> np.ndarray:
+    """Vertices for GL_LINES: a vertical line at each x and a horizontal line at each y"""
+    return np.concatenate((line_segments(xs, y_min, xs, y_max), line_segments(x_min, ys, x_max, ys)))
+
+
+@lru_cache(maxsize=None)
+def unit_circle(segments: int) -> np.ndarray:
+    """(segments, 2) points around the unit circle; one shared, read-only table per segment count"""
+    theta = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
+    table = np.column_stack((np.cos(theta), np.sin(theta)))
+    table.flags.writeable = False
+    return table
+
+
+def segments_for_radius(radius_pixels, min_segments: int = 8, max_segments: int = 256,
+                        segment_pixels: float = 4.0) -> np.ndarray:
+    """Outline segments for circles of the given on-screen radius: about one every ``segment_pixels``,
+    rounded up to a power of two so that few unit-circle tables are ever needed"""
+    wanted = np.maximum(2 * np.pi * np.asarray(radius_pixels, dtype=np.float64) / segment_pixels, min_segments)
+    return np.minimum(2 ** np.ceil(np.log2(wanted)), max_segments).astype(np.int64)
+
+
+def ellipse_outline(center_x: float, center_y: float, radius_x: float, radius_y: float,
+                    segments: int = 100) -> np.ndarray:
+    """Vertices for a GL_LINE_LOOP around an ellipse"""
+    return (unit_circle(segments) * (radius_x, radius_y) + (center_x, center_y)).astype(np.float32)
+
+
+def rectangle_outline(x1: float, y1: float, x2: float, y2: float) -> np.ndarray:
+    """Vertices for a GL_LINE_LOOP around an axis-aligned rectangle"""
+    return np.array([(x1, y1), (x2, y1), (x2, y2), (x1, y2)], dtype=np.float32)
+
+
+def shape_outline(shape_type: str, parameters: Dict[str, float]) -> Tuple[np.ndarray, bool]:
+    """World-space vertices of a parsed shape and whether they form a closed loop (False: separate segments)"""
+    if shape_type == 'circle':
+        return ellipse_outline(parameters['center_x'], parameters['center_y'],
+                               parameters['radius'], parameters['radius']), True
+    if shape_type == 'ellipse':
+        return ellipse_outline(parameters['center_x'], parameters['center_y'],
+                               parameters['radius_x'], parameters['radius_y']), True
+    if shape_type == 'rectangle':
+        return rectangle_outline(parameters['x1'], parameters['y1'], parameters['x2'], parameters['y2']), True
+    if shape_type == 'line':
+        return line_segments(parameters['x1'], parameters['y1'], parameters['x2'], parameters['y2']), False
+    raise ValueError(f"Unknown shape type: {shape_type}")
@@ -0,0 +1,157 @@
+import functools
+import numpy as np
+from typing import Callable, Tuple
+from sampling import CurveSamples
+
+# Marching-squares segments per cell case. Corner bits: 1 bottom-left, 2 bottom-right,
+# 4 top-right, 8 top-left (set where F > 0). Edges: 0 bottom, 1 right, 2 top, 3 left.
+# Cases 5 and 10 are saddles; rows 16 and 17 are their other reading, used when the
+# cell's center has the same sign as the two corners set in the case.
+_SEGMENTS = np.array([
+    [(-1, -1), (-1, -1)],  # 0
+    [(3, 0), (-1, -1)],    # 1
+    [(0, 1), (-1, -1)],    # 2
+    [(3, 1), (-1, -1)],    # 3
+    [(1, 2), (-1, -1)],    # 4
+    [(3, 0), (1, 2)],      # 5: bottom-left and top-right apart
+    [(0, 2), (-1, -1)],    # 6
+    [(3, 2), (-1, -1)],    # 7
+    [(2, 3), (-1, -1)],    # 8
+    [(0, 2), (-1, -1)],    # 9
+    [(0, 1), (2, 3)],      # 10: bottom-right and top-left apart
+    [(1, 2), (-1, -1)],    # 11
+    [(3, 1), (-1, -1)],    # 12
+    [(0, 1), (-1, -1)],    # 13
+    [(3, 0), (-1, -1)],    # 14
+    [(-1, -1), (-1, -1)],  # 15
+    [(0, 1), (2, 3)],      # 16: case 5 with bottom-left and top-right joined through the center
+    [(3, 0), (1, 2)],      # 17: case 10 with bottom-right and top-left joined through the center
+])
+
+# Corners in counter-clockwise order (bottom-left, bottom-right, top-right, top-left) as
+# offsets in cell sizes, and the two corners each edge runs between
+_CORNER_OFFSETS = np.array([(0, 0), (1, 0), (1, 1), (0, 1)])
+_EDGE_CORNERS = np.array([(0, 1), (1, 2), (3, 2), (0, 3)])
+
+
+def _active(f00: np.ndarray, f10: np.ndarray, f01: np.ndarray, f11: np.ndarray) -> np.ndarray:
+    """Cells whose four corners are all defined and not all on the same side of zero"""
+    corners = np.stack((f00, f10, f01, f11))
+    positive = corners > 0
+    return np.isfinite(corners).all(axis=0) & positive.any(axis=0) & ~positive.all(axis=0)
+
+
+def marching_squares(func: Callable, x0: np.ndarray, y0: np.ndarray, size: float,
+                     f00: np.ndarray, f10: np.ndarray, f01: np.ndarray, f11: np.ndarray,
+                     bisections: int = 3) -> Tuple[np.ndarray, int]:
+    """Contour segments through square cells given their lower-left corners, size and corner values.
+
+    Each segment end is placed on its cell edge by a few bisection steps and
+    a final linear interpolation. Bisection also tells zeros from poles: near
+    a zero the bracketing values shrink, across a pole (tan(x) = y) they
+    grow, and segments ending on a pole are dropped. Returns an (n, 2, 2)
+    array of segments and the number of function evaluations spent.
+    """
+    if not len(x0):
+        return np.zeros((0, 2, 2)), 0
+    # Saddle cells are resolved by the sign at their center
+    center = func(x0 + size / 2, y0 + size / 2)
+    evaluations = len(x0)
+    case = ((f00 > 0) * 1 + (f10 > 0) * 2 + (f11 > 0) * 4 + (f01 > 0) * 8).astype(np.int64)
+    case[(case == 5) & (center > 0)] = 16
+    case[(case == 10) & (center > 0)] = 17
+
+    cells, slots = np.nonzero(_SEGMENTS[case, :, 0] >= 0)
+    edges = _SEGMENTS[case[cells], slots].ravel()  # Edge of each segment end, two per segment
+    cells = np.repeat(cells, 2)
+    corner_a, corner_b = _EDGE_CORNERS[edges, 0], _EDGE_CORNERS[edges, 1]
+    origin = np.column_stack((x0[cells], y0[cells]))
+    a = origin + size * _CORNER_OFFSETS[corner_a]
+    b = origin + size * _CORNER_OFFSETS[corner_b]
+    values = np.stack((f00, f10, f11, f01))
+    fa, fb = values[corner_a, cells], values[corner_b, cells]
+    limit = np.maximum(np.abs(fa), np.abs(fb))
+
+    for _ in range(bisections):
+        middle = (a + b) / 2
+        fm = func(middle[:, 0], middle[:, 1])
+        evaluations += len(fm)
+        toward_b = (fm > 0) == (fa > 0)
+        a = np.where(toward_b[:, None], middle, a)
+        fa = np.where(toward_b, fm, fa)
+        b = np.where(toward_b[:, None], b, middle)
+        fb = np.where(toward_b, fb, fm)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.nan_to_num(fa / (fa - fb), nan=0.5), 0.0, 1.0)
+    points = a + (b - a) * t[:, None]
+    converged = np.maximum(np.abs(fa), np.abs(fb)) <= limit  # NaN compares False
+    keep = converged[0::2] & converged[1::2]
+    return points.reshape(-1, 2, 2)[keep], evaluations
+
+
+@functools.lru_cache(maxsize=1024)
+def _grid(x_min: float, y_min: float, size_x: float, size_y: float, columns: int, rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Read-only corner coordinates shaped to broadcast into a grid, the same arrays for every equation on a tile"""
+    xs = (x_min + size_x * np.arange(columns + 1))[None, :]
+    ys = (y_min + size_y * np.arange(rows + 1))[:, None]
+    xs.flags.writeable = ys.flags.writeable = False
+    return xs, ys
+
+
+def contour(func: Callable, x_min: float, x_max: float, y_min: float, y_max: float,
+            x_pixels: int, y_pixels: int, cell_pixels: int = 8, min_cell_pixels: float = 1.0) -> CurveSamples:
+    """Segments of the curve F(x, y) = 0 over a rectangle, resolved to ``min_cell_pixels``.
+
+    F is first evaluated on a grid of ``cell_pixels``-sized cells in one
+    vectorized call. Only cells whose corners change sign are refined: each
+    round splits all of them into quadrants at once (a quadtree, one level
+    per round) and evaluates the five new points per cell together. The
+    finest cells are contoured with marching squares. Features smaller than
+    a grid cell that do not change the sign at its corners are missed, as
+    with any sampled contouring.
+
+    Returns a single strip of segment endpoint pairs, drawn as GL_LINES.
+    """
+    x_scale = x_pixels / (x_max - x_min)  # pixels per unit
+    y_scale = y_pixels / (y_max - y_min)
+    # Square cells in pixels, so both axes refine together
+    size_x = cell_pixels / x_scale
+    size_y = cell_pixels / y_scale
+    xs, ys = _grid(x_min, y_min, size_x, size_y, int(np.ceil(x_pixels / cell_pixels)),
+                   int(np.ceil(y_pixels / cell_pixels)))
+    field = func(xs, ys)
+    evaluations = field.size
+
+    f00, f10, f01, f11 = field[:-1, :-1], field[:-1, 1:], field[1:, :-1], field[1:, 1:]
+    rows, cols = np.nonzero(_active(f00, f10, f01, f11))
+    # Refinement works in a unit square per cell, scaled back per axis at the end
+    x0, y0 = cols.astype(np.float64), rows.astype(np.float64)
+    f00, f10, f01, f11 = f00[rows, cols], f10[rows, cols], f01[rows, cols], f11[rows, cols]
+
+    def world(u, v):
+        return x_min + u * size_x, y_min + v * size_y
+
+    size = 1.0
+    while size * cell_pixels > min_cell_pixels and len(x0):
+        half = size / 2
+        # Bottom, left, right and top edge midpoints plus the center of every active cell
+        u = np.stack((x0 + half, x0, x0 + size, x0 + half, x0 + half))
+        v = np.stack((y0, y0 + half, y0 + half, y0 + size, y0 + half))
+        fb, fl, fr, ft, fc = func(*world(u, v))
+        evaluations += u.size
+        x0 = np.concatenate((x0, x0 + half, x0, x0 + half))
+        y0 = np.concatenate((y0, y0, y0 + half, y0 + half))
+        f00, f10, f01, f11 = (np.concatenate((f00, fb, fl, fc)), np.concatenate((fb, f10, fc, fr)),
+                              np.concatenate((fl, fc, f01, ft)), np.concatenate((fc, fr, ft, f11)))
+        active = _active(f00, f10, f01, f11)
+        x0, y0, f00, f10, f01, f11 = (a[active] for a in (x0, y0, f00, f10, f01, f11))
+        size = half
+
+    def unit_func(u, v):
+        return func(*world(u, v))
+
+    segments, spent = marching_squares(unit_func, x0, y0, size, f00, f10, f01, f11)
+    evaluations += spent
+    points = np.column_stack(world(segments[:, :, 0].ravel(), segments[:, :, 1].ravel()))
+    return CurveSamples([points] if len(points) else [], evaluations)
@@ -1,114 +1,145 @@
 # Importing Dependencies
-import pygame
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
-import numpy as np
+import argparse
 import math
-from typing import Callable, List, Tuple
-
-
-# For making Shapes
-class Shape:
-    def __init__(self, shape_type: str, color: Tuple[float, float, float], **kwargs):
-        self.shape_type = shape_type
-        self.color = color
-        self.parameters = kwargs
-
-    def draw(self):
-        if self.shape_type == "circle":
-            self.draw_circle()
-        elif self.shape_type == "rectangle":
-            self.draw_rectangle()
-        elif self.shape_type == "line":
-            self.draw_line()
-        elif self.shape_type == "ellipse":
-            self.draw_ellipse()
-        else:
-            print(f"Unknown shape type: {self.shape_type}.\n Currently supported: circle, rectangle, line, ellipse")
-
-    def draw_circle(self):
-        glColor3f(*self.color)
-        glBegin(GL_LINE_LOOP)
-        for i in range(100):
-            theta = 2.0 * math.pi * float(i) / 100.0
-            x = self.parameters["radius"] * math.cos(theta) + self.parameters["center_x"]
-            y = self.parameters["radius"] * math.sin(theta) + self.parameters["center_y"]
-            glVertex2f(x, y)
-        glEnd()
-
-    def draw_ellipse(self):
-        glColor3f(*self.color)
-        glBegin(GL_LINE_LOOP)
-        for i in range(100):
-            theta = 2.0 * math.pi * float(i) / 100.0
-            x = self.parameters["radius_x"] * math.cos(theta) + self.parameters["center_x"]
-            y = self.parameters["radius_y"] * math.sin(theta) + self.parameters["center_y"]
-            glVertex2f(x, y)
-        glEnd()
-
-    def draw_rectangle(self):
-        glColor3f(*self.color)
-        glBegin(GL_LINE_LOOP)
-        glVertex2f(self.parameters["x1"], self.parameters["y1"])
-        glVertex2f(self.parameters["x2"], self.parameters["y1"])
-        glVertex2f(self.parameters["x2"], self.parameters["y2"])
-        glVertex2f(self.parameters["x1"], self.parameters["y2"])
-        glEnd()
-
-    def draw_line(self):
-        glColor3f(*self.color)
-        glBegin(GL_LINES)
-        glVertex2f(self.parameters["x1"], self.parameters["y1"])
-        glVertex2f(self.parameters["x2"], self.parameters["y2"])
-        glEnd()
+import threading
+import time
+import numpy as np
+from typing import Callable, Optional
+from analysis import INTERSECTION, MAXIMUM, MINIMUM, ROOT, Features, label_order
+from core import Grapher
+from dataset import DataSeries
+from geometry import grid_lines, grid_ticks, pack_strips, shape_outline, world_to_screen
+from text import TextCache, pygame_rasterizer
+from profiler import FrameProfiler
+from sampling import CurveSamples
+
+# pygame, OpenGL and the renderer are imported by load_gui when the first window opens, so
+# importing this module (as worker processes started by spawning do) stays as cheap as the core
+pygame = None
+SAMPLES_READY = None  # Posted by sampling workers when finished tiles are waiting to be drawn
+
+
+def load_gui():
+    """Import pygame, OpenGL and the renderer, binding their names in this module as star imports would"""
+    global pygame, SAMPLES_READY
+    if pygame is not None:
+        return
+    import pygame
+    import pygame.locals
+    from OpenGL import GL, GLU
+    import renderer
+    namespace = globals()
+    for module in (pygame.locals, GL, GLU):
+        names = getattr(module, '__all__', None) or [name for name in dir(module) if not name.startswith('_')]
+        namespace.update((name, getattr(module, name)) for name in names)
+    namespace.update((name, getattr(renderer, name)) for name in ('ShapeBuffer', 'StripBuffer', 'TextRenderer', 'draw_vertices'))
+    SAMPLES_READY = pygame.USEREVENT + 1
+
+
+# For measuring how hard the render loop works
+class FrameStats:
+    """Frames rendered per second and process CPU use, measured over one-second windows"""
+
+    def __init__(self, window: float = 1.0):
+        self.window = window
+        self.window_start = time.perf_counter()
+        self.window_cpu = time.process_time()
+        self.window_frames = 0
+        self.fps = 0.0
+        self.cpu_percent = 0.0
+        self.total_frames = 0
+        self.idle_windows = 0
+        self.idle_cpu_total = 0.0
+        self.view_events = 0   # Wheel, drag and resize events received
+        self.view_updates = 0  # View updates they were coalesced into
+        self.frame_coalesced = 0  # Events saved by coalescing since the last frame
+
+    def frame(self):
+        self.window_frames += 1
+        self.total_frames += 1
+        self.frame_coalesced = 0
+
+    def input(self, events: int, updates: int):
+        self.view_events += events
+        self.view_updates += updates
+        self.frame_coalesced += events - updates
+
+    def tick(self) -> bool:
+        """Close the current window if it is over; returns True when new figures are ready"""
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+        if elapsed < self.window:
+            return False
+        cpu = time.process_time()
+        self.fps = self.window_frames / elapsed
+        self.cpu_percent = 100.0 * (cpu - self.window_cpu) / elapsed
+        if self.window_frames == 0:
+            self.idle_windows += 1
+            self.idle_cpu_total += self.cpu_percent
+        self.window_start, self.window_cpu, self.window_frames = now, cpu, 0
+        return True
+
+    @property
+    def idle_cpu_percent(self) -> float:
+        return self.idle_cpu_total / self.idle_windows if self.idle_windows else 0.0
+
+    def summary(self) -> str:
+        return (f"Rendered {self.total_frames} frames, last {self.fps:.1f} fps at {self.cpu_percent:.1f}% CPU, "
+                f"idle CPU {self.idle_cpu_percent:.1f}%, {self.view_events} view input events "
+                f"coalesced into {self.view_updates} updates")
 
 
 # For Graphing Equations
-class EquationGrapher:
-    def __init__(self, width=800, height=600):
-        # Initialize pygame and OpenGL
+class EquationGrapher(Grapher):
+    def __init__(self, width=800, height=600, sampling_workers=None, sampling_mode="thread",
+                 profile=False, opengl=True):
+        # Equations, shapes, the view and curve sampling live in the GUI-free core
+        self.samples_ready = threading.Event()
+        super().__init__(width, height, sampling_workers, sampling_mode)
+
+        # Initialize pygame and OpenGL. opengl=False opens a plain window for
+        # the headless benchmarks, which swap in a stub GL module
+        load_gui()
         pygame.init()
-        display_info = pygame.display.Info()
-        self.width = int(width)
-        self.height = int(height)
-        self.screen = pygame.display.set_mode((self.width, self.height), DOUBLEBUF | OPENGL | RESIZABLE)
+        flags = DOUBLEBUF | OPENGL | RESIZABLE if opengl else RESIZABLE
+        self.screen = pygame.display.set_mode((self.width, self.height), flags)
         pygame.display.set_caption("Dynamic Equation Grapher")
         
-        # Initialize Pygame font
-        pygame.font.init()
-        self.font = pygame.font.SysFont('arial', 14)
-        
-        # View settings
-        self.zoom = 10.0 
-        self.x_offset = 0.0
-        self.y_offset = 0.0
+        # The system font is looked up when the first glyph is drawn
+        self.text_cache = TextCache(pygame_rasterizer('arial', 14))
+        self.text_renderer = TextRenderer(self.text_cache)
         
         # Input box settings
         self.input_text = ""
         self.input_active = True
         self.input_rect = pygame.Rect(10, self.height - 40, 200, 30)
         
-        # Equation storage with colors and visibility
-        self.equations = []  # List of tuples (function, color, equation_string, visible)
-        
-        # Shape storage
-        self.shapes = []  # List of Shape objects
+        self.curve_buffers = {}  # Vertex buffer per equation function
+        self.shape_buffer = ShapeBuffer()
+        self.selected_shape = None  # Tag of the shape clicked last, drawn highlighted
+        self.hovered_shape = None   # Tag of the shape under the mouse
+        self.hit_pixels = 5         # How close to an outline the mouse must be to hit it
+        self.dragging = None        # Whether the held left button pans; None until the press or first motion
+        self.wheel_step = 0.9       # Zoom factor per wheel tick towards the pointer
         
         # Checkbox settings
         self.checkboxes = []  # List of pygame.Rect objects for checkboxes
+
+        # Parameter sliders, stacked above the input box
+        self.sliders = {}     # Parameter name to the pygame.Rect of its track
+        self.slider = None    # Name of the parameter whose slider is being dragged
         
-        # Available colors for equations and shapes
-        self.colors = [
-            (0, 0, 0),      # Black
-            (1, 0, 0),      # Red
-            (0, 0, 1),      # Blue
-            (0, 0.5, 0),    # Green
-            (0.5, 0, 0.5),  # Purple
-            (1, 0.5, 0),    # Orange
-        ]
-        
+        # Redraw bookkeeping: the loop only renders when one of these parts changed
+        self.mark_dirty("input")
+        self.max_fps = 60  # Frame-rate cap while the user is interacting
+        self.last_frame_time = -1000
+        self.frame_stats = FrameStats()
+        self.show_stats = False  # Toggled by typing "stats"; shows fps and CPU in the title
+        self.show_analysis = False  # Toggled by typing "analyze"; marks roots, extrema and intersections
+        self.max_labels = 40        # Marked points that also get a coordinate label, nearest the center first
+        self.analysis_budget = 0.008  # Seconds per frame for analyzing tiles new to the view
+        self.profiler = FrameProfiler(enabled=profile)  # Toggled by typing "profile"; per-stage overlay
+
         # Set white background
         glClearColor(1.0, 1.0, 1.0, 1.0)
         
@@ -131,10 +162,12 @@ class EquationGrapher:
     def setup_viewport(self, width, height):
         self.width = width
         self.height = height
+        self.view.resize(width, height)
         glViewport(0, 0, width, height)
         self.reset_projection()
-        # Update checkbox positions
+        # Update checkbox and slider positions
         self.update_checkboxes()
+        self.update_sliders()
 
     def update_checkboxes(self):
         self.checkboxes = []
@@ -142,204 +175,160 @@ class EquationGrapher:
             checkbox_rect = pygame.Rect(self.width - 220, 20 + i * 20, 12, 12)
             self.checkboxes.append(checkbox_rect)
 
+    def update_sliders(self):
+        self.sliders = {}
+        for i, parameter in enumerate(self.parameters):
+            self.sliders[parameter.name] = pygame.Rect(140, self.height - 76 - i * 24, 200, 16)
+
+    def slider_at(self, pos) -> Optional[str]:
+        """Name of the parameter whose slider is under a screen position"""
+        for name, rect in self.sliders.items():
+            if rect.collidepoint(pos):
+                return name
+        return None
+
+    def slider_value(self, name: str, x: float) -> float:
+        """Parameter value for a pointer at screen x on its slider"""
+        rect = self.sliders[name]
+        parameter = self.parameters[name]
+        fraction = min(max((x - rect.left) / rect.width, 0.0), 1.0)
+        return parameter.low + fraction * (parameter.high - parameter.low)
+
+    def checkbox_at(self, pos) -> Optional[int]:
+        """Index of the checkbox under a screen position; they sit in a column 20 pixels apart"""
+        i = (pos[1] - 20) // 20
+        if 0 <= i < len(self.checkboxes) and self.checkboxes[i].collidepoint(pos):
+            return i
+        return None
+
+    def shape_at(self, pos) -> Optional[int]:
+        """Tag of the shape whose outline is under a screen position"""
+        x, y = self.view.screen_to_world(*pos)
+        return self.shapes.hit_test(x, y, self.hit_pixels * self.view.units_per_pixel)
+
     def reset_projection(self):
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
-        aspect_ratio = self.width / self.height
-        if (aspect_ratio > 1):
-            gluOrtho2D(-self.zoom * aspect_ratio + self.x_offset, 
-                       self.zoom * aspect_ratio + self.x_offset, 
-                       -self.zoom + self.y_offset, 
-                       self.zoom + self.y_offset)
-        else:
-            gluOrtho2D(-self.zoom + self.x_offset, 
-                       self.zoom + self.x_offset, 
-                       -self.zoom / aspect_ratio + self.y_offset, 
-                       self.zoom / aspect_ratio + self.y_offset)
+        gluOrtho2D(*self.visible_bounds())
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
 
     def draw_text_on_screen(self, text, x, y, color=(0, 0, 0, 1)):
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        gluOrtho2D(0, self.width, self.height, 0)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
-        glLoadIdentity()
-
-        text_surface = self.font.render(str(text), True, color[:3])
-        text_data = pygame.image.tostring(text_surface, "RGBA", True)
-        glRasterPos2i(x, y)
-        glDrawPixels(text_surface.get_width(), text_surface.get_height(), GL_RGBA, GL_UNSIGNED_BYTE, text_data)
-
-        glPopMatrix()
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
+        # Queued with its bottom-left corner at (x, y); render() draws the whole frame's text at once.
+        # Colors are 0-255 like pygame's, truncated the same way font.render would
+        rgba = tuple(int(c) / 255 for c in color[:3]) + (1.0,)
+        self.text_cache.add(str(text), x, y, rgba)
 
     def draw_number_on_graph(self, num, x, y):
-        aspect_ratio = self.width / self.height
-        if aspect_ratio > 1:
-            screen_x = self.width * (x - (-self.zoom * aspect_ratio + self.x_offset)) / (2 * self.zoom * aspect_ratio)
-            screen_y = self.height * (1 - (y - (-self.zoom + self.y_offset)) / (2 * self.zoom))
-        else:
-            screen_x = self.width * (x - (-self.zoom + self.x_offset)) / (2 * self.zoom)
-            screen_y = self.height * (1 - (y - (-self.zoom / aspect_ratio + self.y_offset)) / (2 * self.zoom / aspect_ratio))
+        screen_x, screen_y = world_to_screen(x, y, self.visible_bounds(), self.width, self.height)
         self.draw_text_on_screen(f"{num:.1f}", int(screen_x), int(screen_y), color=(0.9, 0.9, 0.9, 0.5))  # Very light grey with 50% opacity
 
     def draw_grid(self):
-        # Calculate grid spacing based on zoom level
-        grid_spacing = 10 ** math.floor(math.log10(self.zoom / 5))
-        
-        # Calculate visible range
-        aspect_ratio = self.width / self.height
-        if aspect_ratio > 1:
-            x_min = int((-self.zoom * aspect_ratio + self.x_offset) / grid_spacing) * grid_spacing
-            x_max = int((self.zoom * aspect_ratio + self.x_offset) / grid_spacing + 1) * grid_spacing
-            y_min = int((-self.zoom + self.y_offset) / grid_spacing) * grid_spacing
-            y_max = int((self.zoom + self.y_offset) / grid_spacing + 1) * grid_spacing
-        else:
-            x_min = int((-self.zoom + self.x_offset) / grid_spacing) * grid_spacing
-            x_max = int((self.zoom + self.x_offset) / grid_spacing + 1) * grid_spacing
-            y_min = int((-self.zoom / aspect_ratio + self.y_offset) / grid_spacing) * grid_spacing
-            y_max = int((self.zoom / aspect_ratio + self.y_offset) / grid_spacing + 1) * grid_spacing
-        
-        # Draw vertical grid lines
-        for x in np.arange(x_min, x_max + grid_spacing, grid_spacing):
-            if abs(x) < 1e-10:  # X-axis
-                glLineWidth(2.0)
-                glColor3f(0.0, 0.0, 0.5)  # Dark blue for main axis
-            else:
-                glLineWidth(1.0)
-                glColor3f(0.8, 0.8, 0.8)  # Light gray for grid
-            
-            glBegin(GL_LINES)
-            glVertex2f(x, y_min)
-            glVertex2f(x, y_max)
-            glEnd()
-            
+        # Grid spacing based on zoom level, lines snapped to the visible range
+        ticks = grid_ticks(self.view.zoom, self.visible_bounds())
+        xs, ys = ticks.xs, ticks.ys
+        x_min, x_max, y_min, y_max = ticks.x_min, ticks.x_max, ticks.y_min, ticks.y_max
+        x_axis = np.abs(xs) < 1e-10
+        y_axis = np.abs(ys) < 1e-10
+
+        # Light gray grid lines first, then the dark blue main axes on top
+        grid = grid_lines(xs[~x_axis], ys[~y_axis], x_min, x_max, y_min, y_max)
+        axes = grid_lines(xs[x_axis], ys[y_axis], x_min, x_max, y_min, y_max)
+        self.profiler.count("vertices", draw_vertices(grid, GL_LINES, (0.8, 0.8, 0.8), width=1.0))
+        self.profiler.count("vertices", draw_vertices(axes, GL_LINES, (0.0, 0.0, 0.5), width=2.0))
+
+        for x in xs:
             if x != 0:
                 self.draw_number_on_graph(x, x, 0.3)
-        
-        # Draw horizontal grid lines
-        for y in np.arange(y_min, y_max + grid_spacing, grid_spacing):
-            if abs(y) < 1e-10:  # Y-axis
-                glLineWidth(2.0)
-                glColor3f(0.0, 0.0, 0.5)  # Dark blue for main axis
-            else:
-                glLineWidth(1.0)
-                glColor3f(0.8, 0.8, 0.8)  # Light gray for grid
-            
-            glBegin(GL_LINES)
-            glVertex2f(x_min, y)
-            glVertex2f(x_max, y)
-            glEnd()
-            
+        for y in ys:
             if y != 0:
                 self.draw_number_on_graph(y, 0.3, y)
 
-    def create_safe_function(self, expression: str) -> Callable[[float], float]:
-        """Creates a safe function from a string expression"""
-        # Define safe mathematical functions
-        safe_dict = {
-            'sin': math.sin,
-            'cos': math.cos,
-            'tan': math.tan,
-            'exp': math.exp,
-            'sqrt': math.sqrt,
-            'pi': math.pi,
-            'e': math.e,
-            'abs': abs,
-            'pow': pow
-        }
-
-        def safe_eval(x):
-            try:
-                # Create a safe local namespace with only x and math functions
-                local_dict = safe_dict.copy()
-                local_dict['x'] = x
-                # Evaluate the expression
-                return eval(expression, {"__builtins__": {}}, local_dict)
-            except Exception as e:
-                return None
-
-        return safe_eval
-
-    def parse_equation(self, equation_str: str) -> Callable[[float], float]:
-        """Parse equation string into a safe function"""
-        try:
-            # Clean up the equation string
-            equation_str = equation_str.strip().replace('^', '**')
-            if 'y' in equation_str and 'x' in equation_str:
-                # Convert equation to y = f(x) form
-                lhs, rhs = equation_str.split('=')
-                lhs = lhs.strip()
-                rhs = rhs.strip()
-                if lhs == 'y':
-                    return self.create_safe_function(rhs)
-                elif rhs == 'y':
-                    return self.create_safe_function(lhs)
-                else:
-                    self.show_message("Failed to process equation, press help for instructions", False)
-                    return None
-            elif 'x' in equation_str:
-                return self.create_safe_function(equation_str)
-            else:
-                self.show_message("Failed to process equation, press help for instructions", False)
-                return None
-        except Exception as e:
-            print(f"Error parsing equation: {e}")
-            self.show_message("Failed to process equation, press help for instructions", False)
-            return None
-
-    def plot_equation(self, equation_func: Callable[[float], float], color):
+    def draw_sliders(self):
+        if not self.sliders:
+            return
+        tracks, knobs = [], []
+        for name, rect in self.sliders.items():
+            parameter = self.parameters[name]
+            knob = rect.left + parameter.fraction() * rect.width
+            tracks += [(rect.left, rect.centery), (rect.right, rect.centery)]
+            knobs += [(knob, rect.top), (knob, rect.bottom)]
+            state = " (animating)" if parameter.animating else ""
+            self.draw_text_on_screen(f"{name} = {parameter.value:.3g}{state}", 30, rect.bottom, (60, 60, 60))
+            self.draw_text_on_screen(f"{parameter.low:g}..{parameter.high:g}", rect.right + 10, rect.bottom,
+                                     (150, 150, 150))
+        # Laid out in pixels, drawn in the world projection like everything else
+        tracks, knobs = np.array(tracks, dtype=np.float64), np.array(knobs, dtype=np.float64)
+        tracks = np.column_stack(self.view.screen_to_world(tracks[:, 0], tracks[:, 1]))
+        knobs = np.column_stack(self.view.screen_to_world(knobs[:, 0], knobs[:, 1]))
+        self.profiler.count("vertices", draw_vertices(tracks, GL_LINES, (0.6, 0.6, 0.6), width=2.0))
+        self.profiler.count("vertices", draw_vertices(knobs, GL_LINES, (0.2, 0.2, 0.6), width=6.0))
+
+    def draw_features(self, features: Features):
+        """Mark analysis results with a cross per point and label the ones nearest the center"""
+        size = 4 * self.view.units_per_pixel
+        for kinds, color in (((ROOT,), (0.1, 0.1, 0.1)), ((MAXIMUM, MINIMUM), (0.8, 0.3, 0.0)),
+                             ((INTERSECTION,), (0.5, 0.0, 0.6))):
+            chosen = np.isin(features.kinds, kinds)
+            xs, ys = features.xs[chosen], features.ys[chosen]
+            crosses = np.column_stack((np.repeat(xs, 4) + np.tile([-size, size, -size, size], len(xs)),
+                                       np.repeat(ys, 4) + np.tile([-size, size, size, -size], len(ys))))
+            self.profiler.count("vertices", draw_vertices(crosses, GL_LINES, color, width=2.0))
+        names = {ROOT: "root", MAXIMUM: "max", MINIMUM: "min", INTERSECTION: "cross"}
+        x_min, x_max, y_min, y_max = self.visible_bounds()
+        for i in label_order(features, (x_min + x_max) / 2, (y_min + y_max) / 2)[:self.max_labels]:
+            x, y = features.xs[i], features.ys[i]
+            screen_x, screen_y = self.view.world_to_screen(x, y)
+            self.draw_text_on_screen(f"{names[features.kinds[i]]} ({x:.4g}, {y:.4g})", int(screen_x) + 6,
+                                     int(screen_y) - 6, (70, 70, 70))
+
+    def plot_equation(self, equation_func: Callable[[float], float], color, live: Optional[CurveSamples] = None):
         if equation_func is None:
             return
             
-        glLineWidth(2.0)
-        glColor3f(*color)
-        
-        # Adjust number of points based on zoom level
-        num_points = int(1000 * self.zoom)  # More points when zoomed in
-        step = (2 * self.zoom) / num_points
-        x_start = -self.zoom + self.x_offset
-        
-        aspect_ratio = self.width / self.height
-        if aspect_ratio > 1:
-            x_start *= aspect_ratio
-            step *= aspect_ratio
-        
-        points = []
-        current_strip = []
-        
-        for i in range(num_points + 1):
-            x = x_start + (i * step)
-            try:
-                y = equation_func(x)
-                if y is not None and isinstance(y, (int, float)) and abs(y) < self.zoom * 10:
-                    current_strip.append((x, y))
-                else:
-                    if current_strip:
-                        points.append(current_strip)
-                        current_strip = []
-            except Exception:
-                if current_strip:
-                    points.append(current_strip)
-                    current_strip = []
-        
-        if current_strip:
-            points.append(current_strip)
-        
-        # Draw all collected strips
-        for strip in points:
-            if len(strip) > 1:
-                glBegin(GL_LINE_STRIP)
-                for x, y in strip:
-                    glVertex2f(x, y)
-                glEnd()
+        if isinstance(equation_func, DataSeries):
+            x_min, x_max, _, _ = self.visible_bounds()
+            self.plot_data(equation_func, color, x_min, x_max)
+            return None
+        buffer = self.curve_buffers.get(equation_func)
+        if buffer is None:
+            buffer = self.curve_buffers[equation_func] = StripBuffer()
+        mode = GL_LINES if equation_func.implicit else GL_LINE_STRIP
+        if live is not None:
+            # A parameter it reads is moving: drawn from samples of the view alone, not from tiles
+            if buffer.signature is not live:
+                buffer.upload(pack_strips(live.strips), live)
+            self.profiler.count("vertices", buffer.draw(color, width=2.0, mode=mode))
+            return None
+        curve = self.sample_equation(equation_func)
+        if curve.pending and self.scheduler is None:
+            self.mark_dirty("samples")  # Keep drawing until the finer tiles are all in
+
+        # The vertex buffer is only refilled when the set of tiles on screen changes
+        if buffer.signature != curve.keys:
+            buffer.upload(pack_strips(curve.strips), curve.keys)
+        self.profiler.count("vertices", buffer.draw(color, width=2.0, mode=mode))
+        return curve
+
+    def plot_data(self, series: DataSeries, color, x_min: float, x_max: float):
+        # Only the visible range is read, decimated to at most four points per pixel column
+        view = series.view(x_min, x_max, self.width)
+        buffer = self.curve_buffers.get(series)
+        if buffer is None:
+            buffer = self.curve_buffers[series] = StripBuffer()
+        signature = (view.key, x_min, x_max, self.width)
+        if buffer.signature != signature:
+            buffer.upload(pack_strips(view.strips), signature)
+        self.profiler.count("vertices", buffer.draw(color, width=1.0))
+
+    def notify_samples_ready(self):
+        # Runs on a worker thread: wake the event loop once per batch of finished tiles
+        if not self.samples_ready.is_set():
+            self.samples_ready.set()
+            pygame.event.post(pygame.event.Event(SAMPLES_READY))
 
     def show_message(self, text, is_success, duration=5000, color=None):
+        self.mark_dirty("message")
         self.message = text
         self.message_time = pygame.time.get_ticks()
         self.message_duration = duration
@@ -361,10 +350,15 @@ class EquationGrapher:
             "Dynamic Equation Grapher\n"
             "Type equation in the graph window and press Enter to plot\n"
             "Use mouse wheel to zoom, drag to pan\n"
-            "Click checkboxes to show/hide equations\n"
+            "Click checkboxes to show/hide equations, click a shape to select it\n"
             "Press Ctrl+Delete to clear all equations and shapes\n"
             "Example equations: x^2, sin(x), x^3 - 2*x\n"
-            "Example shapes: shape:circle:0:0:5"
+            "Example curves: param: x=cos(3t), y=sin(2t), t=0..2pi  polar: r=1+cos(theta)\n"
+            "Type analyze to mark roots, extrema and intersections\n"
+            "Parameters: a = 2 (or a = 2, 0..5), then y = a*sin(x); drag its slider or type animate:a\n"
+            "Example shapes: shape:circle:0:0:5\n"
+            "Data files: data:measurements.npy (also .csv, .f32, .f64)\n"
+            "Scenes: save:scene.bin or save:scene.txt, load:scene.bin"
         )
         print(help_text)
         self.show_message(help_text, True, duration=10000, color=(0, 0, 0))  # Black color for help message
@@ -374,26 +368,45 @@ class EquationGrapher:
         print(about_text)
         self.show_message(about_text, True, duration=10000)
 
-    def handle_input(self):
-        for event in pygame.event.get():
+    def handle_input(self, events=None):
+        pan_x = pan_y = 0  # Drag in pixels, summed over the events
+        zoom = 1.0         # Product of the wheel ticks
+        pointer = None     # Latest pointer position
+        size = None        # Latest window size
+        released = hover = False
+        slider_pointer = slider_released = None  # Latest pointer on the held slider, and a slider let go
+        view_events = 0
+        for event in pygame.event.get() if events is None else events:
             if event.type == pygame.QUIT:
                 return False
             
             elif event.type == pygame.KEYDOWN:
+                self.mark_dirty("input")
                 if event.key == pygame.K_RETURN and self.input_text:
                     if self.input_text.lower() == "help":
                         self.show_help()
                     elif self.input_text.lower() == "about":
                         self.show_about()
+                    elif self.input_text.lower() == "profile":
+                        self.profiler.enabled = not self.profiler.enabled
+                    elif self.input_text.lower() == "analyze":
+                        self.show_analysis = not self.show_analysis
+                        self.mark_dirty("view")
+                    elif self.input_text.lower() == "stats":
+                        self.show_stats = not self.show_stats
+                        if not self.show_stats:
+                            pygame.display.set_caption("Dynamic Equation Grapher")
                     elif self.input_text.startswith("shape:"):
                         self.handle_shape_input(self.input_text)
                         self.show_message("Shape added successfully", True)
-                    else:
-                        func = self.parse_equation(self.input_text)
-                        if func is not None:
-                            color = self.colors[len(self.equations) % len(self.colors)]
-                            self.equations.append((func, color, self.input_text, True))  # True for visible
-                            self.update_checkboxes()
+                    elif self.input_text.startswith("save:"):
+                        self.save_scene(self.input_text[len("save:"):].strip())
+                    elif self.input_text.startswith("load:"):
+                        self.load_scene(self.input_text[len("load:"):].strip())
+                    elif self.input_text.startswith("animate:"):
+                        self.animate_parameter(self.input_text[len("animate:"):].strip())
+                    elif self.define_parameter(self.input_text) is None:
+                        if self.add_equation(self.input_text):
                             self.show_message("Equation added successfully", True)
                         else:
                             self.show_message("Failed to add equation, press help for instructions", False)
@@ -401,110 +414,280 @@ class EquationGrapher:
                 elif event.key == pygame.K_BACKSPACE:
                     self.input_text = self.input_text[:-1]
                 elif event.key == pygame.K_DELETE and pygame.key.get_mods() & pygame.KMOD_CTRL:
-                    self.equations = []
-                    self.shapes = []
-                    self.checkboxes = []
+                    self.scene_loader = None
+                    self.clear_scene()
                 else:
                     if event.unicode.isprintable():
                         self.input_text += event.unicode
             
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 4:  # Mouse wheel up
-                    self.zoom *= 0.9
-                    self.reset_projection()
-                elif event.button == 5:  # Mouse wheel down
-                    self.zoom *= 1.1
-                    self.reset_projection()
+                if event.button in (4, 5):  # Mouse wheel up (zoom in) or down
+                    zoom *= self.wheel_step if event.button == 4 else 1 / self.wheel_step
+                    pointer = event.pos
+                    view_events += 1
                 elif event.button == 1:  # Left click
-                    # Check if click was on a checkbox
-                    mouse_pos = pygame.mouse.get_pos()
-                    for i, checkbox in enumerate(self.checkboxes):
-                        if checkbox.collidepoint(mouse_pos):
-                            # Toggle visibility
-                            func, color, eq_str, visible = self.equations[i]
-                            self.equations[i] = (func, color, eq_str, not visible)
+                    # Check if click was on a slider or a checkbox
+                    self.slider = self.slider_at(event.pos)
+                    i = self.checkbox_at(event.pos)
+                    self.dragging = i is None and self.slider is None
+                    if self.slider is not None:
+                        slider_pointer = event.pos
+                    elif i is not None:
+                        # Toggle visibility
+                        self.set_visible(i, not self.equations[i][3])
+                    else:
+                        # Select the shape under the mouse, or clear the selection
+                        tag = self.shape_at(event.pos)
+                        if tag != self.selected_shape:
+                            self.selected_shape = tag
+                            self.mark_dirty("shapes")
+                        if tag is not None:
+                            shape_type, parameters, _ = self.shapes.shape(tag)
+                            values = ":".join(f"{value:g}" for value in parameters.values())
+                            self.show_message(f"Selected shape:{shape_type}:{values}", True)
             
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                released = self.dragging
+                self.dragging = None
+                slider_released, self.slider = self.slider, None
+
             elif event.type == pygame.MOUSEMOTION:
-                if event.buttons[0]:  # Left mouse button
-                    # Only pan if not clicking checkboxes
-                    mouse_pos = pygame.mouse.get_pos()
-                    if not any(checkbox.collidepoint(mouse_pos) for checkbox in self.checkboxes):
-                        self.x_offset += event.rel[0] * self.zoom / 200
-                        self.y_offset -= event.rel[1] * self.zoom / 200
-                        self.reset_projection()
+                pointer = event.pos
+                if event.buttons[0] and self.slider is not None:
+                    slider_pointer = event.pos
+                elif event.buttons[0]:  # Left mouse button
+                    # Only pan if the drag did not start on a checkbox; decided once per drag
+                    if self.dragging is None:
+                        self.dragging = self.checkbox_at(event.pos) is None
+                    if self.dragging:
+                        pan_x += event.rel[0]
+                        pan_y += event.rel[1]
+                        view_events += 1
+                else:
+                    self.dragging = None
+                    hover = True
             
             elif event.type == pygame.VIDEORESIZE:
-                self.setup_viewport(event.w, event.h)
-                self.input_rect.y = event.h - 40
-        
+                size = (event.w, event.h)
+                view_events += 1
+
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.mark_dirty("view")
+
+            elif event.type == SAMPLES_READY:
+                self.mark_dirty("samples")
+
+        # Everything that moves the view arrived as one batch and is applied as one update
+        now = time.perf_counter()
+        updates = 0
+        if size is not None:
+            self.setup_viewport(*size)
+            self.input_rect.y = size[1] - 40
+            updates += 1
+        if pan_x or pan_y:
+            self.view.drag(pan_x, pan_y, now)
+            updates += 1
+        if released:
+            self.view.release(now)
+        if zoom != 1.0:
+            self.view.zoom_at(zoom, *pointer)
+            updates += 1
+        if updates:
+            self.mark_dirty("view")
+        # A held slider samples the curves reading it live; letting go settles them into cached tiles
+        if slider_pointer is not None:
+            name = self.slider or slider_released
+            self.set_parameter(name, self.slider_value(name, slider_pointer[0]), settle=False)
+        if slider_released is not None:
+            self.settle_parameters([slider_released])
+        if hover:
+            tag = self.shape_at(pointer)
+            if tag != self.hovered_shape:
+                self.hovered_shape = tag
+                self.mark_dirty("shapes")
+        self.frame_stats.input(view_events, updates)
         return True
 
-    def handle_shape_input(self, shape_input: str):
-        try:
-            parts = shape_input.split(":")
-            shape_type = parts[1]
-            color = self.colors[len(self.shapes) % len(self.colors)]
-            if shape_type == "circle":
-                center_x = float(parts[2])
-                center_y = float(parts[3])
-                radius = float(parts[4])
-                self.shapes.append(Shape("circle", color, center_x=center_x, center_y=center_y, radius=radius))
-            elif shape_type == "rectangle":
-                x1 = float(parts[2])
-                y1 = float(parts[3])
-                x2 = float(parts[4])
-                y2 = float(parts[5])
-                self.shapes.append(Shape("rectangle", color, x1=x1, y1=y1, x2=x2, y2=y2))
-            elif shape_type == "line":
-                x1 = float(parts[2])
-                y1 = float(parts[3])
-                x2 = float(parts[4])
-                y2 = float(parts[5])
-                self.shapes.append(Shape("line", color, x1=x1, y1=y1, x2=x2, y2=y2))
-            print(f"Added shape: {shape_input}")
-        except Exception as e:
-            print(f"Error adding shape: {e}")
+    def update_view(self, dt: float):
+        """Step zoom easing and coasting by ``dt`` seconds"""
+        if self.view.advance(dt):
+            self.mark_dirty("view")
+
+    def add_equation(self, equation_str: str, color=None, visible=True, report=True) -> bool:
+        if not super().add_equation(equation_str, color, visible, report):
+            return False
+        self.update_checkboxes()
+        return True
+
+    def add_parameter(self, name: str, value: float, low: Optional[float] = None, high: Optional[float] = None):
+        super().add_parameter(name, value, low, high)
+        self.update_sliders()
+
+    def discard_samples(self, func: Callable):
+        super().discard_samples(func)
+        buffer = self.curve_buffers.pop(func, None)
+        if buffer is not None:
+            buffer.delete()
+
+    def clear_scene(self):
+        super().clear_scene()
+        self.selected_shape = self.hovered_shape = None
+        self.checkboxes = []
+        self.sliders = {}
+        self.slider = None
+        for buffer in self.curve_buffers.values():
+            buffer.delete()
+        self.curve_buffers = {}
 
     def render(self):
+        self.dirty.clear()
+        self.last_frame_time = pygame.time.get_ticks()
+        self.profiler.begin_frame()
+        self.profiler.count("coalesced", self.frame_stats.frame_coalesced)
+        self.frame_stats.frame()
+        evaluations = self.sample_cache.evaluations
+        shared = self.expressions.requested - self.expressions.evaluated
+        text_built = self.text_cache.layouts_built + len(self.text_cache.atlas.glyphs)
+
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         self.reset_projection()
+        if self.scheduler is not None:
+            with self.profiler.stage("collect"):
+                self.samples_ready.clear()
+                self.collect_samples()
         
         # Draw grid and axes
-        self.draw_grid()
+        with self.profiler.stage("grid"):
+            self.draw_grid()
         
+        # Equations reading a moving parameter, sampled over the view within the frame's budget
+        with self.profiler.stage("live"):
+            self.profiler.count("live_curves", self.sample_live())
+
         # Plot visible equations
-        for idx, (func, color, eq_str, visible) in enumerate(self.equations):
-            if visible:
-                self.plot_equation(func, color)
-            # Draw equation list and checkboxes
-            text_color = tuple(int(c * 255) for c in color)
-            self.draw_text_on_screen(f"{eq_str}", 
-                                   self.width - 180, 20 + idx * 20, 
-                                   text_color)
-        
+        wanted = []
+        curves = {}
+        with self.profiler.stage("curves"):
+            for idx, (func, color, eq_str, visible) in enumerate(self.equations):
+                if visible:
+                    live = self.live.get(idx)
+                    curve = self.plot_equation(func, color, live[0] if live is not None else None)
+                    if curve is not None:
+                        wanted.extend(curve.wanted)
+                        curves[idx] = curve
+                # Draw equation list and checkboxes
+                text_color = tuple(int(c * 255) for c in color)
+                self.draw_text_on_screen(f"{eq_str}", 
+                                       self.width - 180, 20 + idx * 20, 
+                                       text_color)
+
+            # Tiles queued for an earlier view that are no longer on screen are dropped
+            if self.scheduler is not None:
+                self.scheduler.retain(wanted)
+
+        # Roots, extrema and intersections of the curves just drawn, from the tiles they were drawn from
+        if self.show_analysis:
+            with self.profiler.stage("analysis"):
+                features = self.analyze(curves, budget=self.analysis_budget)
+                self.draw_features(features)
+            self.profiler.count("features", len(features.xs))
+
         # Draw shapes
-        for shape in self.shapes:
-            shape.draw()
+        with self.profiler.stage("shapes"):
+            # Only shapes overlapping the view are in the batch; it is rebuilt as the view moves away
+            batch = self.shapes.batch(self.visible_bounds(), self.width)
+            self.profiler.count("vertices", self.shape_buffer.draw(batch))
+            self.profiler.count("shapes_culled", batch.culled)
+            for tag, color, width in ((self.hovered_shape, (0.6, 0.6, 0.6), 4.0),
+                                      (self.selected_shape, (0.1, 0.1, 0.1), 3.0)):
+                if tag is not None:
+                    shape_type, parameters, _ = self.shapes.shape(tag)
+                    vertices, closed = shape_outline(shape_type, parameters)
+                    mode = GL_LINE_LOOP if closed else GL_LINES
+                    self.profiler.count("vertices", draw_vertices(vertices, mode, color, width=width))
         
+        self.draw_sliders()
+
         # Draw input box and text
         self.draw_text_on_screen("Enter equation: " + self.input_text, 30, self.height - 30)
         
         # Draw message
         self.draw_message()
-        
-        pygame.display.flip()
+
+        # Overlay shows the figures as of the previous frame
+        for i, line in enumerate(self.profiler.overlay_lines() if self.profiler.enabled else []):
+            self.draw_text_on_screen(line, 10, 20 + i * 16, (90, 90, 90))
+
+        # All text queued this frame goes out in one batch
+        with self.profiler.stage("text"):
+            self.profiler.count("vertices", self.text_renderer.draw(self.width, self.height))
+        self.profiler.count("samples", self.sample_cache.evaluations - evaluations)
+        self.profiler.count("shared", self.expressions.requested - self.expressions.evaluated - shared)
+        self.profiler.count("text_surfaces", self.text_cache.layouts_built + len(self.text_cache.atlas.glyphs) - text_built)
+
+        with self.profiler.stage("flip"):
+            pygame.display.flip()
+        self.profiler.end_frame()
+
+    def wait_for_events(self):
+        """Block until there is input, the next frame is due, or the on-screen message expires"""
+        now = pygame.time.get_ticks()
+        if self.scene_loader is not None:
+            timeout = 0  # Keep loading
+        elif self.dirty or self.view.moving or self.parameters.animating:
+            # Input that arrives before the frame is due is handled as one batch
+            timeout = self.last_frame_time + 1000 / self.max_fps - now
+        else:
+            deadlines = []
+            if self.message:
+                deadlines.append(self.message_time + self.message_duration - now)
+            if self.show_stats:
+                deadlines.append(1000)
+            timeout = min(deadlines) if deadlines else None
+
+        if timeout is not None and timeout <= 0:
+            return pygame.event.get()
+        event = pygame.event.wait() if timeout is None else pygame.event.wait(int(math.ceil(timeout)))
+        if event.type == pygame.NOEVENT:
+            return pygame.event.get()
+        return [event] + pygame.event.get()
 
     def run(self):
         running = True
+        last_step = time.perf_counter()
         while running:
-            running = self.handle_input()
-            self.render()
-            pygame.time.wait(10)
-        
+            running = self.handle_input(self.wait_for_events())
+            now = time.perf_counter()
+            self.update_view(min(now - last_step, 0.1))
+            self.update_parameters(min(now - last_step, 0.1))
+            last_step = now
+            if self.scene_loader is not None:
+                self.continue_loading()
+            now = pygame.time.get_ticks()
+            if self.message and now - self.message_time >= self.message_duration:
+                self.mark_dirty("message")
+            if running and self.dirty and now - self.last_frame_time >= 1000 / self.max_fps:
+                self.render()
+            if self.frame_stats.tick() and self.show_stats:
+                pygame.display.set_caption(f"Dynamic Equation Grapher - {self.frame_stats.fps:.0f} fps, "
+                                           f"{self.frame_stats.cpu_percent:.0f}% CPU, "
+                                           f"{self.expressions.saved:.0%} evaluation shared")
+
+        print(self.frame_stats.summary())
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
         pygame.quit()
 
 if __name__ == "__main__":
-    grapher = EquationGrapher()
+    parser = argparse.ArgumentParser(description="Dynamic Equation Grapher")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="time every render stage, show an overlay and write the frames to PATH (.csv or .json) on exit")
+    parser.add_argument("--scene", metavar="PATH", help="open a scene saved with save:PATH")
+    args = parser.parse_args()
+
+    grapher = EquationGrapher(profile=bool(args.profile))
+    if args.scene:
+        grapher.load_scene(args.scene)
     print("Dynamic Equation Grapher")
     print("Type equation in the graph window and press Enter to plot")
     print("Use mouse wheel to zoom, drag to pan")
@@ -512,4 +695,6 @@ if __name__ == "__main__":
     print("Press Ctrl+Delete to clear all equations and shapes")
     print("Example equations: x^2, sin(x), x^3 - 2*x")
     print("Example shapes: shape:circle:0:0:5")
-    grapher.run()
\ No newline at end of file
+    grapher.run()
+    if args.profile:
+        grapher.profiler.dump(args.profile)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from expression import CONSTANTS, FUNCTIONS, ExpressionError, _constant_value
+
+# "a = 2" or "a = 2, 0..5": a name, a value and optionally the slider's range
+_DEFINITION = re.compile(r"^\s*([A-Za-z_]\w*)\s*=\s*([^=]+)$")
+_RESERVED = {'x', 'y'} | set(FUNCTIONS) | set(CONSTANTS)
+
+
+def _check_name(name: str):
+    # Compiled equations keep their own constants and functions in globals named _k0, _f_sin and so on
+    if name.startswith('_'):
+        raise ExpressionError(f"Parameter names may not start with an underscore: {name}")
+
+
+class Parameter:
+    """A named value that equations read, with the range its slider covers"""
+
+    def __init__(self, name: str, value: float, low: float, high: float):
+        self.name = name
+        self.value = value
+        self.low = low
+        self.high = high
+        self.period = 4.0      # Seconds an animation takes to sweep the range and back
+        self.animating = False
+        self.phase = 0.0       # Position in the animation, 0 to 1 one way and 1 to 2 back
+
+    def fraction(self) -> float:
+        """Where the value sits in the range, from 0 to 1"""
+        return (self.value - self.low) / (self.high - self.low)
+
+
+def parse_parameter(text: str) -> Optional[Tuple[str, float, Optional[float], Optional[float]]]:
+    """Name, value and range of "a = 2" or "a = 2, 0..5"; None if the text is not a parameter definition.
+
+    Raises ExpressionError for a definition with a bad value or range.
+    """
+    match = _DEFINITION.match(text.replace('^', '**'))
+    if match is None or match.group(1) in _RESERVED:
+        return None
+    name, body = match.groups()
+    _check_name(name)
+    value, _, bounds = body.partition(',')
+    low = high = None
+    if bounds.strip():
+        low_text, dots, high_text = bounds.partition('..')
+        if not dots:
+            raise ExpressionError(f"Expected a range like 0..5 for {name}, got {bounds.strip()!r}")
+        low, high = _constant_value(low_text), _constant_value(high_text)
+        if not low < high:
+            raise ExpressionError("Parameter range must go from low to high")
+    return name, _constant_value(value), low, high
+
+
+class ParameterSet:
+    """Named parameters and the equations that depend on each of them.
+
+    Equations are known by their position in the grapher's list. A change
+    to a parameter reports only the equations that read it, so only those
+    are sampled again. Animated parameters sweep their range back and
+    forth as ``advance`` is stepped.
+    """
+
+    def __init__(self):
+        self.parameters: Dict[str, Parameter] = {}
+        self.dependents: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.parameters)
+
+    def __iter__(self):
+        return iter(self.parameters.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.parameters
+
+    def __getitem__(self, name: str) -> Parameter:
+        return self.parameters[name]
+
+    @property
+    def values(self) -> Dict[str, float]:
+        return {name: parameter.value for name, parameter in self.parameters.items()}
+
+    @property
+    def animating(self) -> bool:
+        return any(parameter.animating for parameter in self.parameters.values())
+
+    def define(self, name: str, value: float, low: Optional[float] = None, high: Optional[float] = None) -> bool:
+        """Add a parameter or change an existing one; returns True if its value changed.
+
+        Without a range, a new parameter's slider covers -10..10, widened to
+        take in the value, and an existing one keeps its range. Raises
+        ExpressionError for a name starting with an underscore.
+        """
+        parameter = self.parameters.get(name)
+        if parameter is None:
+            _check_name(name)
+            if low is None:
+                span = 10.0 if abs(value) < 10 else 2 * abs(value)
+                low, high = -span, span
+            self.parameters[name] = Parameter(name, value, low, high)
+            self.dependents[name] = set()
+            return False
+        if low is not None:
+            parameter.low, parameter.high = low, high
+        parameter.low, parameter.high = min(parameter.low, value), max(parameter.high, value)
+        return self.set(name, value)
+
+    def set(self, name: str, value: float) -> bool:
+        """Change a parameter's value, kept within its range; returns True if it changed"""
+        parameter = self.parameters[name]
+        value = min(max(float(value), parameter.low), parameter.high)
+        if value == parameter.value:
+            return False
+        parameter.value = value
+        return True
+
+    def depend(self, equation: int, names: Iterable[str]):
+        """Record that an equation reads these parameters"""
+        for name in names:
+            self.dependents[name].add(equation)
+
+    def affected(self, names: Iterable[str]) -> List[int]:
+        """Equations that read any of the named parameters, in list order"""
+        equations: Set[int] = set()
+        for name in names:
+            equations |= self.dependents.get(name, set())
+        return sorted(equations)
+
+    def animate(self, name: str, animating: Optional[bool] = None) -> bool:
+        """Start or stop sweeping a parameter over its range (toggled by default); returns the new state"""
+        parameter = self.parameters[name]
+        parameter.animating = not parameter.animating if animating is None else animating
+        if parameter.animating:
+            # Start from the current value, heading up
+            parameter.phase = parameter.fraction()
+        return parameter.animating
+
+    def advance(self, dt: float) -> List[str]:
+        """Step animations by ``dt`` seconds; returns the names of the parameters that changed"""
+        changed = []
+        for parameter in self.parameters.values():
+            if not parameter.animating:
+                continue
+            parameter.phase = (parameter.phase + 2 * dt / parameter.period) % 2
+            # Up the range and back down, at a steady pace
+            fraction = parameter.phase if parameter.phase <= 1 else 2 - parameter.phase
+            if self.set(parameter.name, parameter.low + fraction * (parameter.high - parameter.low)):
+                changed.append(parameter.name)
+        return changed
+
+    def clear(self):
+        self.parameters.clear()
+        self.dependents.clear()
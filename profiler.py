@@ -0,0 +1,94 @@
+import csv
+import json
+import time
+from collections import deque
+from itertools import islice
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class FrameProfiler:
+    """Per-stage frame timings and per-frame counters.
+
+    Wrap each render stage in ``with profiler.stage("name")`` and record
+    counts with ``profiler.count``. Every finished frame becomes one record
+    (stage times in milliseconds plus counters) kept in a ring buffer that
+    can be shown as an overlay or dumped to CSV/JSON. When disabled, stages
+    and counters cost a flag check.
+    """
+
+    def __init__(self, enabled: bool = False, history: int = 10000):
+        self.enabled = enabled
+        self.frames = deque(maxlen=history)
+        self.names: Dict[str, None] = {}  # Every stage and counter recorded, in the order first seen
+        self.current: Dict[str, float] = {}
+        self.frame_start = 0.0
+
+    def begin_frame(self):
+        if self.enabled:
+            self.current = {}
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if self.enabled:
+            self.current['frame'] = (time.perf_counter() - self.frame_start) * 1000
+            self.frames.append(self.current)
+            for name in self.current:
+                self.names.setdefault(name)
+            self.current = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[name] = self.current.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.current[name] = self.current.get(name, 0) + amount
+
+    def columns(self) -> List[str]:
+        return list(self.names)
+
+    def percentiles(self, name: str, points=(50, 90, 99)) -> Optional[List[float]]:
+        values = [frame.get(name, 0.0) for frame in self.frames]
+        if not values:
+            return None
+        return [float(value) for value in np.percentile(values, points)]
+
+    def summary(self, points=(50, 90, 99)) -> Dict[str, List[float]]:
+        return {name: self.percentiles(name, points) for name in self.columns()}
+
+    def overlay_lines(self, window: int = 60) -> List[str]:
+        """Averages over the last ``window`` frames, one line per stage or counter"""
+        # Only the newest frames: the overlay is drawn every frame and must not scan the whole history
+        recent = list(islice(reversed(self.frames), window))[::-1]
+        if not recent:
+            return []
+        lines = [f"{len(recent)} frames"]
+        for name in self.columns():
+            mean = sum(frame.get(name, 0.0) for frame in recent) / len(recent)
+            if isinstance(recent[-1].get(name, 0), int):
+                lines.append(f"{name}: {mean:.0f}")
+            else:
+                lines.append(f"{name}: {mean:.2f} ms")
+        return lines
+
+    def dump(self, path: str):
+        """Write every recorded frame to ``path``, as JSON if it ends in .json and CSV otherwise"""
+        columns = self.columns()
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({'frames': list(self.frames), 'summary': self.summary()}, f, indent=1)
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, restval=0)
+            writer.writeheader()
+            writer.writerows(self.frames)
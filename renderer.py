@@ -0,0 +1,179 @@
+import numpy as np
+from OpenGL.GL import *
+from typing import Hashable, Tuple
+from geometry import StripBatch
+from shapes import ShapeBatch
+from text import TextCache
+
+
+class StripBuffer:
+    """A StripBatch uploaded to a vertex buffer object.
+
+    The buffer is only re-uploaded when the caller passes a new signature,
+    so a curve whose samples did not change costs one draw call per frame.
+    """
+
+    def __init__(self):
+        self.vbo = glGenBuffers(1)
+        self.signature = None
+        self.firsts = np.zeros(0, dtype=np.int32)
+        self.counts = np.zeros(0, dtype=np.int32)
+        self.vertex_count = 0
+        self.origin = (0.0, 0.0)
+        self.uploads = 0
+
+    def upload(self, batch: StripBatch, signature: Hashable):
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, batch.vertices.nbytes, batch.vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.firsts = batch.firsts
+        self.counts = batch.counts
+        self.vertex_count = batch.vertex_count
+        self.origin = batch.origin
+        self.signature = signature
+        self.uploads += 1
+
+    def draw(self, color: Tuple[float, float, float], width: float = 2.0, mode=GL_LINE_STRIP) -> int:
+        """Draw every strip; returns the number of vertices drawn"""
+        if not len(self.counts):
+            return 0
+        glLineWidth(width)
+        glColor3f(*color)
+        glPushMatrix()
+        glTranslated(self.origin[0], self.origin[1], 0.0)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, None)
+        glMultiDrawArrays(mode, self.firsts, self.counts, len(self.counts))
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glPopMatrix()
+        return self.vertex_count
+
+    def delete(self):
+        glDeleteBuffers(1, [self.vbo])
+        self.vbo = 0
+
+
+class ShapeBuffer:
+    """A ShapeBatch in vertex and color buffers: every outline loop in one call, every line in another.
+
+    Like StripBuffer it is only re-uploaded when handed a different batch.
+    """
+
+    def __init__(self):
+        self.vbo = glGenBuffers(1)
+        self.color_vbo = glGenBuffers(1)
+        self.batch = None
+        self.uploads = 0
+
+    def upload(self, batch: ShapeBatch):
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, batch.vertices.nbytes, batch.vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_vbo)
+        glBufferData(GL_ARRAY_BUFFER, batch.colors.nbytes, batch.colors, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.batch = batch
+        self.uploads += 1
+
+    def draw(self, batch: ShapeBatch, width: float = 1.0) -> int:
+        """Draw ``batch``, uploading it first if it is not the one in the buffers; returns vertices drawn"""
+        if batch is not self.batch:
+            self.upload(batch)
+        if not batch.vertex_count:
+            return 0
+        glLineWidth(width)
+        glPushMatrix()
+        glTranslated(batch.origin[0], batch.origin[1], 0.0)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glVertexPointer(2, GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_vbo)
+        glColorPointer(3, GL_FLOAT, 0, None)
+        if len(batch.loop_counts):
+            glMultiDrawArrays(GL_LINE_LOOP, batch.loop_firsts, batch.loop_counts, len(batch.loop_counts))
+        if batch.line_count:
+            glDrawArrays(GL_LINES, batch.line_first, batch.line_count)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glPopMatrix()
+        return batch.vertex_count
+
+    def delete(self):
+        glDeleteBuffers(2, [self.vbo, self.color_vbo])
+        self.vbo = self.color_vbo = 0
+
+
+def draw_vertices(vertices: np.ndarray, mode, color: Tuple[float, float, float], width: float = 1.0) -> int:
+    """Draw transient geometry (grid lines, shapes) straight from a client-side vertex array"""
+    if not len(vertices):
+        return 0
+    glLineWidth(width)
+    glColor3f(*color)
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(2, GL_FLOAT, 0, np.ascontiguousarray(vertices, dtype=np.float32))
+    glDrawArrays(mode, 0, len(vertices))
+    glDisableClientState(GL_VERTEX_ARRAY)
+    return len(vertices)
+
+
+class TextRenderer:
+    """Draws a TextCache's queued labels as textured quads in one call"""
+
+    def __init__(self, cache: TextCache):
+        self.cache = cache
+        self.texture = glGenTextures(1)
+        self.uploaded_version = None
+
+    def upload_atlas(self):
+        width, height = self.cache.atlas.size
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA, width, height, 0, GL_ALPHA, GL_UNSIGNED_BYTE, self.cache.atlas.pixels)
+        self.uploaded_version = self.cache.atlas.version
+
+    def draw(self, width: int, height: int) -> int:
+        """Draw and clear the queued text; returns the number of vertices drawn"""
+        positions, uvs, colors = self.cache.build()
+        if not len(positions):
+            return 0
+        if self.uploaded_version != self.cache.atlas.version:
+            self.upload_atlas()
+
+        # Screen space with the origin at the top-left corner, like pygame
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, width, height, 0, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, positions)
+        glTexCoordPointer(2, GL_FLOAT, 0, uvs)
+        glColorPointer(4, GL_FLOAT, 0, colors)
+        glDrawArrays(GL_QUADS, 0, len(positions))
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisable(GL_TEXTURE_2D)
+
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        return len(positions)
+
+    def delete(self):
+        glDeleteTextures([self.texture])
+        self.texture = 0
@@ -0,0 +1,244 @@
+import functools
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+
+
+class CurveSamples:
+    """Polyline strips for one curve plus the number of function evaluations it took"""
+
+    def __init__(self, strips: List[np.ndarray], evaluations: int):
+        self.strips = strips  # List of (n, 2) float64 arrays of (x, y) points
+        self.evaluations = evaluations
+
+    @property
+    def vertex_count(self) -> int:
+        return sum(len(strip) for strip in self.strips)
+
+
+def split_strips(xs: np.ndarray, ys: np.ndarray) -> List[np.ndarray]:
+    """Split sorted samples into polyline strips wherever y is NaN or infinite"""
+    valid = np.isfinite(ys)
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], valid, [False])).astype(np.int8)))
+    return [np.column_stack((xs[start:end], ys[start:end]))
+            for start, end in zip(edges[::2], edges[1::2]) if end - start > 1]
+
+
+@functools.lru_cache(maxsize=1024)
+def initial_grid(x_min: float, x_max: float, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Evenly spaced x values and the midpoints between them, shared read-only by every curve sampled over them.
+
+    Equations sampled for the same tile get the very same arrays, which
+    lets an ExpressionGraph reuse their common subexpressions.
+    """
+    xs = np.linspace(x_min, x_max, count)
+    midpoints = (xs[:-1] + xs[1:]) / 2
+    xs.flags.writeable = midpoints.flags.writeable = False
+    return xs, midpoints
+
+
+def sample_curve(func: Callable[[np.ndarray], np.ndarray],
+                 x_min: float, x_max: float, x_pixels: int,
+                 y_min: Optional[float] = None, y_max: Optional[float] = None, y_pixels: Optional[int] = None,
+                 tolerance: float = 0.5, initial_step: float = 4.0, min_step: float = 1.0 / 64,
+                 jump: float = 2.0, max_samples_per_pixel: int = 32) -> CurveSamples:
+    """Sample y = func(x) over [x_min, x_max] with cost bounded by the screen width.
+
+    The curve starts out with one sample every ``initial_step`` pixels. Each
+    round evaluates the midpoints of all candidate intervals in a single
+    vectorized call and subdivides those whose midpoint sits more than
+    ``tolerance`` pixels away from the chord, or that straddle the edge of
+    the function's domain. Intervals that are still unresolved at
+    ``min_step`` pixels and jump by more than ``jump`` pixels are treated as
+    discontinuities (asymptotes, steps) and the strip is split there.
+
+    When a visible y-range is given, intervals lying entirely above or below
+    it are not refined, and y values are clamped well outside it so that
+    vertices stay finite in float32.
+    """
+    x_pixels = max(int(x_pixels), 1)
+    x_scale = x_pixels / (x_max - x_min)  # pixels per unit along x
+    banded = y_min is not None and y_max is not None
+    if banded:
+        y_scale = (y_pixels or x_pixels) / (y_max - y_min)
+    else:
+        y_scale = x_scale
+    max_samples = x_pixels * max_samples_per_pixel
+
+    xs, midpoints = initial_grid(x_min, x_max, int(np.ceil(x_pixels / initial_step)) + 1)
+    ys = func(xs)
+    evaluations = len(xs)
+    found_x = [xs]
+    found_y = [ys]
+
+    # Candidate intervals, all refined in lockstep one level per round
+    a, b, ya, yb = xs[:-1], xs[1:], ys[:-1], ys[1:]
+    width = (x_max - x_min) / (len(xs) - 1) * x_scale
+    m = midpoints
+    while len(a):
+        ym = func(m)
+        evaluations += len(m)
+
+        with np.errstate(invalid='ignore'):
+            error = np.abs(ym - (ya + yb) / 2) * y_scale
+            one_sided = np.isnan(ya) != np.isnan(yb)
+            refine = (error > tolerance) | one_sided
+            if banded:
+                low = np.fmin(np.fmin(ya, yb), ym)
+                high = np.fmax(np.fmax(ya, yb), ym)
+                refine &= ~((high < y_min) | (low > y_max))
+
+        found_x.append(m)
+        found_y.append(ym)
+        width /= 2
+        if evaluations + 2 * np.count_nonzero(refine) > max_samples:
+            break
+        if width < min_step:
+            # Out of resolution: whatever is still unresolved and jumps is a discontinuity
+            with np.errstate(invalid='ignore'):
+                left_jump = refine & (np.abs(ym - ya) * y_scale > jump)
+                right_jump = refine & (np.abs(yb - ym) * y_scale > jump)
+            found_x.append((a[left_jump] + m[left_jump]) / 2)
+            found_x.append((m[right_jump] + b[right_jump]) / 2)
+            found_y.append(np.full(np.count_nonzero(left_jump) + np.count_nonzero(right_jump), np.nan))
+            break
+
+        a, m, b = a[refine], m[refine], b[refine]
+        ya, ym, yb = ya[refine], ym[refine], yb[refine]
+        a, b, ya, yb = np.concatenate((a, m)), np.concatenate((m, b)), np.concatenate((ya, ym)), np.concatenate((ym, yb))
+        m = (a + b) / 2
+
+    xs = np.concatenate(found_x)
+    ys = np.concatenate(found_y)
+    order = np.argsort(xs, kind='stable')
+    xs, ys = xs[order], ys[order]
+    if banded:
+        margin = 10 * (y_max - y_min)
+        ys = np.clip(ys, y_min - margin, y_max + margin)
+    return CurveSamples(split_strips(xs, ys), evaluations)
+
+
+def max_deviation(func: Callable[[np.ndarray], np.ndarray], samples: CurveSamples,
+                  y_min: float, y_max: float, y_pixels: int) -> float:
+    """Largest on-screen gap in pixels between the sampled polyline and a dense evaluation of the curve"""
+    worst = 0.0
+    for strip in samples.strips:
+        xs = np.linspace(strip[0, 0], strip[-1, 0], 20_000)
+        exact = func(xs)
+        drawn = np.interp(xs, strip[:, 0], strip[:, 1])
+        visible = (exact > y_min) & (exact < y_max) & (drawn > y_min) & (drawn < y_max)
+        if visible.any():
+            worst = max(worst, float(np.max(np.abs(exact - drawn)[visible])) * y_pixels / (y_max - y_min))
+    return worst
+
+
+def sample_parametric(func: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]], t_min: float, t_max: float,
+                      x_min: float, x_max: float, y_min: float, y_max: float, x_pixels: int, y_pixels: int,
+                      tolerance: float = 0.5, segment_pixels: float = 4.0, initial_samples: int = 1021,
+                      max_pieces: int = 64, max_rounds: int = 40, jump: float = 16.0, margin: float = 0.5,
+                      max_samples: int = 2_000_000) -> CurveSamples:
+    """Sample a parametric curve (x(t), y(t)) with density following its on-screen arc length.
+
+    The curve starts out with ``initial_samples`` evenly spaced values of t
+    (a prime count, so curves with a whole number of lobes are not aliased
+    onto the same few points). Each round evaluates the midpoints of all
+    candidate intervals in one vectorized call, which gives the on-screen
+    length of both halves and how far the curve bends away from the chord.
+    Halves that are too long or bend too much are cut into as many pieces
+    as their length calls for, again in a single call, and the pieces become
+    the next round's candidates. Intervals that stay long after
+    ``max_rounds`` halvings are discontinuities and the strip is split
+    there. Intervals lying more than ``margin`` view sizes outside the view
+    are not refined, and sampling stops early once ``max_samples`` is spent.
+    """
+    x_scale = x_pixels / (x_max - x_min)  # pixels per unit
+    y_scale = y_pixels / (y_max - y_min)
+    width, height = x_max - x_min, y_max - y_min
+
+    ts = np.linspace(t_min, t_max, initial_samples)
+    xs, ys = func(ts)
+    evaluations = len(ts)
+    found_t, found_x, found_y = [ts], [xs], [ys]
+
+    breaks = np.zeros(0)
+    # Candidate intervals, all refined in lockstep
+    a, b, xa, xb, ya, yb = ts[:-1], ts[1:], xs[:-1], xs[1:], ys[:-1], ys[1:]
+    for round_number in range(max_rounds):
+        if not len(a) or evaluations + len(a) > max_samples:
+            break
+        m = (a + b) / 2
+        xm, ym = func(m)
+        evaluations += len(m)
+        found_t.append(m)
+        found_x.append(xm)
+        found_y.append(ym)
+
+        with np.errstate(invalid='ignore'):
+            left = np.hypot((xm - xa) * x_scale, (ym - ya) * y_scale)
+            right = np.hypot((xb - xm) * x_scale, (yb - ym) * y_scale)
+            chord_x, chord_y = (xb - xa) * x_scale, (yb - ya) * y_scale
+            chord = np.hypot(chord_x, chord_y)
+            bend = np.abs(chord_x * (ym - ya) * y_scale - chord_y * (xm - xa) * x_scale) / np.maximum(chord, 1e-12)
+            bend = np.where(chord > 1e-9, bend, left)
+            defined = np.stack((xa, xb, xm)) == np.stack((xa, xb, xm))
+            one_sided = defined.any(axis=0) & ~defined.all(axis=0)
+            refine = (left + right > segment_pixels) | (bend > tolerance) | one_sided
+            # Nothing to resolve when all three points are well away from the view
+            low_x = np.fmin(np.fmin(xa, xb), xm)
+            high_x = np.fmax(np.fmax(xa, xb), xm)
+            low_y = np.fmin(np.fmin(ya, yb), ym)
+            high_y = np.fmax(np.fmax(ya, yb), ym)
+            pad_x, pad_y = width * margin, height * margin
+            refine &= ~((high_x < x_min - pad_x) | (low_x > x_max + pad_x) |
+                        (high_y < y_min - pad_y) | (low_y > y_max + pad_y))
+
+        if round_number == max_rounds - 1:
+            # Out of rounds: a half that is still long at this resolution is a jump, not a curve
+            with np.errstate(invalid='ignore'):
+                left_jump = refine & (left > jump)
+                right_jump = refine & (right > jump)
+            # Halving t this often can leave no float between the ends, so a break goes after a sample
+            breaks = np.concatenate((a[left_jump], m[right_jump]))
+            break
+
+        # Split each refined interval into its two halves, then each half into pieces by its length
+        pick = np.flatnonzero(refine)
+        ha = np.concatenate((a[pick], m[pick]))
+        hb = np.concatenate((m[pick], b[pick]))
+        hxa, hya = np.concatenate((xa[pick], xm[pick])), np.concatenate((ya[pick], ym[pick]))
+        hxb, hyb = np.concatenate((xm[pick], xb[pick])), np.concatenate((ym[pick], yb[pick]))
+        with np.errstate(invalid='ignore'):
+            half_length = np.nan_to_num(np.concatenate((left[pick], right[pick])), nan=segment_pixels * 2)
+        pieces = np.clip(np.ceil(half_length / segment_pixels), 1, max_pieces).astype(np.int64)
+        if evaluations + int((pieces - 1).sum()) + len(pieces) > max_samples:
+            break
+
+        # Nodes along every half: its two ends plus pieces - 1 new points in between
+        owner = np.repeat(np.arange(len(pieces)), pieces + 1)
+        position = np.arange(len(owner)) - np.repeat(np.cumsum(pieces + 1) - (pieces + 1), pieces + 1)
+        node_t = ha[owner] + (hb - ha)[owner] * position / pieces[owner]
+        node_x = np.where(position == 0, hxa[owner], hxb[owner])
+        node_y = np.where(position == 0, hya[owner], hyb[owner])
+        interior = (position > 0) & (position < pieces[owner])
+        if interior.any():
+            node_x[interior], node_y[interior] = func(node_t[interior])
+            evaluations += int(interior.sum())
+            found_t.append(node_t[interior])
+            found_x.append(node_x[interior])
+            found_y.append(node_y[interior])
+
+        starts = np.flatnonzero(position < pieces[owner])
+        a, b = node_t[starts], node_t[starts + 1]
+        xa, xb, ya, yb = node_x[starts], node_x[starts + 1], node_y[starts], node_y[starts + 1]
+
+    ts = np.concatenate(found_t)
+    order = np.argsort(ts, kind='stable')
+    xs = np.concatenate(found_x)[order]
+    ys = np.concatenate(found_y)[order]
+    if len(breaks):
+        after = np.searchsorted(ts[order], breaks, side='right')
+        xs, ys = np.insert(xs, after, np.nan), np.insert(ys, after, np.nan)
+    # Keep vertices finite in float32 but far enough out that clamping never shows
+    xs = np.clip(xs, x_min - 10 * width, x_max + 10 * width)
+    ys = np.clip(ys, y_min - 10 * height, y_max + 10 * height)
+    ys[np.isnan(xs)] = np.nan
+    return CurveSamples(split_strips(xs, ys), evaluations)
@@ -0,0 +1,192 @@
+import struct
+import numpy as np
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple
+from geometry import SHAPE_FIELDS
+from shapes import SHAPE_TYPES, ShapeStore
+
+# Binary scenes: a magic string and version, then tagged sections until END
+MAGIC = b"GRAPHSCN"
+VERSION = 3  # Version 2 added parameters, version 3 longer parameter names; older scenes still load
+END, VIEW, EQUATION, SHAPES, PARAMETER = 0, 1, 2, 3, 4
+TEXT_HEADER = "# Dynamic Equation Grapher scene"
+
+Color = Tuple[float, float, float]
+Parameter = Tuple[str, float, float, float]  # Name, value and the slider's range
+
+
+def _color(color: Sequence[float]) -> str:
+    # Shortest digits that read back as the same float32
+    return ",".join(np.format_float_positional(np.float32(c), trim='-') for c in color)
+
+
+def save_scene(path: str, view: Tuple[float, float, float], equations: Sequence[Tuple[str, Color, bool]],
+               shapes: ShapeStore, chunk_rows: int = 65536, parameters: Sequence[Parameter] = ()):
+    """Write the view (zoom, x offset, y offset), parameters, equations and shapes to ``path``.
+
+    Paths ending in .txt get the readable text format, one item per line
+    in the grapher's input syntax; anything else gets the compact binary
+    format, with shape parameters stored as typed arrays in blocks of
+    ``chunk_rows``.
+    """
+    if path.lower().endswith(".txt"):
+        with open(path, "w") as f:
+            f.write(f"{TEXT_HEADER}\n")
+            f.write("view " + " ".join(repr(float(value)) for value in view) + "\n")
+            for name, *values in parameters:
+                f.write(f"parameter {name} " + " ".join(repr(float(value)) for value in values) + "\n")
+            for source, color, visible in equations:
+                f.write(f"equation {'visible' if visible else 'hidden'} {_color(color)} {source}\n")
+            color_text = {}  # Shapes mostly share a few palette colors
+            for kind in SHAPE_TYPES:
+                columns = shapes.columns[kind]
+                rows, colors = columns.rows(), columns.row_colors()
+                for start in range(0, len(rows), chunk_rows):
+                    lines = []
+                    for values, color in zip(rows[start:start + chunk_rows].tolist(),
+                                             colors[start:start + chunk_rows].tolist()):
+                        color = tuple(color)
+                        if color not in color_text:
+                            color_text[color] = _color(color)
+                        lines.append(f"shape {color_text[color]} shape:{kind}:{':'.join(map(repr, values))}\n")
+                    f.writelines(lines)
+        return
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", VERSION))
+        f.write(struct.pack("<B3d", VIEW, *view))
+        for name, *values in parameters:
+            encoded = name.encode("utf-8")
+            f.write(struct.pack("<B3dI", PARAMETER, *values, len(encoded)) + encoded)
+        for source, color, visible in equations:
+            encoded = source.encode("utf-8")
+            f.write(struct.pack("<B3fBI", EQUATION, *color, bool(visible), len(encoded)) + encoded)
+        for kind in SHAPE_TYPES:
+            columns = shapes.columns[kind]
+            rows, colors = columns.rows(), columns.row_colors()
+            for start in range(0, len(rows), chunk_rows):
+                block = rows[start:start + chunk_rows]
+                f.write(struct.pack("<BBI", SHAPES, SHAPE_TYPES.index(kind), len(block)))
+                f.write(np.ascontiguousarray(block, dtype="<f8").tobytes())
+                f.write(np.ascontiguousarray(colors[start:start + chunk_rows], dtype="<f4").tobytes())
+        f.write(struct.pack("<B", END))
+
+
+def read_scene(path: str, chunk_rows: int = 16384) -> Iterator[Tuple]:
+    """Stream a saved scene as items, a block of shapes at a time.
+
+    Yields ("view", (zoom, x_offset, y_offset)), ("parameter", (name, value,
+    low, high)), ("equation", (source, color, visible)) and either ("shapes", (type, parameter rows, colors))
+    from binary scenes or ("shape_inputs", (strings, colors)) from text
+    scenes, whose shapes go through the same parsing as typed ones. Text
+    scenes yield ``chunk_rows`` shapes at a time; binary ones yield the
+    blocks they were saved in.
+    """
+    with open(path, "rb") as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    if binary:
+        yield from _read_binary(path)
+    else:
+        yield from _read_text(path, chunk_rows)
+
+
+def _numbers(text: str, count: int, what: str, separator: Optional[str] = None) -> Tuple[float, ...]:
+    """Exactly ``count`` numbers from ``text``, or a ValueError naming ``what``"""
+    values = text.split(separator)
+    if len(values) != count:
+        raise ValueError(f"{what} needs {count} numbers, got {len(values)}")
+    return tuple(float(value) for value in values)
+
+
+def _check_range(name: str, low: float, high: float):
+    if not low < high:
+        raise ValueError(f"parameter {name} has an empty range {low}..{high}")
+
+
+def _read_exactly(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Scene file ends early")
+    return data
+
+
+def _read_binary(path: str) -> Iterator[Tuple]:
+    with open(path, "rb") as f:
+        header = _read_exactly(f, len(MAGIC) + 4)
+        version, = struct.unpack("<I", header[len(MAGIC):])
+        if not 1 <= version <= VERSION:
+            raise ValueError(f"Unsupported scene version: {version}")
+        while True:
+            tag, = struct.unpack("<B", _read_exactly(f, 1))
+            if tag == END:
+                return
+            if tag == VIEW:
+                yield "view", struct.unpack("<3d", _read_exactly(f, 24))
+            elif tag == PARAMETER:
+                if version == 2:
+                    value, low, high, length = struct.unpack("<3dB", _read_exactly(f, 25))
+                else:
+                    value, low, high, length = struct.unpack("<3dI", _read_exactly(f, 28))
+                name = _read_exactly(f, length).decode("utf-8")
+                _check_range(name, low, high)
+                yield "parameter", (name, value, low, high)
+            elif tag == EQUATION:
+                r, g, b, visible, length = struct.unpack("<3fBI", _read_exactly(f, 17))
+                yield "equation", (_read_exactly(f, length).decode("utf-8"), (r, g, b), bool(visible))
+            elif tag == SHAPES:
+                kind_index, count = struct.unpack("<BI", _read_exactly(f, 5))
+                if kind_index >= len(SHAPE_TYPES):
+                    raise ValueError(f"Shapes section has unknown shape type {kind_index}")
+                kind = SHAPE_TYPES[kind_index]
+                fields = len(SHAPE_FIELDS[kind])
+                values = np.frombuffer(_read_exactly(f, count * fields * 8), dtype="<f8").reshape(count, fields)
+                colors = np.frombuffer(_read_exactly(f, count * 12), dtype="<f4").reshape(count, 3)
+                yield "shapes", (kind, values, colors)
+            else:
+                raise ValueError(f"Unknown scene section: {tag}")
+
+
+def _read_text(path: str, chunk_rows: int) -> Iterator[Tuple]:
+    inputs: List[str] = []
+    colors: List[List[float]] = []
+
+    def flush():
+        block = ("shape_inputs", (inputs[:], np.array(colors, dtype=np.float32).reshape(-1, 3)))
+        inputs.clear()
+        colors.clear()
+        return block
+
+    color_values = {}
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            keyword, _, rest = line.partition(" ")
+            try:
+                if keyword == "shape":
+                    color, _, shape_input = rest.partition(" ")
+                    if color not in color_values:
+                        color_values[color] = list(_numbers(color, 3, "color", ","))
+                    colors.append(color_values[color])
+                    inputs.append(shape_input)
+                    if len(inputs) >= chunk_rows:
+                        yield flush()
+                elif keyword == "equation":
+                    parts = rest.split(" ", 2)
+                    if len(parts) != 3 or parts[0] not in ("visible", "hidden"):
+                        raise ValueError("equation needs visible or hidden, a color and the equation")
+                    visibility, color, source = parts
+                    yield "equation", (source, _numbers(color, 3, "color", ","), visibility == "visible")
+                elif keyword == "view":
+                    yield "view", _numbers(rest, 3, "view")
+                elif keyword == "parameter":
+                    name, _, values = rest.partition(" ")
+                    value, low, high = _numbers(values, 3, "parameter")
+                    _check_range(name, low, high)
+                    yield "parameter", (name, value, low, high)
+                else:
+                    raise ValueError(f"unknown scene item {keyword!r}")
+            except ValueError as e:
+                raise ValueError(f"Line {number}: {e}") from None
+    if inputs:
+        yield flush()
@@ -0,0 +1,273 @@
+import numpy as np
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+from geometry import SHAPE_FIELDS, segments_for_radius, unit_circle
+from spatial import BoxIndex
+
+# Position of each shape type in an index tag: tag = row * len(SHAPE_TYPES) + type position
+SHAPE_TYPES = tuple(SHAPE_FIELDS)
+
+
+class ShapeColumns:
+    """Every shape of one type as a structure of arrays: one float64 column per parameter, plus colors.
+
+    Storage doubles when full, so adding shapes one at a time stays cheap.
+    """
+
+    __slots__ = ('fields', 'size', 'values', 'colors')
+
+    def __init__(self, fields: Sequence[str], capacity: int = 16):
+        self.fields = tuple(fields)
+        self.size = 0
+        self.values = np.zeros((capacity, len(self.fields)))
+        self.colors = np.zeros((capacity, 3), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, values: Sequence[float], color: Tuple[float, float, float]):
+        self.extend(np.asarray(values, dtype=np.float64)[None, :], np.asarray(color)[None, :])
+
+    def extend(self, values: np.ndarray, colors: np.ndarray):
+        """Append rows of parameters, one column per field, with a color per row"""
+        end = self.size + len(values)
+        if end > len(self.values):
+            capacity = max(2 * len(self.values), end)
+            self.values = np.concatenate((self.values[:self.size], np.zeros((capacity - self.size, len(self.fields)))))
+            self.colors = np.concatenate((self.colors[:self.size], np.zeros((capacity - self.size, 3), dtype=np.float32)))
+        self.values[self.size:end] = values
+        self.colors[self.size:end] = colors
+        self.size = end
+
+    def column(self, field: str) -> np.ndarray:
+        return self.values[:self.size, self.fields.index(field)]
+
+    def rows(self) -> np.ndarray:
+        return self.values[:self.size]
+
+    def row_colors(self) -> np.ndarray:
+        return self.colors[:self.size]
+
+
+class ShapeBatch:
+    """Outlines of the visible shapes, ready to draw with one call for loops and one for lines.
+
+    Vertices are relative to ``origin`` so they keep float32 precision far
+    from zero. Closed outlines (circles, ellipses, rectangles) come first,
+    described by ``loop_firsts``/``loop_counts``; line segments follow,
+    starting at ``line_first``.
+    """
+
+    def __init__(self, vertices: np.ndarray, colors: np.ndarray, loop_firsts: np.ndarray, loop_counts: np.ndarray,
+                 line_first: int, origin: Tuple[float, float], region: Tuple[float, float, float, float],
+                 pixel_size: float, version: int, drawn: int, culled: int):
+        self.vertices = vertices  # (n, 2) float32
+        self.colors = colors      # (n, 3) float32, one per vertex
+        self.loop_firsts = loop_firsts
+        self.loop_counts = loop_counts
+        self.line_first = line_first
+        self.origin = origin
+        self.region = region          # World area the batch was built for (larger than the view)
+        self.pixel_size = pixel_size  # World units per pixel the outlines were subdivided for
+        self.version = version        # ShapeStore.version it was built from
+        self.drawn = drawn
+        self.culled = culled
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.vertices) - self.line_first
+
+
+def shape_bounds(shape_type: str, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Bounding boxes (x_min, y_min, x_max, y_max) of rows of shape parameters"""
+    if shape_type == 'circle':
+        x, y, r = values[:, 0], values[:, 1], np.abs(values[:, 2])
+        return x - r, y - r, x + r, y + r
+    if shape_type == 'ellipse':
+        x, y, rx, ry = values[:, 0], values[:, 1], np.abs(values[:, 2]), np.abs(values[:, 3])
+        return x - rx, y - ry, x + rx, y + ry
+    # Rectangles and lines are both given by two corners
+    x1, y1, x2, y2 = values.T
+    return np.minimum(x1, x2), np.minimum(y1, y2), np.maximum(x1, x2), np.maximum(y1, y2)
+
+
+def outline_distance(shape_type: str, values: np.ndarray, x: float, y: float) -> np.ndarray:
+    """Distance from a point to the outline of each row of shapes (ellipses approximately)"""
+    if shape_type in ('circle', 'ellipse'):
+        radius_x = np.abs(values[:, 2])
+        radius_y = radius_x if shape_type == 'circle' else np.abs(values[:, 3])
+        dx, dy = x - values[:, 0], y - values[:, 1]
+        distance = np.hypot(dx, dy)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scaled = np.hypot(dx / radius_x, dy / radius_y)
+            # Along the ray from the center, the outline is at distance / scaled
+            return np.where(scaled > 0, np.abs(distance - distance / scaled), np.minimum(radius_x, radius_y))
+    x1, y1, x2, y2 = values.T
+    if shape_type == 'rectangle':
+        left, right = np.minimum(x1, x2), np.maximum(x1, x2)
+        bottom, top = np.minimum(y1, y2), np.maximum(y1, y2)
+        outside = np.hypot(np.maximum(np.maximum(left - x, x - right), 0), np.maximum(np.maximum(bottom - y, y - top), 0))
+        inside = np.minimum(np.minimum(x - left, right - x), np.minimum(y - bottom, top - y))
+        return np.where(inside > 0, inside, outside)
+    dx, dy = x2 - x1, y2 - y1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.nan_to_num(((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)), 0.0, 1.0)
+    return np.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+class ShapeStore:
+    """All shapes on the graph, kept as columns per shape type rather than one object per shape.
+
+    Every shape's bounding box is also kept in a BoxIndex, tagged with its
+    type and row, so finding the shapes in the view or under the mouse
+    costs O(log n) plus the shapes found. ``batch`` turns the shapes that
+    overlap the view into a ShapeBatch. Circle and ellipse outlines are
+    built from shared unit-circle tables with a segment count that follows
+    their size on screen. A batch covers a margin around the view and is
+    reused while panning and zooming stay within it, so it is rebuilt only
+    every so often rather than on every frame.
+    """
+
+    def __init__(self, margin: float = 0.5, rebuild_zoom: float = 1.5, max_outline_vertices: int = 1_000_000):
+        self.columns: Dict[str, ShapeColumns] = {kind: ShapeColumns(fields) for kind, fields in SHAPE_FIELDS.items()}
+        self.index = BoxIndex()
+        self.margin = margin              # Extra area built around the view, as a fraction of its size
+        self.rebuild_zoom = rebuild_zoom  # Rebuild once the zoom changes by more than this factor
+        self.max_outline_vertices = max_outline_vertices  # Circles get coarser when there are many on screen
+        self.version = 0
+        self.builds = 0
+        self._batch: Optional[ShapeBatch] = None
+
+    def __len__(self) -> int:
+        return sum(len(columns) for columns in self.columns.values())
+
+    def add(self, shape_type: str, color: Tuple[float, float, float], **parameters: float) -> int:
+        """Add one shape; returns its tag"""
+        columns = self.columns[shape_type]
+        values = np.array([[parameters[field] for field in columns.fields]], dtype=np.float64)
+        return int(self.add_many(shape_type, values, np.array([color]))[0])
+
+    def add_many(self, shape_type: str, values: np.ndarray, colors: np.ndarray) -> np.ndarray:
+        """Add rows of parameters (one column per field, in SHAPE_FIELDS order) at once; returns their tags"""
+        columns = self.columns[shape_type]
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(columns.fields))
+        colors = np.broadcast_to(np.asarray(colors, dtype=np.float32), (len(values), 3))
+        rows = np.arange(len(columns), len(columns) + len(values))
+        columns.extend(values, colors)
+        tags = rows * len(SHAPE_TYPES) + SHAPE_TYPES.index(shape_type)
+        self.index.add(*shape_bounds(shape_type, values), tags)
+        self.version += 1
+        return tags
+
+    def clear(self):
+        for kind, fields in SHAPE_FIELDS.items():
+            self.columns[kind] = ShapeColumns(fields)
+        self.index.clear()
+        self.version += 1
+        self._batch = None
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, float], Tuple[float, float, float]]]:
+        """(shape type, parameters, color) for every shape, grouped by type"""
+        for kind, columns in self.columns.items():
+            for values, color in zip(columns.rows(), columns.row_colors()):
+                yield kind, dict(zip(columns.fields, values.tolist())), tuple(color.tolist())
+
+    def shape(self, tag: int) -> Tuple[str, Dict[str, float], Tuple[float, float, float]]:
+        """(shape type, parameters, color) of the shape with this tag"""
+        kind = SHAPE_TYPES[tag % len(SHAPE_TYPES)]
+        columns = self.columns[kind]
+        row = tag // len(SHAPE_TYPES)
+        return kind, dict(zip(columns.fields, columns.rows()[row].tolist())), tuple(columns.row_colors()[row].tolist())
+
+    def rows_in(self, region: Tuple[float, float, float, float]) -> Dict[str, np.ndarray]:
+        """Sorted rows, per shape type, of the shapes whose bounding box overlaps ``region``"""
+        x_min, x_max, y_min, y_max = region
+        tags = self.index.query(x_min, y_min, x_max, y_max)
+        kinds = tags % len(SHAPE_TYPES)
+        return {kind: np.sort(tags[kinds == position] // len(SHAPE_TYPES))
+                for position, kind in enumerate(SHAPE_TYPES)}
+
+    def hit_test(self, x: float, y: float, tolerance: float) -> Optional[int]:
+        """Tag of the shape whose outline passes closest to (x, y), if any is within ``tolerance``"""
+        best, best_distance = None, tolerance
+        for kind, rows in self.rows_in((x - tolerance, x + tolerance, y - tolerance, y + tolerance)).items():
+            if not len(rows):
+                continue
+            distances = outline_distance(kind, self.columns[kind].rows()[rows], x, y)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= best_distance:
+                best_distance = distances[nearest]
+                best = int(rows[nearest]) * len(SHAPE_TYPES) + SHAPE_TYPES.index(kind)
+        return best
+
+    def batch(self, bounds: Tuple[float, float, float, float], width: int) -> ShapeBatch:
+        """Outlines covering the view, reusing the previous batch while it still covers it at this zoom"""
+        x_min, x_max, y_min, y_max = bounds
+        pixel_size = (x_max - x_min) / width
+        batch = self._batch
+        if (batch is not None and batch.version == self.version
+                and batch.region[0] <= x_min and x_max <= batch.region[1]
+                and batch.region[2] <= y_min and y_max <= batch.region[3]
+                and 1 / self.rebuild_zoom <= pixel_size / batch.pixel_size <= self.rebuild_zoom):
+            return batch
+        pad_x = (x_max - x_min) * self.margin
+        pad_y = (y_max - y_min) * self.margin
+        self._batch = self.build((x_min - pad_x, x_max + pad_x, y_min - pad_y, y_max + pad_y), pixel_size)
+        return self._batch
+
+    def build(self, region: Tuple[float, float, float, float], pixel_size: float) -> ShapeBatch:
+        """Outlines of every shape whose bounding box overlaps ``region``"""
+        x_min, x_max, y_min, y_max = region
+        origin = ((x_min + x_max) / 2, (y_min + y_max) / 2)
+        offset = np.array(origin)
+        self.builds += 1
+        visible = self.rows_in(region)
+
+        # Circles are ellipses with equal radii
+        circles = self.columns['circle'].rows()[visible['circle']]
+        ellipses = self.columns['ellipse'].rows()[visible['ellipse']]
+        centers = (np.concatenate((circles[:, 0:2], ellipses[:, 0:2])) - offset).astype(np.float32)
+        radii = np.abs(np.concatenate((circles[:, [2, 2]], ellipses[:, 2:4]))).astype(np.float32)
+        colors = np.concatenate((self.columns['circle'].row_colors()[visible['circle']],
+                                 self.columns['ellipse'].row_colors()[visible['ellipse']]))
+        radius_pixels = radii.max(axis=1, initial=0.0) / pixel_size
+        segment_pixels = 4.0
+        segments = segments_for_radius(radius_pixels, segment_pixels=segment_pixels)
+        while segments.sum() > self.max_outline_vertices and segments.max(initial=0) > 8:
+            segment_pixels *= 2
+            segments = segments_for_radius(radius_pixels, segment_pixels=segment_pixels)
+
+        x1, y1, x2, y2 = self.columns['rectangle'].rows()[visible['rectangle']].T
+        corners = np.stack((np.column_stack((x1, y1)), np.column_stack((x2, y1)),
+                            np.column_stack((x2, y2)), np.column_stack((x1, y2))), axis=1) - offset
+
+        endpoints = self.columns['line'].rows()[visible['line']].reshape(-1, 2, 2) - offset
+
+        # Every outline is written straight into one vertex and one color array
+        loop_counts = np.concatenate((np.sort(segments), np.full(len(corners), 4))).astype(np.int32)
+        line_first = int(loop_counts.sum())
+        vertices = np.empty((line_first + 2 * len(endpoints), 2), dtype=np.float32)
+        vertex_colors = np.empty((len(vertices), 3), dtype=np.float32)
+
+        def fill(start: int, outlines: np.ndarray, outline_colors: np.ndarray) -> int:
+            count, size = outlines.shape[:2]
+            end = start + count * size
+            vertices[start:end].reshape(count, size, 2)[:] = outlines
+            vertex_colors[start:end].reshape(count, size, 3)[:] = outline_colors[:, None, :]
+            return end
+
+        position = 0
+        for count in np.unique(segments):
+            pick = segments == count
+            table = unit_circle(int(count)).astype(np.float32)
+            position = fill(position, centers[pick, None, :] + radii[pick, None, :] * table, colors[pick])
+        position = fill(position, corners, self.columns['rectangle'].row_colors()[visible['rectangle']])
+        fill(position, endpoints, self.columns['line'].row_colors()[visible['line']])
+
+        drawn = len(segments) + len(corners) + len(endpoints)
+        loop_firsts = (np.cumsum(loop_counts) - loop_counts).astype(np.int32)
+        return ShapeBatch(vertices, vertex_colors, loop_firsts, loop_counts, line_first, origin, region,
+                          pixel_size, self.version, drawn, len(self) - drawn)
@@ -0,0 +1,107 @@
+import numpy as np
+from typing import List
+
+
+class BoxIndex:
+    """Axis-aligned bounding boxes with integer tags, queried by rectangle in O(log n + matches).
+
+    Boxes are bulk-loaded into a packed R-tree: sorted into vertical slices
+    by center x and within each slice by center y (sort-tile-recursive), then
+    grouped ``node_size`` at a time, level by level, up to a single root.
+    A query walks the levels top-down, testing every candidate node of a
+    level in one vectorized step. Boxes added since the last build wait in
+    an unsorted tail that queries scan directly. The next query after the
+    tail grows past ``max_tail`` rebuilds the tree, so a burst of additions
+    costs one rebuild rather than one per box.
+    """
+
+    def __init__(self, node_size: int = 16, max_tail: int = 1024):
+        self.node_size = node_size
+        self.max_tail = max_tail
+        self.builds = 0
+        self.clear()
+
+    def clear(self):
+        self.boxes = np.zeros((16, 4))  # x_min, y_min, x_max, y_max
+        self.tags = np.zeros(16, dtype=np.int64)
+        self.size = 0
+        self.built = 0  # Boxes [0, built) are in the tree, the rest are the tail
+        self.order = np.zeros(0, dtype=np.int64)  # Box of every tree leaf, in leaf order
+        self.levels: List[np.ndarray] = []  # Node boxes per level, leaves first
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.boxes.nbytes + self.tags.nbytes + self.order.nbytes + sum(level.nbytes for level in self.levels)
+
+    def add(self, x_min, y_min, x_max, y_max, tags):
+        """Add one box or arrays of boxes; corners may come in either order"""
+        x_min, y_min, x_max, y_max, tags = np.broadcast_arrays(*(np.atleast_1d(value) for value in
+                                                                  (x_min, y_min, x_max, y_max, tags)))
+        count = len(tags)
+        if self.size + count > len(self.boxes):
+            capacity = max(2 * len(self.boxes), self.size + count)
+            self.boxes = np.concatenate((self.boxes[:self.size], np.zeros((capacity - self.size, 4))))
+            self.tags = np.concatenate((self.tags[:self.size], np.zeros(capacity - self.size, dtype=np.int64)))
+        end = self.size + count
+        self.boxes[self.size:end, 0] = np.minimum(x_min, x_max)
+        self.boxes[self.size:end, 1] = np.minimum(y_min, y_max)
+        self.boxes[self.size:end, 2] = np.maximum(x_min, x_max)
+        self.boxes[self.size:end, 3] = np.maximum(y_min, y_max)
+        self.tags[self.size:end] = tags
+        self.size = end
+
+    def build(self):
+        """Pack every box into the tree"""
+        self.builds += 1
+        self.built = self.size
+        if not self.size:
+            self.order = np.zeros(0, dtype=np.int64)
+            self.levels = []
+            return
+        boxes = self.boxes[:self.size]
+        leaves = -(-self.size // self.node_size)
+        slice_size = self.node_size * max(1, int(np.ceil(np.sqrt(leaves))))
+        by_x = np.argsort(boxes[:, 0] + boxes[:, 2])
+        # Slice number plus the center's height scaled into [0, 1) sorts by slice, then by y
+        center_y = boxes[by_x, 1] + boxes[by_x, 3]
+        low, span = center_y.min(), np.ptp(center_y) * (1 + 1e-9) or 1.0
+        self.order = by_x[np.argsort(np.arange(self.size) // slice_size + (center_y - low) / span)]
+
+        # float32 halves the tree's memory; corners are rounded outwards so no overlap is lost
+        leaves = boxes[self.order]
+        lower = leaves[:, :2].astype(np.float32)
+        upper = leaves[:, 2:].astype(np.float32)
+        lower = np.where(lower > leaves[:, :2], np.nextafter(lower, np.float32(-np.inf)), lower)
+        upper = np.where(upper < leaves[:, 2:], np.nextafter(upper, np.float32(np.inf)), upper)
+        self.levels = [np.column_stack((lower, upper))]
+        while len(self.levels[-1]) > self.node_size:
+            children = self.levels[-1]
+            starts = np.arange(0, len(children), self.node_size)
+            self.levels.append(np.column_stack((np.minimum.reduceat(children[:, 0], starts),
+                                                np.minimum.reduceat(children[:, 1], starts),
+                                                np.maximum.reduceat(children[:, 2], starts),
+                                                np.maximum.reduceat(children[:, 3], starts))))
+
+    def query(self, x_min: float, y_min: float, x_max: float, y_max: float) -> np.ndarray:
+        """Tags of every box overlapping the rectangle (edges touching count)"""
+        if self.size - self.built > self.max_tail:
+            self.build()
+
+        def overlapping(boxes: np.ndarray) -> np.ndarray:
+            return ((boxes[:, 2] >= x_min) & (boxes[:, 0] <= x_max) &
+                    (boxes[:, 3] >= y_min) & (boxes[:, 1] <= y_max))
+
+        found = []
+        if self.levels:
+            candidates = np.flatnonzero(overlapping(self.levels[-1]))
+            for level in reversed(self.levels[:-1]):
+                children = (candidates[:, None] * self.node_size + np.arange(self.node_size)).ravel()
+                children = children[children < len(level)]
+                candidates = children[overlapping(level[children])]
+            found.append(self.tags[self.order[candidates]])
+        tail = np.flatnonzero(overlapping(self.boxes[self.built:self.size])) + self.built
+        found.append(self.tags[tail])
+        return np.concatenate(found)
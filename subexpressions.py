@@ -0,0 +1,304 @@
+import ast
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from expression import CONSTANTS, FUNCTIONS, CompiledExpression, ExpressionError, _implicit_products
+
+# Operators by node kind. Sums and products take any number of operands, sorted, so that
+# x*sin(x) and sin(x)*x are the same node
+_OPERATORS = {
+    'add': np.add, 'mul': np.multiply, 'sub': np.subtract, 'div': np.true_divide, 'pow': np.power,
+    'mod': np.mod, 'floordiv': np.floor_divide, 'neg': np.negative,
+    'lt': np.less, 'le': np.less_equal, 'gt': np.greater, 'ge': np.greater_equal, 'eq': np.equal, 'ne': np.not_equal,
+    'and': np.logical_and, 'where': np.where,
+}
+_COMMUTATIVE = ('add', 'mul', 'and')
+_BINARY = {ast.Add: 'add', ast.Mult: 'mul', ast.Sub: 'sub', ast.Div: 'div', ast.Pow: 'pow', ast.Mod: 'mod',
+           ast.FloorDiv: 'floordiv'}
+_COMPARE = {ast.Lt: 'lt', ast.LtE: 'le', ast.Gt: 'gt', ast.GtE: 'ge', ast.Eq: 'eq', ast.NotEq: 'ne'}
+
+# Node, function, operand nodes, operations per evaluation, operations in the equation's own tree
+Step = Tuple[int, Callable, Tuple[int, ...], int, int]
+
+
+def _function(kind: str, count: int) -> Callable:
+    """The NumPy function computing a node of ``kind`` from ``count`` operands"""
+    if kind in _COMMUTATIVE and count > 2:
+        ufunc = _OPERATORS[kind]
+
+        def chain(*operands):
+            result = operands[0]
+            for operand in operands[1:]:
+                result = ufunc(result, operand)
+            return result
+        return chain
+    if kind in _OPERATORS:
+        return _OPERATORS[kind]
+    return FUNCTIONS[kind][0]
+
+
+class SharedExpression:
+    """An equation evaluated through an ExpressionGraph, called like the CompiledExpression it wraps.
+
+    Holds its own evaluation plan, the graph nodes it needs in dependency
+    order, so a worker can keep evaluating while the UI thread adds or
+    releases other equations. Once released it falls back to the compiled
+    function. Pickles as the compiled expression, so worker processes
+    recompile it and evaluate on their own.
+    """
+
+    def __init__(self, graph: 'ExpressionGraph', compiled: CompiledExpression, tree: ast.AST):
+        self.graph = graph
+        self.compiled = compiled
+        self.source = compiled.source
+        self.variable = compiled.variable
+        self.variables = compiled.variables
+        self.tree = tree
+        self.plan: List[Step] = []
+        self.leaves: List[Tuple[int, int, object]] = []  # Variables (node, argument, None) and constants (node, -1, value)
+        self.operations = 0  # Operations in one evaluation of the unshared tree
+        self.root = -1
+        self.active = False
+
+    @property
+    def implicit(self) -> bool:
+        return self.compiled.implicit
+
+    def __call__(self, *args):
+        if not self.active:
+            return self.compiled(*args)
+        return self.graph.evaluate(self, args)
+
+    def __reduce__(self):
+        return self.compiled.__reduce__()
+
+    def __repr__(self):
+        return f"SharedExpression({self.source!r})"
+
+
+class ExpressionGraph:
+    """One DAG of the subexpressions of every visible equation, each distinct node evaluated once per batch.
+
+    Equations are parsed into nodes that are interned by kind and operands,
+    so equal subtrees anywhere become one node: sums and products are
+    flattened and their operands sorted, pow(a, b) is a ** b, unary plus
+    disappears and constant subtrees are folded. Every node counts the
+    equations using it and is freed when the last one is released.
+
+    A batch is one set of read-only argument arrays. Node values are kept
+    for the last ``batches`` batches, keyed by the arrays' identity, so
+    equations sampled on the same shared grid (see ``sampling.initial_grid``)
+    reuse each other's subexpressions. Writable arrays could change between
+    calls, so those go straight to the compiled function. ``requested``
+    counts the element operations the equations would have made on their
+    own and ``evaluated`` those actually made.
+    """
+
+    def __init__(self, batches: int = 32):
+        self.max_batches = batches
+        self.nodes: Dict[tuple, int] = {}    # Key (kind, operands) to node
+        self.keys: Dict[int, tuple] = {}
+        self.constants: Dict[int, np.float64] = {}
+        self.references: Counter = Counter()  # Equations using each node
+        self.created: List[int] = []  # Nodes made while interning the latest equation
+        self.next_node = 0  # Freed numbers are never reused, so stale batch values cannot be mistaken
+        self.batches: 'OrderedDict[tuple, Tuple[tuple, Dict[int, object]]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.requested = 0
+        self.evaluated = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def saved(self) -> float:
+        """Fraction of element evaluations skipped by sharing"""
+        return 1 - self.evaluated / self.requested if self.requested else 0.0
+
+    def stats(self) -> Dict[str, int]:
+        return {'nodes': len(self.keys), 'batches': len(self.batches),
+                'requested': self.requested, 'evaluated': self.evaluated}
+
+    def add(self, compiled: CompiledExpression) -> SharedExpression:
+        """Share a compiled expression's subexpressions with the other equations in the graph"""
+        tree = ast.parse(_implicit_products(compiled.source.strip()), mode='eval').body
+        shared = SharedExpression(self, compiled, tree)
+        self.retain(shared)
+        return shared
+
+    def retain(self, shared: SharedExpression):
+        """Intern an equation's nodes again, for one that is shown after being hidden"""
+        if shared.active:
+            return
+        uses: Counter = Counter()
+        self.created = []
+        shared.root = self._intern(shared.tree, shared.variables, uses)
+        plan, leaves, seen = [], [], set()
+
+        def visit(node: int):
+            if node in seen:
+                return
+            seen.add(node)
+            kind, operands = self.keys[node]
+            if kind == 'var':
+                leaves.append((node, operands[0], None))
+            elif kind == 'const':
+                leaves.append((node, -1, self.constants[node]))
+            else:
+                for operand in operands:
+                    visit(operand)
+                # A sum or product of n operands is n - 1 operations, however often it occurs
+                cost = len(operands) - 1 if kind in _COMMUTATIVE else 1
+                plan.append((node, _function(kind, len(operands)), operands, cost, uses[node] * cost))
+
+        visit(shared.root)
+        for node in seen:
+            self.references[node] += 1
+        # Constants that were only operands of a folded subtree are not part of any plan
+        for node in self.created:
+            if node not in seen:
+                del self.nodes[self.keys.pop(node)]
+                self.constants.pop(node, None)
+        shared.plan, shared.leaves = plan, leaves
+        shared.operations = sum(step[4] for step in plan)
+        shared.active = True
+
+    def release(self, shared: SharedExpression):
+        """Stop sharing an equation, freeing the nodes no other equation uses"""
+        if not shared.active:
+            return
+        shared.active = False
+        freed = []
+        for node in [step[0] for step in shared.plan] + [leaf[0] for leaf in shared.leaves]:
+            self.references[node] -= 1
+            if self.references[node] <= 0:
+                del self.references[node]
+                del self.nodes[self.keys.pop(node)]
+                self.constants.pop(node, None)
+                freed.append(node)
+        with self.lock:
+            for _, values in self.batches.values():
+                for node in freed:
+                    values.pop(node, None)
+        shared.plan, shared.leaves = [], []
+
+    def _node(self, kind: str, operands: tuple) -> int:
+        if kind in _COMMUTATIVE:
+            operands = tuple(sorted(operands))
+        if kind not in ('var', 'const') and all(operand in self.constants for operand in operands):
+            with np.errstate(all='ignore'):
+                value = _function(kind, len(operands))(*(self.constants[operand] for operand in operands))
+            return self._constant(value)
+        key = (kind, operands)
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = self.next_node
+            self.keys[node] = key
+            self.created.append(node)
+            self.next_node += 1
+        return node
+
+    def _constant(self, value) -> int:
+        value = np.float64(value)
+        # Keyed by the exact bits, so 0.0 and -0.0 stay apart
+        node = self._node('const', (value.tobytes(),))
+        self.constants[node] = value
+        return node
+
+    def _intern(self, tree: ast.AST, variables: Tuple[str, ...], uses: Counter) -> int:
+        """Node for a syntax tree already checked by compile_expression; counts how often each node occurs in it"""
+        def operands_of(kind: str, node: ast.AST) -> List[int]:
+            # Nested sums or products flatten into one, so (a + b) + c matches a + (b + c)
+            if isinstance(node, ast.BinOp) and _BINARY[type(node.op)] == kind:
+                return operands_of(kind, node.left) + operands_of(kind, node.right)
+            return [self._intern(node, variables, uses)]
+
+        if isinstance(tree, ast.Constant):
+            return self._constant(tree.value)
+        if isinstance(tree, ast.Name):
+            if tree.id in variables:
+                return self._node('var', (variables.index(tree.id),))
+            return self._constant(CONSTANTS[tree.id])
+        if isinstance(tree, ast.UnaryOp):
+            operand = self._intern(tree.operand, variables, uses)
+            if isinstance(tree.op, ast.UAdd):
+                return operand
+            kind, operands = 'neg', [operand]
+        elif isinstance(tree, ast.BinOp):
+            kind = _BINARY[type(tree.op)]
+            if kind in _COMMUTATIVE:
+                operands = operands_of(kind, tree.left) + operands_of(kind, tree.right)
+            else:
+                operands = [self._intern(tree.left, variables, uses), self._intern(tree.right, variables, uses)]
+        elif isinstance(tree, ast.Compare):
+            sides = [self._intern(side, variables, uses) for side in [tree.left] + tree.comparators]
+            pairs = [self._count(self._node(_COMPARE[type(op)], (left, right)), uses)
+                     for left, op, right in zip(sides, tree.ops, sides[1:])]
+            if len(pairs) == 1:
+                return pairs[0]
+            kind, operands = 'and', pairs
+        elif isinstance(tree, ast.IfExp):
+            kind = 'where'
+            operands = [self._intern(part, variables, uses) for part in (tree.test, tree.body, tree.orelse)]
+        elif isinstance(tree, ast.Call):
+            kind = 'pow' if tree.func.id == 'pow' else tree.func.id
+            operands = [self._intern(arg, variables, uses) for arg in tree.args]
+        else:
+            raise ExpressionError(f"Unsupported syntax: {type(tree).__name__}")
+        node = self._node(kind, tuple(operands))
+        return self._count(node, uses)
+
+    def _count(self, node: int, uses: Counter) -> int:
+        if node not in self.constants:
+            uses[node] += 1
+        return node
+
+    def evaluate(self, shared: SharedExpression, args: tuple):
+        """Value of an equation's root over the argument arrays, reusing node values from the same batch"""
+        args = tuple(np.asarray(arg, dtype=np.float64) for arg in args)
+        if not args or any(arg.flags.writeable for arg in args):
+            # Nothing to share with: one call to the compiled function beats walking the plan
+            size = int(np.prod(np.broadcast_shapes(*(arg.shape for arg in args))))
+            with self.lock:
+                self.requested += shared.operations * size
+                self.evaluated += shared.operations * size
+            return shared.compiled(*args)
+
+        key = (shared.variables, tuple(id(arg) for arg in args))
+        with self.lock:
+            batch = self.batches.get(key)
+            # Identity is only meaningful while the arrays are alive; the batch holds on to them
+            if batch is not None and all(kept is arg for kept, arg in zip(batch[0], args)):
+                self.batches.move_to_end(key)
+                values = batch[1]
+            else:
+                values = {}
+                self.batches[key] = (args, values)
+                while len(self.batches) > self.max_batches:
+                    self.batches.popitem(last=False)
+
+        for node, argument, value in shared.leaves:
+            values[node] = args[argument] if argument >= 0 else value
+        requested = evaluated = 0
+        with np.errstate(all='ignore'):
+            for node, function, operands, cost, operations in shared.plan:
+                value = values.get(node)
+                if value is None:
+                    value = values[node] = function(*[values[operand] for operand in operands])
+                    evaluated += cost * value.size
+                requested += operations * value.size
+            root = values[shared.root]
+            shape = args[0].shape if len(args) == 1 else np.broadcast_shapes(*(arg.shape for arg in args))
+            if np.shape(root) == shape:
+                result = np.array(root, dtype=np.float64)  # A copy: the batch keeps the node's value
+            else:
+                result = np.array(np.broadcast_to(root, shape), dtype=np.float64)
+        with self.lock:
+            self.requested += requested
+            self.evaluated += evaluated
+        result[~np.isfinite(result)] = np.nan
+        if result.ndim == 0:
+            return float(result)
+        return result
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from analysis import INTERSECTION, MAXIMUM, MINIMUM, ROOT, Features
+from core import Grapher
+
+
+def analyze(*equations: str) -> Features:
+    grapher = Grapher()
+    for equation in equations:
+        assert grapher.add_equation(equation, report=False)
+    return grapher.analyze()
+
+
+def of_kind(features: Features, kind: int) -> np.ndarray:
+    return np.sort(features.xs[features.kinds == kind])
+
+
+def test_roots_of_sine():
+    features = analyze("sin(x)")
+    # The default view spans x in [-13.3, 13.3]
+    expected = np.pi * np.arange(-4, 5)
+    assert np.allclose(of_kind(features, ROOT), expected, atol=1e-9)
+    maxima = features.kinds == MAXIMUM
+    assert np.allclose(np.sort(features.xs[maxima]), np.pi / 2 + 2 * np.pi * np.arange(-2, 2), atol=1e-6)
+    assert np.allclose(features.ys[maxima], 1.0)
+
+
+def test_extrema_of_cubic():
+    features = analyze("x^3 - 3*x")
+    assert np.allclose(of_kind(features, MAXIMUM), [-1.0], atol=1e-6)
+    assert np.allclose(of_kind(features, MINIMUM), [1.0], atol=1e-6)
+    assert np.allclose(features.ys[features.kinds == MAXIMUM], [2.0])
+    assert np.allclose(features.ys[features.kinds == MINIMUM], [-2.0])
+    assert np.allclose(of_kind(features, ROOT), [-np.sqrt(3), 0.0, np.sqrt(3)], atol=1e-9)
+
+
+def test_intersections_of_parabola_and_line():
+    features = analyze("x^2", "x + 2")
+    crossing = features.kinds == INTERSECTION
+    order = np.argsort(features.xs[crossing])
+    assert np.allclose(features.xs[crossing][order], [-1.0, 2.0], atol=1e-9)
+    assert np.allclose(features.ys[crossing][order], [1.0, 4.0], atol=1e-8)
+    assert set(zip(features.first[crossing], features.second[crossing])) == {(0, 1)}
+
+
+@pytest.mark.parametrize("source, poles", [("tan(x)", np.pi / 2 + np.pi * np.arange(-5, 4)),
+                                           ("1/x", np.array([0.0]))])
+def test_poles_are_not_roots_or_extrema(source, poles):
+    features = analyze(source)
+    assert not (np.abs(features.xs[:, None] - poles) < 1e-3).any()
+    # Only the real roots are left
+    expected = np.pi * np.arange(-4, 5) if source == "tan(x)" else []
+    assert np.allclose(np.sort(features.xs), expected, atol=1e-9)
+    assert (features.kinds == ROOT).all()
+
+
+def test_pan_reuses_tile_results():
+    grapher = Grapher()
+    grapher.add_equation("sin(x)", report=False)
+    grapher.add_equation("x/4", report=False)
+    before = grapher.analyze()
+    misses = grapher.analysis.stats()['misses']
+    level = grapher.sample_cache.level_for(grapher.view.units_per_pixel)
+    grapher.view.x_offset += grapher.sample_cache.tile_width(level)
+    after = grapher.analyze()
+    stats = grapher.analysis.stats()
+    # For each of the two curves the tile coming into view and its seam, and the crossings over that tile
+    assert stats['misses'] - misses == 2 * 2 + 1
+    # Everything else is reused: all but the tile that left the view, its seam and its crossings
+    assert stats['hits'] == misses - (2 * 2 + 1)
+    # Points in both views come out the same
+    x_min, x_max, _, _ = grapher.visible_bounds()
+    shared = (before.xs > x_min) & (before.xs < x_max - grapher.sample_cache.tile_width(level))
+    found = {(kind, round(x, 9)) for kind, x in zip(after.kinds.tolist(), after.xs.tolist())}
+    assert {(kind, round(x, 9)) for kind, x in zip(before.kinds[shared].tolist(), before.xs[shared].tolist())} <= found
+
+
+@pytest.mark.parametrize("edge_tiles", [0, 1])
+def test_points_on_tile_seams_found_once(edge_tiles):
+    grapher = Grapher()
+    level = grapher.sample_cache.level_for(grapher.view.units_per_pixel)
+    edge = edge_tiles * grapher.sample_cache.tile_width(level)
+    # A root and a maximum exactly on a tile edge, and two lines crossing each other and it there
+    grapher.add_equation(f"-(x - {edge})^2", report=False)
+    grapher.add_equation(f"x - {edge}", report=False)
+    grapher.add_equation(f"{edge} - x", report=False)
+    features = grapher.analyze()
+    near = np.abs(features.xs - edge) < 1e-6
+    kinds = features.kinds[near]
+    assert (kinds == MAXIMUM).sum() == 1
+    # Each curve's root, and the three crossings of the three pairs
+    assert (kinds == ROOT).sum() == 3
+    assert (kinds == INTERSECTION).sum() == 3
+    # Away from the edge, the parabola only meets the two lines one unit either side
+    assert np.allclose(np.sort(features.xs[~near]), [edge - 1, edge + 1], atol=1e-9)
@@ -0,0 +1,101 @@
+import numpy as np
+
+from cache import SampleCache, TileKey
+from core import Grapher
+from expression import compile_expression
+
+WIDTH = 800
+
+
+def view(zoom: float, x_offset: float = 0.0):
+    aspect_ratio = 4 / 3
+    return -zoom * aspect_ratio + x_offset, zoom * aspect_ratio + x_offset, -zoom, zoom
+
+
+def test_hits_and_misses():
+    cache = SampleCache()
+    func = compile_expression("sin(x)")
+    first = cache.curve(func, *view(10.0), WIDTH)
+    tiles = len(first.wanted)
+    assert cache.stats()['misses'] == tiles and cache.stats()['hits'] == 0
+    again = cache.curve(func, *view(10.0), WIDTH)
+    assert again.keys == first.keys
+    assert cache.stats()['hits'] == tiles and cache.stats()['misses'] == tiles
+    # A small pan only samples the tile coming into view
+    cache.curve(func, *view(10.0, x_offset=cache.tile_width(first.level)), WIDTH)
+    stats = cache.stats()
+    assert stats['misses'] == tiles + 1 and stats['hits'] == tiles + tiles - 1
+    assert stats['tiles'] == tiles + 1 and stats['evaluations'] > 0
+
+
+def test_lru_eviction_under_max_bytes():
+    cache = SampleCache()
+    func = compile_expression("sin(x)")
+    cache.curve(func, *view(10.0), WIDTH)
+    tile_size = max(cache.tile_bytes.values())
+    cache = SampleCache(max_bytes=2 * tile_size)
+    curve = cache.curve(func, *view(10.0), WIDTH)
+    first, last = curve.wanted[0], curve.wanted[-1]
+    assert len(curve.wanted) > 2
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.stats()['evictions'] == len(curve.wanted) - len(cache.tiles)
+    assert first not in cache.tiles and last in cache.tiles
+    assert cache.total_bytes == sum(cache.tile_bytes.values())
+    # Looking a tile up makes it the most recent, so the next one stored evicts another
+    kept = next(iter(cache.tiles))
+    assert cache.lookup(kept) is not None
+    cache.store(TileKey(func, curve.level, 0, 1000), [np.zeros((2, 2))])
+    assert kept in cache.tiles
+
+
+def test_invalidate_drops_only_that_equation():
+    cache = SampleCache()
+    kept, dropped = compile_expression("sin(x)"), compile_expression("cos(x)")
+    cache.curve(kept, *view(10.0), WIDTH)
+    cache.curve(dropped, *view(10.0), WIDTH)
+    cache.invalidate(dropped)
+    assert cache.tiles and all(key.equation is kept for key in cache.tiles)
+    assert cache.total_bytes == sum(cache.tile_bytes.values())
+
+
+def test_rebound_equation_discards_old_tiles():
+    grapher = Grapher()
+    grapher.define_parameter("a = 2", report=False)
+    assert grapher.add_equation("y = a*sin(x)", report=False)
+    old = grapher.equations[0][0]
+    grapher.sample_equation(old)
+    assert any(key.equation is old for key in grapher.sample_cache.tiles)
+    grapher.set_parameter("a", 3.0)
+    new = grapher.equations[0][0]
+    assert new is not old and new.parameters == {'a': 3.0}
+    assert not any(key.equation is old for key in grapher.sample_cache.tiles)
+    curve = grapher.sample_equation(new)
+    assert np.nanmax(np.abs(np.concatenate(curve.strips)[:, 1])) > 2.9
+
+
+def test_fallback_to_nearest_cached_level_while_finer_tiles_are_pending():
+    cache = SampleCache()
+    func = compile_expression("x**2 / 10")
+    coarse = cache.curve(func, *view(10.0), WIDTH)
+    # Zoomed in twice as far with no budget for new tiles: drawn from the level already cached
+    fine = cache.curve(func, *view(5.0), WIDTH, max_new_tiles=0)
+    assert fine.level == coarse.level - 1
+    assert fine.pending == len(fine.wanted)
+    assert all(key.level == coarse.level for key in fine.keys)
+    assert cache.stats()['fallbacks'] == len(fine.wanted)
+    assert fine.strips and np.concatenate(fine.strips)[:, 0].min() <= view(5.0)[0]
+    # With a budget the finer tiles are sampled and replace the stand-ins
+    while fine.pending:
+        fine = cache.curve(func, *view(5.0), WIDTH, max_new_tiles=2)
+    assert all(key.level == fine.level for key in fine.keys)
+
+
+def test_clear():
+    grapher = Grapher()
+    grapher.add_equation("sin(x)", report=False)
+    grapher.sample_equation(grapher.equations[0][0])
+    assert grapher.sample_cache.tiles
+    # Ctrl+Delete
+    grapher.clear_scene()
+    assert not grapher.sample_cache.tiles and not grapher.sample_cache.tile_bytes
+    assert grapher.sample_cache.total_bytes == 0
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+import dataset
+from dataset import open_series, parse_data_source
+
+WIDTH = 800
+
+
+@pytest.fixture
+def walk(tmp_path):
+    """A random walk of 200k samples plotted against their index"""
+    path = tmp_path / "walk.npy"
+    rng = np.random.default_rng(3)
+    np.save(path, np.cumsum(rng.normal(size=200_000)))
+    return str(path)
+
+
+def test_m4_view_keeps_each_columns_first_last_min_and_max(walk):
+    series = parse_data_source(f"data:{walk}")
+    y = np.load(walk)
+    x_min, x_max = 1234.5, 190_000.0
+    view = series.view(x_min, x_max, WIDTH)
+    assert view.level > 0 and view.rows_read < len(y) / 8
+    points = np.concatenate(view.strips)
+    assert len(points) <= 4 * WIDTH + 8
+    # Every point drawn is a real sample
+    assert np.array_equal(points[:, 1], y[points[:, 0].astype(np.int64)])
+
+    assert (np.diff(points[:, 0]) >= 0).all()
+
+    # Rows merge into the column they start in, so a bucket may spill up to one column over
+    span = (x_max - x_min) / WIDTH
+    drawn_columns = np.floor((points[:, 0] - x_min) / span).astype(np.int64)
+    xs = np.arange(view.start, view.stop)
+    raw_columns = np.floor((xs - x_min) / span).astype(np.int64)
+    for column in range(1, WIDTH - 1):
+        raw_x = xs[raw_columns == column]
+        raw = y[raw_x]
+        near = points[np.abs(drawn_columns - column) <= 1]
+        drawn = points[drawn_columns == column, 1]
+        raw_near = y[xs[np.abs(raw_columns - column) <= 1]]
+        # The column's lowest and highest samples are drawn, or beaten by one at most a column away
+        assert near[:, 1].min() <= raw.min() and near[:, 1].max() >= raw.max()
+        assert raw_near.min() <= drawn.min() and drawn.max() <= raw_near.max()
+        # The line enters and leaves within a column of where the raw samples do
+        assert np.abs(near[:, 0] - raw_x[0]).min() <= span
+        assert np.abs(near[:, 0] - raw_x[-1]).min() <= span
+
+
+def test_level_follows_samples_per_pixel(walk):
+    series = parse_data_source(f"data:{walk}")
+    # Coarsest level with at least two rows per pixel column: 8 ** level * 2 <= samples per pixel
+    assert series.view(0, 1000, WIDTH).level == 0       # About 1 per pixel: raw samples
+    assert series.view(0, 20_000, WIDTH).level == 1     # 25 per pixel
+    assert series.view(0, 200_000, WIDTH).level == 2    # 250 per pixel
+    raw = series.view(0, 1000, WIDTH)
+    assert raw.rows_read == raw.stop - raw.start
+
+
+def test_existing_pyramid_is_reused(walk, monkeypatch):
+    parse_data_source(f"data:{walk}")
+    assert os.path.exists(walk + ".m4.npy")
+
+    def fail(*args):
+        raise AssertionError("pyramid rebuilt")
+
+    monkeypatch.setattr(dataset, "build_pyramid", fail)
+    series = parse_data_source(f"data:{walk}")
+    assert series.view(0, 200_000, WIDTH).level == 2
+
+
+def test_stale_pyramid_is_rebuilt(walk):
+    first = parse_data_source(f"data:{walk}")
+    assert first.view(0, 200_000, WIDTH).strips
+    pyramid_time = os.path.getmtime(walk + ".m4.npy")
+    np.save(walk, np.full(200_000, 7.0))
+    os.utime(walk, (pyramid_time + 10, pyramid_time + 10))
+    series = open_series(walk)
+    series.open_pyramid()
+    assert os.path.getmtime(walk + ".m4.npy") > pyramid_time
+    points = np.concatenate(series.view(0, 200_000, WIDTH).strips)
+    assert (points[:, 1] == 7.0).all()
@@ -0,0 +1,53 @@
+import struct
+import xml.etree.ElementTree as ElementTree
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+from export import PlotJob, SvgDocument, export_job
+
+
+def test_svg_text_is_escaped():
+    document = SvgDocument(100, 50)
+    document.text("x < 1 & y > 2", 10, 20, (0, 0, 0))
+    root = ElementTree.fromstring(document.svg())
+    texts = [element.text for element in root.iter("{http://www.w3.org/2000/svg}text")]
+    assert texts == ["x < 1 & y > 2"]
+
+
+def read_png(path) -> Tuple[int, int, np.ndarray]:
+    """Width, height and RGB pixels of a PNG written by Canvas.png (8-bit RGB, no filtering)"""
+    data = open(path, "rb").read()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, offset = {}, 8
+    while offset < len(data):
+        length, = struct.unpack(">I", data[offset:offset + 4])
+        tag = data[offset + 4:offset + 8]
+        chunks[tag] = chunks.get(tag, b"") + data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+    width, height, depth, color_type = struct.unpack(">IIBB", chunks[b"IHDR"][:10])
+    assert (depth, color_type) == (8, 2)
+    rows = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(height, 1 + width * 3)
+    assert not rows[:, 0].any()
+    return width, height, rows[:, 1:].reshape(height, width, 3)
+
+
+def test_png_export(tmp_path):
+    bounds = (-8.0, 8.0, -4.5, 4.5)
+    empty, plotted = tmp_path / "empty.png", tmp_path / "plotted.png"
+    export_job(PlotJob([], bounds=bounds, size=(320, 180), outputs=[str(empty)]))
+    export_job(PlotJob(["y = 0.5*x + 0.3"], bounds=bounds, size=(320, 180), outputs=[str(plotted)]))
+    width, height, background = read_png(empty)
+    assert (width, height) == (320, 180)
+    width, height, pixels = read_png(plotted)
+    assert (width, height) == (320, 180)
+
+    changed = np.argwhere((pixels != background).any(axis=2))
+    assert len(changed) >= width
+    assert (pixels[changed[:, 0], changed[:, 1]] != 255).any(axis=1).all()
+    # Every changed pixel is on the line, give or take its width
+    xs = bounds[0] + (changed[:, 1] + 0.5) * (bounds[1] - bounds[0]) / width
+    ys = bounds[3] - (changed[:, 0] + 0.5) * (bounds[3] - bounds[2]) / height
+    pixel = (bounds[1] - bounds[0]) / width
+    assert np.all(np.abs(ys - (0.5 * xs + 0.3)) < 3 * pixel)
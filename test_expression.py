@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+import pytest
+
+from core import Grapher
+from expression import ExpressionError, compile_expression, parse_equation_source
+from parameters import parse_parameter
+
+
+# The names equations could use before they were compiled, evaluated one point at a time with eval()
+SAFE_DICT = {'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'exp': math.exp, 'sqrt': math.sqrt,
+             'pi': math.pi, 'e': math.e, 'abs': abs, 'pow': pow}
+
+
+def evaluate_per_point(source: str, xs: np.ndarray) -> np.ndarray:
+    """The old eval path: None for points that raised, which the compiled evaluators make NaN"""
+    def value(x):
+        try:
+            return float(eval(source, {"__builtins__": {}}, dict(SAFE_DICT, x=x)))
+        except Exception:
+            return math.nan
+    return np.array([value(x) for x in xs.tolist()])
+
+
+@pytest.mark.parametrize("typed, old", [
+    ("sin(x) + cos(2*x) - tan(x/3)", None), ("exp(-x/4)", None), ("sqrt(abs(x))", None),
+    ("pow(x, 3) - pow(2, x)", None), ("abs(x) * pi + e", None), ("x^2 - 2^x", "x**2 - 2**x"),
+    ("2x + 1", "2*x + 1"), ("2pi*x", "2*pi*x"), ("3(x + 1)", "3*(x + 1)"), ("1/(x - 1)", None),
+])
+def test_compiled_matches_old_eval(typed, old):
+    xs = np.linspace(-7, 7, 1001)
+    expected = evaluate_per_point(old or typed, xs)
+    assert np.allclose(parse_equation_source(typed)(xs), expected, rtol=1e-12, atol=1e-12, equal_nan=True)
+
+
+def test_undefined_points_are_nan():
+    func = compile_expression("sqrt(x) + 1/(x - 2)")
+    values = func(np.array([-1.0, 0.0, 2.0, 4.0]))
+    assert np.isnan(values[0]) and values[1] == -0.5 and np.isnan(values[2])
+    assert values[3] == pytest.approx(2.5)
+    assert math.isnan(compile_expression("1/x")(0.0))
+    assert np.isnan(compile_expression("exp(x)")(1e6))
+
+
+@pytest.mark.parametrize("source", ["x.real", "x[0]", "(lambda: 1)()", "[x for x in (1, 2)]", "{x: 1}",
+                                    "__import__('os')", "x.__class__", "__builtins__", "open('f')", "z + x",
+                                    "log(x)", "sin(x, 2)", "'a'", "x if True else 1"])
+def test_unsupported_syntax_is_rejected(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+
+@pytest.mark.parametrize("source, parameters", [("y0*x", {"y0": 1.0}), ("gamma*x", {"gamma": 2.0}),
+                                                ("y = gamma*sin(x)", {"gamma": 2.0}), ("2x + 1 = y", None)])
+def test_names_containing_y_are_not_implicit(source, parameters):
+    assert not parse_equation_source(source, parameters).implicit
+
+
+@pytest.mark.parametrize("source", ["x^2 + y^2 = 25", "x*y", "y = x + y"])
+def test_equations_reading_y_are_implicit(source):
+    assert parse_equation_source(source).implicit
+
+
+def test_equation_without_x_is_rejected():
+    with pytest.raises(ExpressionError):
+        parse_equation_source("gamma", {"gamma": 1.0})
+
+
+@pytest.mark.parametrize("name", ["_k2", "_f_sin", "_where", "__builtins__"])
+def test_parameters_cannot_shadow_compiler_internals(name):
+    with pytest.raises(ExpressionError):
+        parse_parameter(f"{name} = 5")
+    with pytest.raises(ExpressionError):
+        parse_equation_source(f"y = sin(x) + {name}", {name: 5.0})
+
+
+def test_grapher_rejects_underscore_parameters():
+    grapher = Grapher()
+    assert grapher.define_parameter("_k2 = 5", report=False) is False
+    assert not grapher.add_equation("y = _k2 + 0*x", report=False)
+    assert not grapher.add_equation("y = sin(x) + _f_sin", report=False)
+    assert grapher.equations == []
+    with pytest.raises(ExpressionError):
+        grapher.add_parameter("_f_sin", 5.0)
+
+
+def test_conditionals_still_compile():
+    func = parse_equation_source("x if x > 0 else -x")
+    assert func(-2.0) == 2.0
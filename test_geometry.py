@@ -0,0 +1,54 @@
+import numpy as np
+
+from geometry import grid_lines, grid_ticks, line_segments, pack_strips, view_bounds
+from sampling import split_strips
+
+
+def test_pack_strips_layout():
+    strips = [np.array([[100.0, 50.0], [101.0, 51.0], [102.0, 53.0]]),
+              np.array([[5.0, 5.0]]),  # A single point draws nothing and is left out
+              np.array([[103.0, 49.0], [104.0, 48.0]])]
+    batch = pack_strips(strips)
+    assert len(batch) == 2
+    assert batch.firsts.tolist() == [0, 3]
+    assert batch.counts.tolist() == [3, 2]
+    assert batch.vertex_count == 5
+    assert batch.vertices.dtype == np.float32
+    # Relative to the first point, so large coordinates keep float32 precision
+    assert batch.origin == (100.0, 50.0)
+    assert batch.vertices[0].tolist() == [0.0, 0.0]
+    assert np.allclose(batch.vertices + batch.origin, np.concatenate((strips[0], strips[2])))
+
+
+def test_pack_strips_given_origin_and_empty():
+    batch = pack_strips([np.array([[1.0, 2.0], [3.0, 4.0]])], origin=(1.0, 1.0))
+    assert batch.vertices.tolist() == [[0.0, 1.0], [2.0, 3.0]]
+    empty = pack_strips([])
+    assert len(empty) == 0 and empty.vertex_count == 0
+
+
+def test_split_on_non_finite_samples():
+    xs = np.arange(9.0)
+    ys = np.array([0.0, 1.0, np.nan, 3.0, 4.0, np.inf, 6.0, -np.inf, 8.0])
+    strips = split_strips(xs, ys)
+    assert [strip[:, 0].tolist() for strip in strips] == [[0.0, 1.0], [3.0, 4.0]]
+    assert all(np.isfinite(strip).all() for strip in strips)
+    assert len(pack_strips(strips)) == 2
+
+
+def test_line_segments_broadcast_scalars():
+    vertices = line_segments(np.array([0.0, 1.0]), 0.0, np.array([0.0, 1.0]), 5.0)
+    assert vertices.tolist() == [[0, 0], [0, 5], [1, 0], [1, 5]]
+
+
+def test_grid_lines_at_known_view():
+    bounds = view_bounds(10.0, 0.0, 0.0, 800, 600)
+    assert np.allclose(bounds, (-40 / 3, 40 / 3, -10, 10))
+    ticks = grid_ticks(10.0, bounds)
+    assert ticks.spacing == 1
+    # -13..14 across and -10..11 up, one line per unit
+    assert len(ticks.xs) == 28 and len(ticks.ys) == 22
+    vertices = grid_lines(ticks.xs, ticks.ys, ticks.x_min, ticks.x_max, ticks.y_min, ticks.y_max)
+    assert vertices.shape == (2 * (28 + 22), 2)
+    assert vertices[0].tolist() == [-13, -10] and vertices[1].tolist() == [-13, 11]
+    assert vertices[-2].tolist() == [-13, 11] and vertices[-1].tolist() == [14, 11]
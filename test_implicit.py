@@ -0,0 +1,50 @@
+import numpy as np
+
+from expression import parse_equation_source
+from implicit import contour
+
+# 800 by 600 pixels over -10..10 by -7.5..7.5: 0.025 units per pixel, coarse cells of 8 pixels are 0.2 units
+VIEW = (-10.0, 10.0, -7.5, 7.5)
+PIXEL = 0.025
+
+
+def test_circle_vertices_within_a_pixel():
+    func = parse_equation_source("x^2 + y^2 = 25")
+    samples = contour(func, *VIEW, 800, 600)
+    points = np.concatenate(samples.strips)
+    assert len(points) > 500 and len(points) % 2 == 0
+    assert np.abs(np.hypot(points[:, 0], points[:, 1]) - 5).max() < PIXEL
+    # All the way round
+    angles = np.sort(np.arctan2(points[:, 1], points[:, 0]))
+    assert np.diff(angles).max() < 4 * PIXEL / 5
+
+
+def line_and_blob(x, y):
+    """Zero on the line x = 0.23 and on a circle of radius 0.05 (2 pixels) around (0.3, 0.2)"""
+    return (x - 0.23) * ((x - 0.3) ** 2 + (y - 0.2) ** 2 - 0.05 ** 2)
+
+
+def test_refinement_finds_feature_inside_a_coarse_cell():
+    def blob(samples):
+        points = np.concatenate(samples.strips)
+        return points[np.hypot(points[:, 0] - 0.3, points[:, 1] - 0.2) < 0.06]
+
+    # The blob sits in the middle of the coarse cell 0.2..0.4 by 0.1..0.3, away from all its corners
+    coarse = contour(line_and_blob, *VIEW, 800, 600, min_cell_pixels=8)
+    assert len(np.concatenate(coarse.strips)) and not len(blob(coarse))
+    # The line makes the cell active, and its refinement lands in the blob
+    refined = blob(contour(line_and_blob, *VIEW, 800, 600))
+    assert len(refined) >= 8
+    assert np.abs(np.hypot(refined[:, 0] - 0.3, refined[:, 1] - 0.2) - 0.05).max() < PIXEL / 2
+
+
+def test_tiles_join_at_shared_edges():
+    func = parse_equation_source("(x - 1)^2 + y^2 = 25")
+    # Two tiles side by side, meeting at x = 0 where the circle crosses at y = +-sqrt(24)
+    left = np.concatenate(contour(func, -6.4, 0.0, -6.3, 6.5, 256, 512).strips)
+    right = np.concatenate(contour(func, 0.0, 6.4, -6.3, 6.5, 256, 512).strips)
+    on_left = left[np.abs(left[:, 0]) < 1e-12]
+    on_right = right[np.abs(right[:, 0]) < 1e-12]
+    assert len(on_left) == len(on_right) == 2
+    assert np.array_equal(np.sort(on_left[:, 1]), np.sort(on_right[:, 1]))
+    assert np.allclose(np.sort(on_left[:, 1]), [-24 ** 0.5, 24 ** 0.5], atol=PIXEL / 10)
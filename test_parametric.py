@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+import pytest
+
+from expression import ExpressionError, ParametricCurve, parse_equation_source
+from sampling import sample_parametric
+
+
+def test_parametric_source_with_default_range():
+    curve = parse_equation_source("param: x=cos(3t), y=sin(2t)")
+    assert isinstance(curve, ParametricCurve) and not curve.polar
+    assert (curve.t_min, curve.t_max) == (0.0, 2 * math.pi)
+    xs, ys = curve(np.array([0.0, math.pi / 6]))
+    assert np.allclose(xs, [1, 0], atol=1e-12) and np.allclose(ys, [0, math.sin(math.pi / 3)])
+
+
+def test_parametric_source_with_explicit_range():
+    curve = parse_equation_source("param: x = t, y = pow(t, 2) - 1, t = -1..2pi")
+    assert (curve.t_min, curve.t_max) == (-1.0, 2 * math.pi)
+    xs, ys = curve(np.array([-1.0, 3.0]))
+    assert xs.tolist() == [-1.0, 3.0] and ys.tolist() == [0.0, 8.0]
+
+
+def test_polar_sources():
+    cardioid = parse_equation_source("polar: r=1+cos(theta)")
+    assert cardioid.polar and (cardioid.t_min, cardioid.t_max) == (0.0, 2 * math.pi)
+    xs, ys = cardioid(np.array([0.0, math.pi / 2]))
+    assert np.allclose(xs, [2, 0], atol=1e-12) and np.allclose(ys, [0, 1])
+    spiral = parse_equation_source("polar: r=theta/pi, theta=0..4pi")
+    assert (spiral.t_min, spiral.t_max) == (0.0, 4 * math.pi)
+
+
+@pytest.mark.parametrize("source", [
+    "param: x=cos(t)",                     # No y
+    "param: x=t, y=t, z=t",                # Something else besides x and y
+    "param: x=t y=t",                      # Missing comma
+    "param: x=t, y=",                      # Empty definition
+    "param: x=t, y=t, t=2..1",             # Empty range
+    "param: x=t, y=t, t=0..inf",           # Not a number
+    "param: x=t, y=t, x=0..1",             # Range for something other than t
+    "param: x=theta, y=theta",             # Polar parameter in a parametric curve
+    "polar: r=1, t=0..1",                  # Parametric parameter in a polar curve
+    "polar: x=cos(theta), y=sin(theta)",   # Not given as r
+])
+def test_malformed_curve_sources_are_rejected(source):
+    with pytest.raises(ExpressionError):
+        parse_equation_source(source)
+
+
+def screen_segments(strip: np.ndarray, bounds, width: int, height: int) -> np.ndarray:
+    x_min, x_max, y_min, y_max = bounds
+    steps = np.diff(strip, axis=0) * (width / (x_max - x_min), height / (y_max - y_min))
+    return np.hypot(steps[:, 0], steps[:, 1])
+
+
+def test_cardioid_is_closed_with_short_segments():
+    curve = parse_equation_source("polar: r=1+cos(theta)")
+    bounds = (-1.0, 3.0, -1.5, 1.5)
+    samples = sample_parametric(curve, curve.t_min, curve.t_max, *bounds, 800, 600)
+    assert len(samples.strips) == 1
+    strip = samples.strips[0]
+    assert np.allclose(strip[0], strip[-1])
+    assert np.allclose(strip[0], (2, 0))
+    # Every segment within the 4-pixel bound; the cusp at the origin is on the curve too
+    assert screen_segments(strip, bounds, 800, 600).max() <= 4.0 + 1e-9
+    assert np.hypot(strip[:, 0], strip[:, 1]).min() < 1e-3
+    r = np.hypot(strip[:, 0], strip[:, 1])
+    away = r > 1e-3
+    assert np.allclose(r[away], 1 + strip[away, 0] / r[away])
+
+
+def test_strip_split_at_tan_asymptote():
+    curve = parse_equation_source("param: x=t, y=tan(t), t=-1..3")
+    bounds = (-1.0, 3.0, -5.0, 5.0)
+    samples = sample_parametric(curve, curve.t_min, curve.t_max, *bounds, 800, 600)
+    assert len(samples.strips) == 2
+    before, after = samples.strips
+    assert before[-1, 0] <= math.pi / 2 + 1e-9 and after[0, 0] > math.pi / 2
+    assert before[-1, 1] > 5 and after[0, 1] < -5
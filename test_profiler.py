@@ -0,0 +1,37 @@
+from profiler import FrameProfiler
+
+
+def record(profiler: FrameProfiler, stages, counts=()):
+    profiler.begin_frame()
+    for name in stages:
+        with profiler.stage(name):
+            pass
+    for name in counts:
+        profiler.count(name, 4)
+    profiler.end_frame()
+
+
+def test_columns_in_order_first_seen():
+    profiler = FrameProfiler(enabled=True, history=3)
+    record(profiler, ["input", "curves"])
+    record(profiler, ["input", "shapes"], ["samples"])
+    for _ in range(5):
+        record(profiler, ["input"])
+    assert profiler.columns() == ["input", "curves", "frame", "shapes", "samples"]
+
+
+def test_overlay_averages_recent_frames():
+    profiler = FrameProfiler(enabled=True)
+    for _ in range(100):
+        record(profiler, ["curves"])
+    record(profiler, ["curves"], ["samples"])
+    lines = profiler.overlay_lines(window=4)
+    assert lines[0] == "4 frames"
+    assert lines[-1] == "samples: 1"
+    assert [line.split(":")[0] for line in lines[1:]] == ["curves", "frame", "samples"]
+
+
+def test_disabled_records_nothing():
+    profiler = FrameProfiler()
+    record(profiler, ["curves"], ["samples"])
+    assert profiler.columns() == [] and profiler.overlay_lines() == []
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from expression import compile_expression
+from sampling import max_deviation, sample_curve, split_strips
+
+WIDTH, HEIGHT = 800, 600
+
+
+def view(zoom: float):
+    aspect_ratio = WIDTH / HEIGHT
+    return -zoom * aspect_ratio, zoom * aspect_ratio, -zoom, zoom
+
+
+def sample(source: str, zoom: float):
+    func = compile_expression(source)
+    x_min, x_max, y_min, y_max = view(zoom)
+    return func, sample_curve(func, x_min, x_max, WIDTH, y_min, y_max, HEIGHT)
+
+
+@pytest.mark.parametrize("source", ["x**2", "sin(x)", "tan(x)", "1/x", "sqrt(x)", "x//1",
+                                    "exp(-x**2/10) * cos(3*x)"])
+@pytest.mark.parametrize("zoom", [0.1, 10.0, 1000.0])
+def test_evaluations_bounded_by_width(source, zoom):
+    _, samples = sample(source, zoom)
+    assert samples.evaluations <= 32 * WIDTH
+
+
+@pytest.mark.parametrize("source", ["x**2", "sin(x)", "exp(-x**2/10) * cos(3*x)"])
+@pytest.mark.parametrize("zoom", [0.1, 10.0, 1000.0])
+def test_smooth_curves_need_a_few_evaluations_per_pixel(source, zoom):
+    _, samples = sample(source, zoom)
+    assert samples.evaluations <= WIDTH
+    assert len(samples.strips) == 1
+
+
+@pytest.mark.parametrize("source", ["x**2", "sin(x)", "exp(-x**2/10) * cos(3*x)"])
+@pytest.mark.parametrize("zoom", [0.1, 10.0])
+def test_deviation_within_tolerance(source, zoom):
+    func, samples = sample(source, zoom)
+    _, _, y_min, y_max = view(zoom)
+    assert max_deviation(func, samples, y_min, y_max, HEIGHT) <= 0.5
+
+
+def test_tan_split_at_asymptotes():
+    _, samples = sample("tan(x)", 10.0)
+    x_min, x_max, _, _ = view(10.0)
+    asymptotes = np.pi / 2 + np.pi * np.arange(-5, 5)
+    asymptotes = asymptotes[(asymptotes > x_min) & (asymptotes < x_max)]
+    assert len(samples.strips) == len(asymptotes) + 1
+    for strip in samples.strips:
+        assert not ((asymptotes > strip[0, 0]) & (asymptotes < strip[-1, 0])).any()
+
+
+def test_reciprocal_split_at_zero():
+    _, samples = sample("1/x", 10.0)
+    assert len(samples.strips) == 2
+    left, right = samples.strips
+    assert left[-1, 0] < 0 < right[0, 0]
+
+
+def test_split_strips_drops_nan_and_single_points():
+    xs = np.arange(8.0)
+    ys = np.array([0, 1, np.nan, 3, np.nan, 5, 6, 7])
+    strips = split_strips(xs, ys)
+    assert [strip[:, 0].tolist() for strip in strips] == [[0, 1], [5, 6, 7]]
@@ -0,0 +1,113 @@
+import struct
+
+import numpy as np
+import pytest
+
+from core import Grapher
+from scene import END, EQUATION, MAGIC, PARAMETER, SHAPES, VIEW, read_scene, save_scene
+from shapes import SHAPE_TYPES, ShapeStore
+
+EQUATIONS = [("sin(a*x)", (1.0, 0.0, 0.0), True), ("x^2 + y^2 = 25", (0.0, 0.5, 0.0), False)]
+PARAMETERS = [("a", 2.0, 0.0, 5.0)]
+VIEW_STATE = (12.5, -3.25, 0.1)
+
+
+def store() -> ShapeStore:
+    shapes = ShapeStore()
+    shapes.add_many('circle', np.array([[0.0, 0.0, 5.0], [1.5, -2.0, 0.1]]), np.array([[0, 0, 1], [1, 0, 0]]))
+    shapes.add_many('line', np.array([[-5.0, 0.0, 5.0, 0.0]]), np.array([[0, 0.5, 0]]))
+    return shapes
+
+
+def load(path: str):
+    """Items of a scene, with shape blocks merged per type"""
+    items = {"view": [], "parameter": [], "equation": [], "shapes": {}}
+    for kind, item in read_scene(str(path)):
+        if kind == "shapes":
+            shape_type, values, colors = item
+            items["shapes"][shape_type] = (values.tolist(), colors.tolist())
+        elif kind == "shape_inputs":
+            inputs, colors = item
+            for text, color in zip(inputs, colors.tolist()):
+                _, shape_type, *values = text.split(":")
+                rows, row_colors = items["shapes"].setdefault(shape_type, ([], []))
+                rows.append([float(value) for value in values])
+                row_colors.append(color)
+        else:
+            items[kind].append(item)
+    return items
+
+
+@pytest.mark.parametrize("name", ["scene.txt", "scene.bin"])
+def test_round_trip(tmp_path, name):
+    path = tmp_path / name
+    save_scene(str(path), VIEW_STATE, EQUATIONS, store(), parameters=PARAMETERS)
+    items = load(path)
+    assert items["view"] == [VIEW_STATE]
+    assert items["parameter"] == PARAMETERS
+    assert items["equation"] == EQUATIONS
+    assert items["shapes"] == {
+        'circle': ([[0.0, 0.0, 5.0], [1.5, -2.0, 0.1]], [[0, 0, 1], [1, 0, 0]]),
+        'line': ([[-5.0, 0.0, 5.0, 0.0]], [[0, 0.5, 0]]),
+    }
+
+
+def test_version_1_binary_scene_loads(tmp_path):
+    path = tmp_path / "old.bin"
+    source = "x^2".encode()
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", 1))
+        f.write(struct.pack("<B3d", VIEW, *VIEW_STATE))
+        f.write(struct.pack("<B3fBI", EQUATION, 0.0, 0.0, 1.0, 1, len(source)) + source)
+        f.write(struct.pack("<BBI", SHAPES, SHAPE_TYPES.index('circle'), 1))
+        f.write(np.array([1.0, 2.0, 3.0], dtype="<f8").tobytes() + np.array([1, 0, 0], dtype="<f4").tobytes())
+        f.write(struct.pack("<B", END))
+    items = load(path)
+    assert items["view"] == [VIEW_STATE]
+    assert items["parameter"] == []
+    assert items["equation"] == [("x^2", (0.0, 0.0, 1.0), True)]
+    assert items["shapes"] == {'circle': ([[1.0, 2.0, 3.0]], [[1, 0, 0]])}
+
+
+@pytest.mark.parametrize("line", ["view 10 0", "parameter a 2", "parameter a", "parameter a 1 5 0",
+                                  "equation visible 0,0", "equation maybe 0,0,0 x", "shape 0,0 shape:circle:0:0:1",
+                                  "nonsense 1 2 3"])
+def test_malformed_text_lines_name_the_line(tmp_path, line):
+    path = tmp_path / "bad.txt"
+    path.write_text(f"# scene\nview 10 0 0\n{line}\n")
+    with pytest.raises(ValueError, match="Line 3"):
+        list(read_scene(str(path)))
+
+
+def test_unknown_binary_shape_type(tmp_path):
+    path = tmp_path / "bad.bin"
+    path.write_bytes(MAGIC + struct.pack("<I", 2) + struct.pack("<BBI", SHAPES, len(SHAPE_TYPES), 1) + bytes(40))
+    with pytest.raises(ValueError, match="shape type"):
+        list(read_scene(str(path)))
+
+
+@pytest.mark.parametrize("content", ["view 10 0\n", "parameter a 2\n"])
+def test_grapher_reports_malformed_scene(tmp_path, content):
+    path = tmp_path / "bad.txt"
+    path.write_text(content)
+    grapher = Grapher()
+    grapher.load_scene(str(path))
+    assert grapher.scene_loader is None
+    assert grapher.message.startswith("Could not load")
+
+
+@pytest.mark.parametrize("name", ["scene.txt", "scene.bin"])
+def test_long_parameter_name_round_trip(tmp_path, name):
+    path = tmp_path / name
+    parameters = [("a" * 300, 1.5, -2.0, 2.0)]
+    save_scene(str(path), VIEW_STATE, [], ShapeStore(), parameters=parameters)
+    assert load(path)["parameter"] == parameters
+
+
+def test_version_2_parameters_load(tmp_path):
+    path = tmp_path / "v2.bin"
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", 2))
+        f.write(struct.pack("<B3dB", PARAMETER, 2.0, 0.0, 5.0, 1) + b"a")
+        f.write(struct.pack("<B", END))
+    assert load(path)["parameter"] == [("a", 2.0, 0.0, 5.0)]
@@ -0,0 +1,75 @@
+import numpy as np
+
+from shapes import SHAPE_TYPES, ShapeStore
+
+VIEW = (-10.0, 10.0, -10.0, 10.0)  # 800 pixels across: 0.025 units per pixel
+
+
+def test_culling_counts():
+    store = ShapeStore()
+    xs = np.arange(100) * 10.0
+    store.add_many('circle', np.column_stack((xs, np.zeros(100), np.ones(100))), (0, 0, 1))
+    batch = store.batch(VIEW, 800)
+    # The batch covers half a view more on every side: -20..20, so the circles at 0, 10 and 20
+    assert batch.region == (-20.0, 20.0, -20.0, 20.0)
+    assert (batch.drawn, batch.culled) == (3, 97)
+    assert len(batch.loop_counts) == 3
+    # A small pan reuses the batch; leaving its region rebuilds it
+    assert store.batch((-9.0, 11.0, -10.0, 10.0), 800) is batch
+    moved = store.batch((490.0, 510.0, -10.0, 10.0), 800)
+    assert moved is not batch and (moved.drawn, moved.culled) == (5, 95)
+    assert store.builds == 2
+
+
+def test_batch_layout():
+    store = ShapeStore()
+    store.add('line', (0, 1, 0), x1=-5, y1=0, x2=5, y2=1)
+    store.add('rectangle', (1, 0, 0), x1=-1, y1=-2, x2=1, y2=2)
+    store.add('circle', (0, 0, 1), center_x=2, center_y=3, radius=1)
+    batch = store.batch(VIEW, 800)
+    segments = int(batch.loop_counts[0])
+    # Loops first (circles, then rectangles), lines last
+    assert batch.loop_counts.tolist() == [segments, 4]
+    assert batch.loop_firsts.tolist() == [0, segments]
+    assert batch.line_first == segments + 4 and batch.line_count == 2
+    assert batch.vertex_count == segments + 4 + 2
+    world = batch.vertices.astype(np.float64) + batch.origin
+    circle = world[:segments]
+    assert np.allclose(np.hypot(circle[:, 0] - 2, circle[:, 1] - 3), 1, atol=1e-5)
+    assert np.allclose(world[segments:segments + 4], [(-1, -2), (1, -2), (1, 2), (-1, 2)])
+    assert np.allclose(world[batch.line_first:], [(-5, 0), (5, 1)])
+    assert batch.colors[:segments].tolist() == [[0, 0, 1]] * segments
+    assert batch.colors[segments:segments + 4].tolist() == [[1, 0, 0]] * 4
+    assert batch.colors[batch.line_first:].tolist() == [[0, 1, 0]] * 2
+
+
+def test_circle_segments_follow_screen_radius():
+    store = ShapeStore()
+    # 4, 40 and 200 pixels: about one segment per 4 pixels of outline, a power of two from 8 to 256
+    store.add_many('circle', np.array([[0, 0, 5.0], [0, 0, 0.1], [0, 0, 1.0]]), (0, 0, 0))
+    batch = store.batch(VIEW, 800)
+    assert batch.loop_counts.tolist() == [8, 64, 256]
+    # Zoomed out ten times, the same circles need fewer segments
+    far = store.batch((-100.0, 100.0, -100.0, 100.0), 800)
+    assert far.loop_counts.tolist() == [8, 8, 32]
+
+
+def test_hit_test_each_kind():
+    store = ShapeStore()
+    circle = store.add('circle', (0, 0, 0), center_x=0, center_y=0, radius=5)
+    ellipse = store.add('ellipse', (0, 0, 0), center_x=20, center_y=0, radius_x=4, radius_y=2)
+    rectangle = store.add('rectangle', (0, 0, 0), x1=-10, y1=10, x2=-6, y2=14)
+    line = store.add('line', (0, 0, 0), x1=10, y1=10, x2=20, y2=20)
+    tags = {circle, ellipse, rectangle, line}
+    assert len(tags) == 4
+    assert {store.shape(tag)[0] for tag in tags} == set(SHAPE_TYPES)
+    assert store.hit_test(5.05, 0, 0.1) == circle
+    assert store.hit_test(0, -4.95, 0.1) == circle
+    assert store.hit_test(0, 0, 0.1) is None  # Inside, far from the outline
+    assert store.hit_test(24.05, 0, 0.1) == ellipse
+    assert store.hit_test(20, 2.02, 0.1) == ellipse
+    assert store.hit_test(-8, 13.95, 0.1) == rectangle
+    assert store.hit_test(-8, 12, 0.1) is None
+    assert store.hit_test(15.05, 14.95, 0.1) == line
+    assert store.hit_test(25, 25, 0.1) is None  # Past the end of the line
+    assert store.hit_test(30, 30, 0.1) is None
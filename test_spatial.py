@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from spatial import BoxIndex
+
+
+def brute_force(boxes: np.ndarray, x_min, y_min, x_max, y_max) -> np.ndarray:
+    lower = np.minimum(boxes[:, :2], boxes[:, 2:])
+    upper = np.maximum(boxes[:, :2], boxes[:, 2:])
+    hit = (upper[:, 0] >= x_min) & (lower[:, 0] <= x_max) & (upper[:, 1] >= y_min) & (lower[:, 1] <= y_max)
+    return np.flatnonzero(hit)
+
+
+def random_boxes(rng, count: int) -> np.ndarray:
+    corners = rng.uniform(-100, 100, (count, 2))
+    # Corners in either order, and a few boxes much larger than the rest
+    sizes = rng.exponential(2, (count, 2)) * rng.choice([-1, 1], (count, 2))
+    sizes[::97] *= 50
+    return np.column_stack((corners, corners + sizes))
+
+
+@pytest.mark.parametrize("tail", [0, 300])
+def test_query_matches_brute_force(tail):
+    rng = np.random.default_rng(7)
+    boxes = random_boxes(rng, 5000)
+    index = BoxIndex(max_tail=1024)
+    built = len(boxes) - tail
+    index.add(*boxes[:built].T, np.arange(built))
+    index.build()
+    # Boxes added after the build are only in the unsorted tail
+    index.add(*boxes[built:].T, np.arange(built, len(boxes)))
+    assert index.built == built
+    for _ in range(200):
+        x, y = rng.uniform(-120, 120, 2)
+        w, h = rng.exponential(10, 2)
+        found = index.query(x, y, x + w, y + h)
+        assert np.array_equal(np.sort(found), brute_force(boxes, x, y, x + w, y + h))
+    assert index.builds == 1
+
+
+def test_empty_index():
+    index = BoxIndex()
+    index.build()
+    assert len(index.query(-1, -1, 1, 1)) == 0
+    index.add(0, 0, 1, 1, 5)
+    assert index.query(-1, -1, 0.5, 0.5).tolist() == [5]
+    index.clear()
+    index.build()
+    assert len(index.query(-1, -1, 1, 1)) == 0
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from expression import compile_expression
+from sampling import initial_grid
+from subexpressions import ExpressionGraph
+
+
+def share(graph: ExpressionGraph, source: str):
+    return graph.add(compile_expression(source))
+
+
+def kinds(graph: ExpressionGraph) -> list:
+    return sorted(kind for kind, _ in graph.keys.values())
+
+
+def test_equal_subtrees_are_one_node():
+    graph = ExpressionGraph()
+    first = share(graph, "x*sin(x)")
+    assert kinds(graph) == ['mul', 'sin', 'var']
+    second = share(graph, "sin(x)*x")
+    assert second.root == first.root and len(graph) == 3
+    # Nested sums flatten, unary plus disappears and constant subtrees fold
+    a, b = share(graph, "(x + sin(x)) + cos(x)"), share(graph, "cos(x) + (+sin(x) + x)")
+    assert a.root == b.root
+    assert share(graph, "x**(4 - 1)").root == share(graph, "pow(x, 3)").root
+
+
+@pytest.mark.parametrize("source", ["x*sin(x)", "sin(x)*x + sin(x)", "sqrt(x) + 1/x", "tan(x)**2 - x % 3",
+                                    "pow(x, 3) - x // 2", "x if x > 0 else -x", "0 < x < 2", "2 * -x",
+                                    "exp(-x**2/10) * cos(3*x)"])
+def test_shared_results_match_compiled(source):
+    graph = ExpressionGraph()
+    # Other equations put their nodes into the same batch first
+    for other in ("sin(x)*x", "x**2", "1/x"):
+        share(graph, other)(initial_grid(-10, 10, 1001)[0])
+    xs, midpoints = initial_grid(-10, 10, 1001)
+    shared, compiled = share(graph, source), compile_expression(source)
+    for points in (xs, midpoints, np.linspace(-10, 10, 777)):
+        np.testing.assert_array_equal(shared(points), compiled(points))
+        # Asked again from the batch, and the value returned is not the batch's own
+        result = shared(points)
+        np.testing.assert_array_equal(result, compiled(points))
+        result[:] = 0
+        np.testing.assert_array_equal(shared(points), compiled(points))
+    assert shared(2.5) == compiled(2.5)
+
+
+def test_release_frees_only_unshared_nodes():
+    graph = ExpressionGraph()
+    product, offset = share(graph, "x*sin(x)"), share(graph, "sin(x) + 1")
+    xs, _ = initial_grid(-1, 1, 101)
+    product(xs)
+    offset(xs)
+    graph.release(product)
+    assert kinds(graph) == ['add', 'const', 'sin', 'var']
+    (_, values), = graph.batches.values()
+    assert set(values) <= set(graph.keys)
+    # A released equation evaluates on its own
+    np.testing.assert_array_equal(product(xs), xs * np.sin(xs))
+    graph.retain(product)
+    assert kinds(graph) == ['add', 'const', 'mul', 'sin', 'var']
+    graph.release(product)
+    graph.release(offset)
+    assert len(graph) == 0 and not graph.nodes and not graph.references and not graph.constants
+
+
+def test_requested_evaluated_and_saved():
+    graph = ExpressionGraph()
+    product, offset, square = share(graph, "x*sin(x)"), share(graph, "sin(x) + 1"), share(graph, "sin(x)*sin(x)")
+    xs, _ = initial_grid(-1, 1, 100)
+    n = len(xs)
+    product(xs)
+    assert graph.stats()['requested'] == 2 * n and graph.stats()['evaluated'] == 2 * n
+    # The sine is already computed for this batch: only the sum is new
+    offset(xs)
+    assert graph.requested == 4 * n and graph.evaluated == 3 * n
+    # On its own, sin(x)*sin(x) computes the sine twice
+    square(xs)
+    assert graph.requested == 7 * n and graph.evaluated == 4 * n
+    product(xs)
+    assert graph.requested == 9 * n and graph.evaluated == 4 * n
+    assert graph.saved == pytest.approx(1 - 4 / 9)
+    # Writable arrays are not shared, so everything asked for is computed
+    product(np.linspace(-1, 1, n))
+    assert graph.requested == 11 * n and graph.evaluated == 6 * n
+    assert ExpressionGraph().saved == 0.0
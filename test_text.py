@@ -0,0 +1,69 @@
+import numpy as np
+
+from text import GlyphAtlas, TextCache
+
+
+def boxes(width: int = 6, height: int = 10):
+    """A rasterizer drawing every character as a solid box, and spaces as nothing"""
+    calls = []
+
+    def rasterize(char: str):
+        calls.append(char)
+        if char == " ":
+            return np.zeros((0, 0), dtype=np.uint8), 4
+        return np.full((height, width), ord(char) % 256, dtype=np.uint8), width + 1
+
+    rasterize.calls = calls
+    return rasterize
+
+
+def test_strings_are_evicted_least_recently_used_first():
+    cache = TextCache(boxes(), max_strings=3)
+    for text in ("a", "b", "c"):
+        cache.layout(text)
+    assert cache.layout("a") is cache.layout("a")
+    cache.layout("d")
+    assert list(cache.layouts) == ["c", "a", "d"]
+    assert cache.layouts_built == 4
+    cache.layout("b")  # Laid out again after falling out of the cache
+    assert cache.layouts_built == 5
+    assert "c" not in cache.layouts
+
+
+def test_glyphs_are_rasterized_once():
+    rasterize = boxes()
+    cache = TextCache(rasterize)
+    cache.layout("abab")
+    cache.layout("ba")
+    assert rasterize.calls == ["a", "b"]
+
+
+def test_atlas_grows_when_glyphs_overflow():
+    atlas = GlyphAtlas(boxes(10, 10), width=32, height=16)
+    placed = {char: atlas.glyph(char) for char in "abcd"}
+    # Two glyphs fit on a shelf; the second shelf needs twice the height
+    assert [glyph[:2] for glyph in placed.values()] == [(0, 0), (11, 0), (0, 11), (11, 11)]
+    assert atlas.size == (32, 32)
+    assert atlas.version == 4
+    for char, (x, y, w, h, _) in placed.items():
+        assert (atlas.pixels[y:y + h, x:x + w] == ord(char)).all()
+    atlas.glyph("a")
+    assert atlas.version == 4
+
+
+def test_build_quads_and_uvs():
+    cache = TextCache(boxes())
+    cache.add("a b", 100, 50, (1, 0, 0, 1))
+    cache.add("c", 10, 20, (0, 0, 1, 1))
+    positions, uvs, colors = cache.build()
+    assert positions.shape == uvs.shape == (12, 2) and colors.shape == (12, 4)
+    # "a" at the pen start, the space advances 4 pixels without a quad, "b" after it; quads grow up from y
+    assert positions[:4].tolist() == [[100, 40], [106, 40], [106, 50], [100, 50]]
+    assert positions[4:8].tolist() == [[111, 40], [117, 40], [117, 50], [111, 50]]
+    assert positions[8:].tolist() == [[10, 10], [16, 10], [16, 20], [10, 20]]
+    width, height = cache.atlas.size
+    x, y, w, h, _ = cache.atlas.glyph("b")
+    assert np.allclose(uvs[4:8], np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]]) / (width, height))
+    assert colors[:8].tolist() == [[1, 0, 0, 1]] * 8 and colors[8:].tolist() == [[0, 0, 1, 1]] * 4
+    assert cache.layout("a b").width == 7 + 4 + 7
+    assert len(cache.build()[0]) == 0  # The queue was emptied
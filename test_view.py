@@ -0,0 +1,66 @@
+import pytest
+
+from view import ViewTransform
+
+
+def test_zoom_keeps_world_point_under_anchor():
+    view = ViewTransform(800, 600, zoom=10.0, x_offset=3.0, y_offset=-2.0)
+    anchor = (620, 140)
+    before = view.screen_to_world(*anchor)
+    view.zoom_at(0.5, *anchor)
+    steps = 0
+    while view.moving:
+        assert view.advance(1 / 60)
+        assert view.screen_to_world(*anchor) == pytest.approx(before)
+        steps += 1
+    assert 1 < steps < 60
+    assert view.zoom == 5.0
+    assert view.screen_to_world(*anchor) == pytest.approx(before)
+    assert not view.advance(1 / 60)
+
+
+def test_zoom_is_clamped():
+    view = ViewTransform(zoom=10.0, max_zoom=100.0)
+    for _ in range(10):
+        view.zoom_at(2.0, 400, 300)
+    assert view.zoom_target == 100.0
+
+
+def test_drag_moves_by_pixels_times_units_per_pixel():
+    view = ViewTransform(800, 600, zoom=10.0)
+    step = view.units_per_pixel
+    assert step == pytest.approx(2 * 10.0 * 800 / 600 / 800)
+    view.drag(30, -12, now=0.0)
+    view.drag(10, 4, now=1 / 60)
+    # The view center moves the way the pointer does, y up in the world
+    assert view.x_offset == pytest.approx(40 * step)
+    assert view.y_offset == pytest.approx(8 * step)
+    assert not view.moving  # Not coasting while the button is held
+
+
+def test_release_coasts_then_stops():
+    view = ViewTransform(800, 600, zoom=10.0)
+    for frame in range(10):
+        view.drag(6, 0, now=frame / 60)
+    view.release(now=9 / 60)
+    assert view.moving
+    vx, vy = view.velocity
+    assert vx > 0 and vy == 0
+    positions = [view.x_offset]
+    while view.moving:
+        assert view.advance(1 / 60)
+        positions.append(view.x_offset)
+        assert len(positions) < 600
+    steps = [b - a for a, b in zip(positions, positions[1:])]
+    assert all(step > 0 for step in steps)
+    assert all(later < earlier for earlier, later in zip(steps, steps[1:]))
+    assert view.velocity == (0.0, 0.0)
+    assert not view.advance(1 / 60)
+
+
+def test_release_after_holding_still_does_not_coast():
+    view = ViewTransform()
+    view.drag(6, 0, now=0.0)
+    view.drag(6, 0, now=1 / 60)
+    view.release(now=1.0)
+    assert not view.moving
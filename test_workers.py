@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from workers import SamplingScheduler
+
+
+def slow(value, delay=0.01):
+    """A synthetic expensive curve: sleeps, then returns its input"""
+    time.sleep(delay)
+    return value
+
+
+def blocked(gate: threading.Event, value, started: threading.Event = None):
+    """Holds its worker until the gate opens"""
+    if started is not None:
+        started.set()
+    gate.wait(5)
+    return value
+
+
+def fails():
+    time.sleep(0.01)
+    raise ValueError("bad sample")
+
+
+def wait_for(scheduler: SamplingScheduler, count: int, timeout: float = 5.0):
+    """Collect until ``count`` results arrived or the scheduler went idle"""
+    results = []
+    deadline = time.perf_counter() + timeout
+    while len(results) < count and time.perf_counter() < deadline:
+        # Idle is checked first, so every job it saw finish is in this collect
+        idle = not scheduler.jobs and not scheduler.discarded
+        results += scheduler.collect()
+        if idle:
+            break
+        time.sleep(0.005)
+    return results
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = SamplingScheduler(workers=1)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_collect_returns_finished_pairs(scheduler):
+    for key in range(3):
+        assert scheduler.submit(key, slow, key * 10)
+    assert sorted(wait_for(scheduler, 3)) == [(0, 0), (1, 10), (2, 20)]
+    assert scheduler.collect() == []
+    assert scheduler.stats()['completed'] == 3
+
+
+def test_submit_deduplicates_keys(scheduler):
+    gate = threading.Event()
+    assert scheduler.submit('a', blocked, gate, 1)
+    assert not scheduler.submit('a', blocked, gate, 2)
+    assert scheduler.pending('a')
+    gate.set()
+    assert wait_for(scheduler, 2) == [('a', 1)]
+    assert scheduler.stats()['submitted'] == 1
+
+
+def test_retain_cancels_unwanted_queued_jobs(scheduler):
+    gate, started = threading.Event(), threading.Event()
+    scheduler.submit('running', blocked, gate, 0, started)
+    assert started.wait(5)
+    for key in ('keep', 'drop1', 'drop2'):
+        scheduler.submit(key, slow, key)
+    # The single worker is held by 'running', so the rest are still queued
+    assert scheduler.retain(['running', 'keep']) == 2
+    assert not scheduler.pending('drop1') and not scheduler.pending('drop2')
+    gate.set()
+    assert sorted(wait_for(scheduler, 2)) == [('keep', 'keep'), ('running', 0)]
+    assert scheduler.stats()['cancelled'] == 2
+
+
+def test_discard_drops_in_flight_results(scheduler):
+    gate, started = threading.Event(), threading.Event()
+    scheduler.submit(('old', 0), blocked, gate, 'stale', started)
+    scheduler.submit(('old', 1), slow, 'queued')
+    scheduler.submit(('new', 0), slow, 'fresh')
+    assert started.wait(5)
+    assert scheduler.discard(lambda key: key[0] == 'old') == 1  # The queued one; the running one cannot be
+    gate.set()
+    assert wait_for(scheduler, 2) == [(('new', 0), 'fresh')]
+    assert not scheduler.discarded
+
+
+def test_raising_job_counts_as_failed(scheduler):
+    scheduler.submit('bad', fails)
+    scheduler.submit('good', slow, 1)
+    assert wait_for(scheduler, 2) == [('good', 1)]
+    stats = scheduler.stats()
+    assert stats['failed'] == 1 and stats['completed'] == 1
+
+
+def test_failing_key_is_not_retried_while_wanted(scheduler):
+    calls = []
+
+    def always_fails():
+        calls.append(1)
+        raise ValueError("bad tile")
+
+    assert scheduler.submit('bad', always_fails)
+    assert wait_for(scheduler, 1) == []
+    # Asked for again on the next frames, while still in view
+    for _ in range(3):
+        scheduler.retain(['bad'])
+        assert not scheduler.submit('bad', always_fails)
+    assert len(calls) == 1 and scheduler.stats()['failed'] == 1
+    # Out of view and back: tried again
+    scheduler.retain([])
+    assert scheduler.submit('bad', always_fails)
+    wait_for(scheduler, 1)
+    assert len(calls) == 2
+    # Its equation discarded: tried again as well
+    scheduler.discard(lambda key: key == 'bad')
+    assert scheduler.submit('bad', always_fails)
+    wait_for(scheduler, 1)
+    assert len(calls) == 3
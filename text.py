@@ -0,0 +1,142 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+
+# A rasterizer turns one character into (alpha mask of shape (h, w) as uint8, advance in pixels)
+Rasterizer = Callable[[str], Tuple[np.ndarray, int]]
+
+
+def pygame_rasterizer(name: str = 'arial', size: int = 14) -> Rasterizer:
+    """Rasterize glyphs with a pygame system font, antialiased and white so they can be tinted.
+
+    The font is looked up when the first glyph is drawn; scanning the
+    system fonts can take longer than the rest of startup.
+    """
+    import pygame
+    fonts = []
+
+    def rasterize(char: str) -> Tuple[np.ndarray, int]:
+        if not fonts:
+            pygame.font.init()
+            fonts.append(pygame.font.SysFont(name, size))
+        surface = fonts[0].render(char, True, (255, 255, 255))
+        alpha = np.array(pygame.surfarray.pixels_alpha(surface)).T
+        return np.ascontiguousarray(alpha, dtype=np.uint8), surface.get_width()
+
+    return rasterize
+
+
+class GlyphAtlas:
+    """Every glyph drawn so far, packed into shelves of a single alpha texture.
+
+    ``version`` changes whenever a glyph is added so the renderer knows to
+    upload the texture again; after the first few frames it stays the same.
+    """
+
+    def __init__(self, rasterize: Rasterizer, width: int = 512, height: int = 128):
+        self.rasterize = rasterize
+        self.pixels = np.zeros((height, width), dtype=np.uint8)
+        self.glyphs: Dict[str, Tuple[int, int, int, int, int]] = {}  # char -> (x, y, w, h, advance)
+        self.shelf_x = 0
+        self.shelf_y = 0
+        self.shelf_height = 0
+        self.version = 0
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        height, width = self.pixels.shape
+        return width, height
+
+    def glyph(self, char: str) -> Tuple[int, int, int, int, int]:
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            glyph = self.glyphs[char] = self._add(char)
+        return glyph
+
+    def _add(self, char: str) -> Tuple[int, int, int, int, int]:
+        mask, advance = self.rasterize(char)
+        h, w = mask.shape
+        atlas_height, atlas_width = self.pixels.shape
+        if self.shelf_x + w + 1 > atlas_width:
+            self.shelf_x = 0
+            self.shelf_y += self.shelf_height + 1
+            self.shelf_height = 0
+        while self.shelf_y + h + 1 > self.pixels.shape[0]:
+            # Out of room: double the height, existing glyphs keep their pixel positions
+            self.pixels = np.vstack((self.pixels, np.zeros_like(self.pixels)))
+        x, y = self.shelf_x, self.shelf_y
+        self.pixels[y:y + h, x:x + w] = mask
+        self.shelf_x += w + 1
+        self.shelf_height = max(self.shelf_height, h)
+        self.version += 1
+        return x, y, w, h, advance
+
+
+class TextLayout:
+    """Quads for one string, relative to its bottom-left corner"""
+
+    def __init__(self, positions: np.ndarray, glyph_rects: np.ndarray, width: int, height: int):
+        self.positions = positions      # (n * 4, 2) quad corners in pixels
+        self.glyph_rects = glyph_rects  # (n * 4, 2) matching corners in atlas pixels
+        self.width = width
+        self.height = height
+
+
+class TextCache:
+    """Glyph atlas plus an LRU cache of laid-out strings.
+
+    Labels are queued with ``add`` during a frame and turned into one set of
+    vertex arrays by ``build``, so the whole frame's text is a single draw
+    call. A string is only laid out again after it falls out of the cache.
+    """
+
+    def __init__(self, rasterize: Rasterizer, max_strings: int = 1024):
+        self.atlas = GlyphAtlas(rasterize)
+        self.layouts: "OrderedDict[str, TextLayout]" = OrderedDict()
+        self.max_strings = max_strings
+        self.queue = []
+        self.layouts_built = 0
+
+    def layout(self, text: str) -> TextLayout:
+        layout = self.layouts.get(text)
+        if layout is not None:
+            self.layouts.move_to_end(text)
+            return layout
+
+        positions = []
+        rects = []
+        pen_x = 0
+        height = 0
+        for char in text:
+            x, y, w, h, advance = self.atlas.glyph(char)
+            if w and h:
+                positions.append(((pen_x, -h), (pen_x + w, -h), (pen_x + w, 0), (pen_x, 0)))
+                rects.append(((x, y), (x + w, y), (x + w, y + h), (x, y + h)))
+            pen_x += advance
+            height = max(height, h)
+        layout = TextLayout(np.array(positions, dtype=np.float32).reshape(-1, 2),
+                            np.array(rects, dtype=np.float32).reshape(-1, 2), pen_x, height)
+        self.layouts[text] = layout
+        self.layouts_built += 1
+        if len(self.layouts) > self.max_strings:
+            self.layouts.popitem(last=False)
+        return layout
+
+    def add(self, text: str, x: float, y: float, color: Tuple[float, float, float, float]):
+        """Queue a string with its bottom-left corner at screen pixel (x, y), colors in 0..1"""
+        self.queue.append((self.layout(text), x, y, color))
+
+    def build(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vertex positions, texture coordinates and colors for every queued quad; empties the queue"""
+        queue, self.queue = self.queue, []
+        queue = [item for item in queue if len(item[0].positions)]
+        if not queue:
+            empty = np.zeros((0, 2), dtype=np.float32)
+            return empty, empty, np.zeros((0, 4), dtype=np.float32)
+        positions = np.concatenate([layout.positions + np.float32((x, y)) for layout, x, y, _ in queue])
+        width, height = self.atlas.size
+        uvs = np.concatenate([layout.glyph_rects for layout, _, _, _ in queue]) / np.float32((width, height))
+        colors = np.repeat(np.array([color for _, _, _, color in queue], dtype=np.float32),
+                           [len(layout.positions) for layout, _, _, _ in queue], axis=0)
+        return positions, uvs.astype(np.float32), colors
@@ -0,0 +1,121 @@
+import math
+from typing import Optional, Tuple
+from geometry import screen_to_world, view_bounds, world_to_screen
+
+
+class ViewTransform:
+    """The visible part of the plane and the pan and zoom motion that changes it.
+
+    ``zoom`` is half the extent of the window's shorter side and the
+    offsets are the world point at the window's center. Input is handed
+    over at most once per frame, already summed: ``drag`` pans the view
+    right away, ``zoom_at`` sets a new target zoom that ``advance`` eases
+    towards while keeping the world point under the pointer where it is.
+    A drag that is still moving when the button is released keeps
+    coasting and slows down by ``friction`` per second. Times are in
+    seconds and passed in, so the motion can be stepped without a window
+    or a clock.
+    """
+
+    def __init__(self, width: int = 800, height: int = 600, zoom: float = 10.0, x_offset: float = 0.0,
+                 y_offset: float = 0.0, zoom_rate: float = 18.0, friction: float = 6.0,
+                 min_zoom: float = 1e-12, max_zoom: float = 1e12):
+        self.width = width
+        self.height = height
+        self.zoom_rate = zoom_rate  # How fast zoom closes in on its target, per second
+        self.friction = friction
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.jump(zoom, x_offset, y_offset)
+
+    def jump(self, zoom: float, x_offset: float, y_offset: float):
+        """Show a view at once, stopping any zoom or coasting in progress"""
+        self.zoom = self.zoom_target = zoom
+        self.x_offset = x_offset
+        self.y_offset = y_offset
+        self.anchor: Optional[Tuple[float, float]] = None  # Pixel the zoom is anchored at
+        self.velocity = (0.0, 0.0)  # World units per second, while coasting or dragging
+        self.dragged_at: Optional[float] = None  # Time of the last drag, while the button is held
+
+    def resize(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """World-space (x_min, x_max, y_min, y_max) on screen"""
+        return view_bounds(self.zoom, self.x_offset, self.y_offset, self.width, self.height)
+
+    @property
+    def units_per_pixel(self) -> float:
+        x_min, x_max, _, _ = self.bounds()
+        return (x_max - x_min) / self.width
+
+    def screen_to_world(self, x, y):
+        return screen_to_world(x, y, self.bounds(), self.width, self.height)
+
+    def world_to_screen(self, x, y):
+        return world_to_screen(x, y, self.bounds(), self.width, self.height)
+
+    @property
+    def moving(self) -> bool:
+        """True while a zoom is easing in or the view is coasting"""
+        return self.zoom != self.zoom_target or (self.dragged_at is None and self.velocity != (0.0, 0.0))
+
+    def drag(self, dx: float, dy: float, now: float):
+        """Pan by a pointer motion of (dx, dy) pixels, y down, summed over a frame.
+
+        The view center moves the way the pointer does, one world pixel per
+        pointer pixel, so the graph slides the opposite way.
+        """
+        step = self.units_per_pixel
+        moved_x, moved_y = dx * step, -dy * step
+        self.x_offset += moved_x
+        self.y_offset += moved_y
+        # Pointer speed over the frames of the drag, smoothed so one uneven frame does not decide the fling
+        if self.dragged_at is not None and now > self.dragged_at:
+            elapsed = now - self.dragged_at
+            vx, vy = self.velocity
+            self.velocity = (0.5 * vx + 0.5 * moved_x / elapsed, 0.5 * vy + 0.5 * moved_y / elapsed)
+        else:
+            self.velocity = (0.0, 0.0)
+        self.dragged_at = now
+
+    def release(self, now: float, hold: float = 0.05):
+        """End a drag; the view coasts on unless the pointer stood still for ``hold`` seconds first"""
+        if self.dragged_at is None or now - self.dragged_at > hold:
+            self.velocity = (0.0, 0.0)
+        self.dragged_at = None
+
+    def zoom_at(self, factor: float, x: float, y: float):
+        """Multiply the target zoom by ``factor`` (below 1 zooms in), anchored at pixel (x, y)"""
+        self.zoom_target = min(max(self.zoom_target * factor, self.min_zoom), self.max_zoom)
+        self.anchor = (x, y)
+
+    def set_zoom(self, zoom: float):
+        """Zoom to ``zoom`` at once, keeping the anchor pixel (the center if there is none) in place"""
+        if self.anchor is not None:
+            anchor_x, anchor_y = self.screen_to_world(*self.anchor)
+            scale = zoom / self.zoom
+            self.x_offset = anchor_x - (anchor_x - self.x_offset) * scale
+            self.y_offset = anchor_y - (anchor_y - self.y_offset) * scale
+        self.zoom = zoom
+
+    def advance(self, dt: float) -> bool:
+        """Step zoom easing and coasting by ``dt`` seconds; returns True if the view changed"""
+        changed = False
+        if self.zoom != self.zoom_target:
+            # Eased in log space, so zooming in and out feel the same
+            remaining = math.log(self.zoom_target / self.zoom) * math.exp(-self.zoom_rate * dt)
+            self.set_zoom(self.zoom_target if abs(remaining) < 1e-3 else self.zoom_target / math.exp(remaining))
+            changed = True
+        if self.dragged_at is None and self.velocity != (0.0, 0.0):
+            vx, vy = self.velocity
+            self.x_offset += vx * dt
+            self.y_offset += vy * dt
+            decay = math.exp(-self.friction * dt)
+            self.velocity = (vx * decay, vy * decay)
+            # Stop once it moves less than a tenth of a pixel per frame at 60 fps
+            if math.hypot(*self.velocity) / 60 < 0.1 * self.units_per_pixel:
+                self.velocity = (0.0, 0.0)
+            changed = True
+        return changed
@@ -0,0 +1,125 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class SamplingScheduler:
+    """Runs curve-sampling jobs on a pool of worker threads or processes.
+
+    Jobs are keyed (the grapher uses cache TileKeys) so a key is only ever
+    queued once. The UI thread submits the tiles it is missing, draws
+    whatever it already has, and picks up finished results with
+    ``collect``. Jobs for tiles that dropped out of view are cancelled with
+    ``retain`` before a worker starts on them. A key whose job raised is
+    not queued again while it stays wanted, so a tile that cannot be
+    sampled is not retried every frame; it is tried again once it has
+    left the view or its equation was discarded.
+    """
+
+    def __init__(self, workers: Optional[int] = None, mode: str = "thread",
+                 on_done: Optional[Callable[[], None]] = None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode: {mode}. Use 'thread' or 'process'")
+        workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        if mode == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sampler")
+        self.mode = mode
+        self.on_done = on_done  # Called from a worker thread whenever a job finishes
+        self.jobs: Dict[Hashable, Future] = {}
+        self.finished: List[Tuple[Hashable, object]] = []
+        self.discarded: Dict[Hashable, Future] = {}  # Running jobs whose results are no longer wanted
+        self.failures: Set[Hashable] = set()  # Keys whose job raised, not submitted again
+        self.lock = threading.RLock()  # Cancelling a future runs its done-callback in the same thread
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> bool:
+        """Queue ``fn(*args)`` for ``key`` unless it is already queued or running, or failed"""
+        with self.lock:
+            if key in self.jobs or key in self.failures:
+                return False
+            future = self.executor.submit(fn, *args)
+            self.jobs[key] = future
+            self.submitted += 1
+        future.add_done_callback(lambda done, key=key: self._done(key, done))
+        return True
+
+    def _done(self, key: Hashable, future: Future):
+        with self.lock:
+            if self.jobs.get(key) is future:
+                del self.jobs[key]
+            elif self.discarded.get(key) is future:
+                del self.discarded[key]
+                return
+            else:
+                return
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.failures.add(key)
+                self.failed += 1
+                return
+            self.finished.append((key, future.result()))
+            self.completed += 1
+        if self.on_done is not None:
+            self.on_done()
+
+    def pending(self, key: Hashable) -> bool:
+        return key in self.jobs
+
+    def collect(self) -> List[Tuple[Hashable, object]]:
+        """Results finished since the last call, as (key, result) pairs"""
+        with self.lock:
+            finished, self.finished = self.finished, []
+        return finished
+
+    def retain(self, keys: Iterable[Hashable]) -> int:
+        """Cancel queued jobs whose key is not in ``keys``; jobs already running still finish.
+
+        Failed keys that are no longer wanted are forgotten, so they are tried again when they come back.
+        """
+        wanted = set(keys)
+        cancelled = 0
+        with self.lock:
+            self.failures &= wanted
+            for key, future in list(self.jobs.items()):
+                if key not in wanted and future.cancel():
+                    self.jobs.pop(key, None)
+                    cancelled += 1
+            self.cancelled += cancelled
+        return cancelled
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Cancel every job whose key matches, and throw away results of ones already running"""
+        cancelled = 0
+        with self.lock:
+            for key, future in list(self.jobs.items()):
+                if predicate(key):
+                    del self.jobs[key]
+                    if future.cancel():
+                        cancelled += 1
+                    else:
+                        self.discarded[key] = future
+            self.finished = [(key, result) for key, result in self.finished if not predicate(key)]
+            self.failures = {key for key in self.failures if not predicate(key)}
+            self.cancelled += cancelled
+        return cancelled
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'queued': len(self.jobs),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'failed': self.failed,
+            }
+
+    def shutdown(self):
+        self.discard(lambda key: True)
+        self.executor.shutdown(wait=False, cancel_futures=True)